@@ -1,5 +1,6 @@
 # gacha_app package
 
+import atexit
 import os
 import sys
 import tkinter as tk
@@ -7,25 +8,32 @@ import tkinter as tk
 from .src.core.prize_manager import PrizeManager
 from .src.core.gacha_engine import GachaEngine
 from .src.utils.config import Config
-from .src.utils.history import History
+from .src.utils.config_store import ConfigStore
+from .src.utils.history_store import open_history
 from .src.ui.main_window import MainWindow
 
 def main():
     # 设置工作目录
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
     
-    # 初始化配置和历史记录
-    config = Config('config')
-    history = History(os.path.join('config', 'history.json'))
+    # 初始化配置和历史记录（config.json 只解析一次，各处共用）
+    config_path = os.path.join('config', 'config.json')
+    store = ConfigStore(config_path)
+    atexit.register(store.flush)
+    config = Config(config_path, store)
+    app_config = config.load()
+    history = open_history('config', app_config.get('history_storage', 'json'),
+                           app_config.get('history_options'))
     
     # 初始化奖品管理器和扭蛋机
-    prize_manager = PrizeManager()
-    prize_manager.prizes = config.load()['prizes']
+    prize_manager = PrizeManager(config_path, store=store)
     gacha_engine = GachaEngine(prize_manager)
     
     # 创建主窗口
     root = tk.Tk()
     app = MainWindow(root, gacha_engine, prize_manager, config, history)
+    # 异常退出时也把队列中的历史记录写完（先注册的后执行，配置在历史记录之后写入）
+    atexit.register(app.history_writer.close)
     root.mainloop()
     
 if __name__ == '__main__':
@@ -1,24 +1,71 @@
-import random
-import time
-from datetime import datetime
+import numpy as np
+
+from .simulation import parallel_simulate
+from .rng import CounterRNG
+
+# 模拟抽奖使用的流号，与保存在 config.json 中的抽奖流分开
+SIMULATION_STREAM = 1 << 32
 
 class GachaEngine:
-    def __init__(self, prize_manager):
+    def __init__(self, prize_manager, rng=None):
         self.prize_manager = prize_manager
+        # 动画使用独立的随机数流，不影响抽奖结果的序号
+        self.rng = rng if rng is not None else CounterRNG()
+        # 模拟抽奖使用派生的独立流：不消耗、也不预留需要持久化的抽奖序号
+        manager_rng = prize_manager.rng
+        self.simulation_rng = (manager_rng.spawn(SIMULATION_STREAM) if hasattr(manager_rng, 'spawn')
+                               else CounterRNG())
         
     def draw(self):
         """抽奖"""
         return self.prize_manager.draw()
         
+    def draw_many(self, count):
+        """多连抽，返回 count 个抽奖结果"""
+        return self.prize_manager.draw_many(count)
+        
     def simulate_draws(self, num_draws):
         """模拟多次抽奖，用于统计概率"""
         results = []
         for _ in range(num_draws):
-            results.append(self.draw())
+            results.append(self.prize_manager.draw(self.simulation_rng))
         return results
         
-    def get_statistics(self, results):
-        """获取抽奖统计信息"""
+    def simulate_indices(self, num_draws, seed=None, snapshot=None):
+        """向量化模拟多次抽奖，返回奖品索引数组（int32）
+        
+        一次批量采样完成，不为每次抽奖创建字典和时间戳，适合大规模概率验证。
+        索引对应 snapshot（默认为当前快照）的奖品目录，汇总时应传入同一个快照。
+        """
+        snapshot = snapshot if snapshot is not None else self.prize_manager.snapshot()
+        np_rng = np.random.default_rng(seed)
+        return snapshot.sampler.sample_array(num_draws, np_rng)
+        
+    def simulate_parallel(self, num_draws, workers=None, seed=None, snapshot=None):
+        """多进程模拟多次抽奖，返回每个奖品的抽中次数数组
+        
+        可配合 build_statistics 生成统计信息；相同的 seed 和 workers 结果可复现。
+        """
+        snapshot = snapshot if snapshot is not None else self.prize_manager.snapshot()
+        return parallel_simulate(snapshot.sampler, num_draws, workers, seed)
+        
+    def simulate_statistics(self, num_draws, workers=None, seed=None):
+        """模拟多次抽奖并生成统计信息：采样和奖品名称都取自同一个快照，
+        期间奖品被修改或重新加载也不会把次数记到别的奖品上
+        """
+        snapshot = self.prize_manager.snapshot()
+        counts = self.simulate_parallel(num_draws, workers, seed, snapshot)
+        return self.build_statistics(counts, snapshot)
+        
+    def get_statistics(self, results, snapshot=None):
+        """获取抽奖统计信息
+        
+        results 可以是 simulate_draws 返回的结果列表，也可以是 simulate_indices 返回的索引数组
+        （此时应传入采样时使用的 snapshot）。
+        """
+        if isinstance(results, np.ndarray):
+            return self.get_index_statistics(results, snapshot)
+            
         stats = {}
         total = len(results)
         
@@ -38,6 +85,34 @@ class GachaEngine:
             
         return stats
     
+    def get_index_statistics(self, indices, snapshot=None):
+        """用 bincount 汇总索引数组的统计信息"""
+        snapshot = snapshot if snapshot is not None else self.prize_manager.snapshot()
+        counts = np.bincount(indices, minlength=len(snapshot.catalog))
+        return self.build_statistics(counts, snapshot)
+    
+    def build_statistics(self, counts, snapshot=None):
+        """根据每个奖品的抽中次数生成统计信息，奖品名称取自 snapshot（默认为当前快照）的目录"""
+        snapshot = snapshot if snapshot is not None else self.prize_manager.snapshot()
+        total = int(counts.sum())
+        
+        # 名称列只转换一次，按非0计数的索引整体取出，不为每个索引生成 Prize
+        indices = np.flatnonzero(counts)
+        names = np.asarray(snapshot.catalog.name_column(), dtype=object)[indices].tolist()
+        values = counts[indices].tolist()
+        if len(set(names)) != len(names):
+            # 同名奖品合并计数
+            merged = {}
+            for prize_name, count in zip(names, values):
+                merged[prize_name] = merged.get(prize_name, 0) + count
+            names, values = list(merged), list(merged.values())
+            
+        # 计算百分比
+        percentages = np.round(np.asarray(values, dtype=np.float64) / total * 100, 2).tolist() \
+            if total > 0 else []
+        return {prize_name: {'count': count, 'percentage': percentage}
+                for prize_name, count, percentage in zip(names, values, percentages)}
+    
     def generate_animation_frames(self, final_index, duration_ms=1500, interval_ms=50):
         """生成动画帧序列"""
         total_prizes = len(self.prize_manager.get_all_prizes())
@@ -46,7 +121,7 @@ class GachaEngine:
             
         frame_count = int(duration_ms / interval_ms)
         # 生成随机帧
-        frames = [random.randrange(total_prizes) for _ in range(frame_count)]
+        frames = [self.rng.randrange(total_prizes) for _ in range(frame_count)]
         # 添加最终结果帧
         frames.append(final_index)
         return frames 
\ No newline at end of file
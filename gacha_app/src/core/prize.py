@@ -0,0 +1,99 @@
+class Prize:
+    """单个奖品
+
+    使用 __slots__，没有实例字典，内存占用远小于原来的奖品字典。
+    支持 prize['name']、prize.get('weight')、'image' in prize、dict(prize) 等字典式读取，
+    与原来以字典表示奖品的代码兼容；to_dict() 生成写入 JSON 用的字典。
+    tier 为稀有度层级（如 "SSR"），没有层级时为 None，不出现在字典中。
+    """
+    __slots__ = ('name', 'weight', 'image', 'extra', 'tier')
+
+    # 固定字段，其他字段保存在 extra 中（绝大多数奖品没有）
+    FIELDS = ('name', 'weight', 'image')
+
+    def __init__(self, name, weight=1, image='', extra=None, tier=None):
+        self.name = name
+        self.weight = weight
+        self.image = image
+        self.extra = extra
+        self.tier = tier
+
+    @classmethod
+    def from_dict(cls, prize):
+        """由奖品字典（或另一个 Prize）创建"""
+        if isinstance(prize, Prize):
+            return prize.copy()
+        extra = {key: value for key, value in prize.items()
+                 if key not in cls.FIELDS and key != 'tier'}
+        return cls(prize.get('name'), prize.get('weight', 1), prize.get('image', ''), extra or None,
+                   prize.get('tier'))
+
+    def to_dict(self):
+        """转为可写入 JSON 的字典"""
+        prize = {
+            'name': self.name,
+            'weight': self.weight,
+            'image': self.image
+        }
+        if self.tier is not None:
+            prize['tier'] = self.tier
+        if self.extra:
+            prize.update(self.extra)
+        return prize
+
+    def copy(self):
+        return Prize(self.name, self.weight, self.image, dict(self.extra) if self.extra else None,
+                     self.tier)
+
+    # ---- 字典式只读访问 ----
+
+    def keys(self):
+        keys = list(self.FIELDS)
+        if self.tier is not None:
+            keys.append('tier')
+        if self.extra:
+            keys.extend(self.extra)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return (len(self.FIELDS) + (self.tier is not None)
+                + (len(self.extra) if self.extra else 0))
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            return getattr(self, key)
+        if key == 'tier' and self.tier is not None:
+            return self.tier
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return (key in self.FIELDS or (key == 'tier' and self.tier is not None)
+                or bool(self.extra and key in self.extra))
+
+    def items(self):
+        return self.to_dict().items()
+
+    def __eq__(self, other):
+        if isinstance(other, Prize):
+            return (self.name == other.name and self.weight == other.weight
+                    and self.image == other.image and self.tier == other.tier
+                    and (self.extra or None) == (other.extra or None))
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Prize({self.to_dict()!r})"
@@ -0,0 +1,338 @@
+import os
+import json
+from array import array
+
+from .prize import Prize
+from .sampler import AliasSampler, BlockSampler, TieredSampler
+
+# 没有层级的目录超过该数量时使用分块采样器，修改一个奖品不再重建整张别名表
+BLOCK_SAMPLER_THRESHOLD = 1 << 16
+
+# 追加奖品时逐项增长的列
+APPEND_COLUMNS = ('names', 'weight_column', 'images', 'tier_column')
+# copy() 时与副本共用的列
+SHARED_COLUMNS = APPEND_COLUMNS + ('extras', 'name_index', 'tier_names', 'tier_ids')
+
+def new_revision():
+    """随机生成奖品目录的版本标识（32位非0整数），重启或崩溃后也不会与以前的版本重复"""
+    return int.from_bytes(os.urandom(4), 'little') or 1
+
+class PrizeCatalog:
+    """可扩展的奖品目录
+
+    按列保存奖品（结构数组）：名称列表、权重数组、图片路径列表和稀疏的附加字段，
+    另有名称索引，支持百万级奖品：追加为O(1)，按名称查找为O(1)。
+    按权重抽取由 build_sampler 建立的采样器负责。
+    总权重和权重数组随修改维护，读取时不分配新列表；Prize 对象在访问时才生成。
+    稀有度层级按编号保存在 tier_column 中（每个奖品2字节），tier_weights 为
+    config.json 中 "tiers" 配置的各层级权重。
+
+    copy() 不复制列，副本与原目录共用各列，各自只看前 len 项：追加时直接在共用的列末尾
+    追加（原目录看不到超出自己长度的部分），其他修改只在写入前复制被修改的那一列。
+    """
+    def __init__(self, prizes=None, tier_weights=None):
+        self.names = []
+        self.weight_column = array('q')  # 出现小数权重时转为 array('d')
+        self.images = []
+        self.extras = {}  # 索引 -> 附加字段，绝大多数奖品没有
+        self._total_weight = 0  # 非负权重之和，随修改增减
+        self._length = 0  # 奖品数量，共用的列可能比它长
+        self._shared = set()  # 与其他目录共用、写入前需要复制的列
+        self.name_index = {}  # 奖品名称 -> 第一次出现的索引，删除或改名后为 None，查找时重建
+        self.tier_column = array('H')  # 层级编号，0 表示没有层级
+        self.tier_names = [None]  # 层级编号 -> 层级名称
+        self.tier_ids = {None: 0}  # 层级名称 -> 层级编号
+        self.tier_weights = dict(tier_weights) if tier_weights else {}
+        if prizes:
+            self.extend(prizes)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('奖品索引超出范围')
+        weight = self.weight_column[index]
+        if self.weight_column.typecode == 'd' and weight.is_integer():
+            # 浮点列中的整数权重仍按整数返回，写回 JSON 时格式不变
+            weight = int(weight)
+        return Prize(self.names[index], weight, self.images[index],
+                     self.extras.get(index), self.tier_names[self.tier_column[index]])
+
+    def __eq__(self, other):
+        if not isinstance(other, PrizeCatalog):
+            return NotImplemented
+        n, m = len(self), len(other)
+        return (n == m and self.names[:n] == other.names[:m]
+                and self.weight_column[:n].tolist() == other.weight_column[:m].tolist()
+                and self.images[:n] == other.images[:m] and self.extras == other.extras
+                and self.tier_weights == other.tier_weights
+                and list(map(self.tier_names.__getitem__, self.tier_column[:n]))
+                == list(map(other.tier_names.__getitem__, other.tier_column[:m])))
+
+    __hash__ = None
+
+    @property
+    def prizes(self):
+        """奖品序列（目录本身，按索引生成 Prize）"""
+        return self
+
+    @property
+    def total_weight(self):
+        """总权重"""
+        return self._total_weight
+
+    def _own(self, *columns):
+        """写入前复制与其他目录共用的列（只复制本目录范围内的部分）"""
+        for column in columns:
+            if column not in self._shared:
+                continue
+            self._shared.discard(column)
+            value = getattr(self, column)
+            if column == 'extras':
+                value = {index: dict(extra) for index, extra in value.items()}
+            elif column == 'name_index':
+                if value is not None:
+                    value = {name: index for name, index in value.items() if index < len(self)}
+            elif isinstance(value, dict):
+                value = dict(value)
+            else:
+                value = value[:len(self)]
+            setattr(self, column, value)
+
+    def _prepare_append(self):
+        """共用的列已被其他目录追加过时，先复制本目录的部分再追加"""
+        if any(column in self._shared and len(getattr(self, column)) != len(self)
+               for column in APPEND_COLUMNS):
+            self._own(*APPEND_COLUMNS, 'name_index')
+
+    def _store_weight(self, weight):
+        """权重写入前检查类型，出现小数时整列转为浮点"""
+        if self.weight_column.typecode == 'q' and not isinstance(weight, int):
+            self.weight_column = array('d', self.weight_column[:len(self)])
+            self._shared.discard('weight_column')
+
+    def _tier_id(self, tier):
+        """层级名称对应的编号，新层级时分配编号"""
+        tier_id = self.tier_ids.get(tier)
+        if tier_id is None:
+            self._own('tier_names', 'tier_ids')
+            tier_id = len(self.tier_names)
+            self.tier_names.append(tier)
+            self.tier_ids[tier] = tier_id
+        return tier_id
+
+    def append(self, prize):
+        """追加奖品（字典或 Prize），与其他目录共用的列也直接追加，O(1)"""
+        index = len(self)
+        if not isinstance(prize, Prize):
+            prize = Prize.from_dict(prize)
+        self._prepare_append()
+        self._store_weight(prize.weight)
+        self.names.append(prize.name)
+        self.weight_column.append(prize.weight)
+        self.images.append(prize.image)
+        if prize.extra:
+            self._own('extras')
+            self.extras[index] = dict(prize.extra)
+        self.tier_column.append(self._tier_id(prize.tier))
+        self._length += 1
+        self._total_weight += max(prize.weight, 0)
+        if self.name_index is not None:
+            self.name_index.setdefault(prize.name, index)
+
+    def extend(self, prizes):
+        """批量追加奖品"""
+        for prize in prizes:
+            self.append(prize)
+
+    def update(self, index, prize):
+        """替换指定索引的奖品，只复制值有变化的共用列"""
+        if not isinstance(prize, Prize):
+            prize = Prize.from_dict(prize)
+        old_name = self.names[index]
+        old_weight = self.weight_column[index]
+        if old_name != prize.name:
+            self._own('names')
+            self.names[index] = prize.name
+        self._store_weight(prize.weight)
+        if old_weight != prize.weight:
+            self._own('weight_column')
+            self.weight_column[index] = prize.weight
+            self._total_weight += max(prize.weight, 0) - max(old_weight, 0)
+        if self.images[index] != prize.image:
+            self._own('images')
+            self.images[index] = prize.image
+        if prize.extra or index in self.extras:
+            self._own('extras')
+            if prize.extra:
+                self.extras[index] = dict(prize.extra)
+            else:
+                del self.extras[index]
+        tier_id = self._tier_id(prize.tier)
+        if self.tier_column[index] != tier_id:
+            self._own('tier_column')
+            self.tier_column[index] = tier_id
+        if old_name != prize.name:
+            self._invalidate_name_index()
+
+    def remove(self, index):
+        """删除指定索引的奖品"""
+        self._own(*APPEND_COLUMNS)
+        self._total_weight -= max(self.weight_column[index], 0)
+        del self.names[index]
+        del self.weight_column[index]
+        del self.images[index]
+        del self.tier_column[index]
+        self._length -= 1
+        if self.extras:
+            self.extras = {(i - 1 if i > index else i): extra
+                           for i, extra in self.extras.items() if i != index}
+            self._shared.discard('extras')
+        self._invalidate_name_index()
+
+    def clear(self):
+        """清空目录"""
+        self.names = []
+        self.weight_column = array('q')
+        self.images = []
+        self.extras = {}
+        self._total_weight = 0
+        self._length = 0
+        self._shared = set()
+        self.name_index = {}
+        self.tier_column = array('H')
+        self.tier_names = [None]
+        self.tier_ids = {None: 0}
+
+    def copy(self):
+        """复制目录，O(1)：与原目录共用各列，修改副本时才复制被修改的列，不影响原目录"""
+        catalog = PrizeCatalog(tier_weights=self.tier_weights)
+        for column in SHARED_COLUMNS:
+            setattr(catalog, column, getattr(self, column))
+        catalog._length = self._length
+        catalog._total_weight = self._total_weight
+        catalog._shared = set(SHARED_COLUMNS)
+        self._shared.update(SHARED_COLUMNS)
+        return catalog
+
+    def index_of(self, name):
+        """按名称查找奖品索引，不存在时返回-1"""
+        if self.name_index is None:
+            self._rebuild_name_index()
+        index = self.name_index.get(name, -1)
+        # 共用的名称索引中可能有副本追加的、超出本目录范围的奖品
+        return index if index < len(self) else -1
+
+    def tier_of(self, index):
+        """奖品的层级编号"""
+        return self.tier_column[index]
+
+    def is_tiered(self):
+        """是否有奖品设置了稀有度层级"""
+        return len(self.tier_names) > 1
+
+    def weights(self):
+        """权重数组（目录内部的数组，调用方不应修改）"""
+        if len(self.weight_column) != len(self):
+            return self.weight_column[:len(self)]
+        return self.weight_column
+
+    def name_column(self):
+        """名称列表（目录内部的列表，调用方不应修改）"""
+        if len(self.names) != len(self):
+            return self.names[:len(self)]
+        return self.names
+
+    def to_dicts(self):
+        """转为奖品字典列表（写入 config.json 用）"""
+        return [prize.to_dict() for prize in self]
+
+    def memory_size(self):
+        """列数据占用的字节数（不含字符串本身）"""
+        return len(self) * (self.weight_column.itemsize + self.tier_column.itemsize + 8 * 2)
+
+    def _invalidate_name_index(self):
+        """删除或改名后名称索引失效，下次查找时再重建（连续修改时只重建一次）"""
+        self.name_index = None
+        self._shared.discard('name_index')
+
+    def _rebuild_name_index(self):
+        """重建名称索引"""
+        self.name_index = {}
+        self._shared.discard('name_index')
+        for i, name in enumerate(self.names[:len(self)]):
+            self.name_index.setdefault(name, i)
+
+    @staticmethod
+    def iter_file(path):
+        """逐行读取目录文件中的奖品字典"""
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    @classmethod
+    def load(cls, path):
+        """从目录文件加载（每行一个奖品的紧凑JSON）"""
+        return cls(cls.iter_file(path))
+
+    def save(self, path):
+        """保存到目录文件，先写临时文件再原子替换"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for prize in self:
+                f.write(encoder.encode(prize.to_dict()))
+                f.write('\n')
+        os.replace(tmp_path, path)
+
+class CatalogSnapshot:
+    """某一版本的奖品目录及其别名表，发布后不再修改
+
+    抽奖时只需读取一次当前快照的引用，不需要加锁；修改奖品时复制目录、建好别名表后
+    整体替换为新的快照，正在使用旧快照的抽奖不受影响。
+    version 是本次运行中的递增版本号；revision 是保存在 config.json 中的版本标识，
+    记入每条抽奖记录（catalog_version），重算时据此判断奖品是否与当时一致。
+    """
+    __slots__ = ('catalog', 'sampler', 'version', 'revision')
+
+    def __init__(self, catalog, version=0, sampler=None, revision=None):
+        self.catalog = catalog
+        self.sampler = sampler if sampler is not None else build_sampler(catalog)
+        self.version = version
+        self.revision = revision if revision is not None else new_revision()
+
+    def probability(self, index):
+        """奖品 index 被抽中的概率"""
+        if isinstance(self.sampler, TieredSampler):
+            return self.sampler.probability(index, self.catalog)
+        catalog = self.catalog
+        total = catalog.total_weight
+        if total <= 0:
+            return 1 / len(catalog) if len(catalog) else 0
+        return max(catalog.weight_column[index], 0) / total
+
+    def tier_odds(self):
+        """各层级的 (名称, 概率)，没有层级时为空列表"""
+        if isinstance(self.sampler, TieredSampler):
+            return self.sampler.tier_odds()
+        return []
+
+def build_sampler(catalog):
+    """为目录建立采样器：有层级时先选层级再选奖品；大型目录先选块再选奖品；否则为一张别名表"""
+    if catalog.is_tiered():
+        return TieredSampler.from_catalog(catalog)
+    if len(catalog) > BLOCK_SAMPLER_THRESHOLD:
+        return BlockSampler.from_weights(catalog.weights())
+    return AliasSampler(catalog.weights())
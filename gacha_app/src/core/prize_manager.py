@@ -1,32 +1,116 @@
 import os
-import json
-import random
+import threading
 from datetime import datetime
 
+from .prize import Prize
+from .prize_catalog import PrizeCatalog, CatalogSnapshot
+from .sampler import BlockSampler, TieredSampler
+from .rng import CounterRNG
+from ..utils.config_store import ConfigStore
+from ..utils.file_watcher import FileWatcher, POLL_INTERVAL
+
+# 默认最多支持的奖品数量
+DEFAULT_MAX_PRIZES = 1000000
+# 超过该数量时奖品改为存入独立的目录文件，而不是内联在 config.json 中
+INLINE_PRIZE_LIMIT = 1000
+# 目录文件默认名称（相对配置文件目录）
+DEFAULT_CATALOG_FILE = 'prizes.jsonl'
+# 每次预留并写入 config.json 的随机数序号个数；程序重启后从预留的位置之后继续，序号不会重复
+RNG_RESERVE_BLOCK = 10000
+
+def with_defaults(prizes):
+    """逐个补全奖品缺少的属性（不修改原字典）"""
+    for prize in prizes:
+        if 'name' not in prize or 'weight' not in prize or 'image' not in prize:
+            prize = dict(prize)
+            prize.setdefault('name', "未命名奖品")
+            prize.setdefault('weight', 1)
+            prize.setdefault('image', "resources/images/prize1.png")
+        yield prize
+
 class PrizeManager:
-    def __init__(self, config_path):
+    def __init__(self, config_path, rng=None, store=None):
         self.config_path = config_path
-        self.prizes = []
-        self.max_prizes = 100  # 最大奖品数量
+        # 与 Config 共用的配置文档，保存奖品时不再重新读取 config.json
+        self.store = store if store is not None else ConfigStore(config_path)
+        # 每个奖池独立的随机数生成器；默认使用可重放的计数器生成器，
+        # 种子和流号保存在 config.json 的 "rng" 中，重启后仍可重算以前的抽奖
+        self._persist_rng = rng is None
+        self._rng_reserved = 0  # 已写入配置的序号上限（不含）
+        self._rng_lock = threading.Lock()  # 预留并取出序号时互斥，多个线程抽奖不会取到同一个序号
+        self.rng = rng if rng is not None else self._restore_rng()
+        self.catalog_file = None  # 目录文件名，None 表示内联在 config.json 中
+        self.max_prizes = DEFAULT_MAX_PRIZES  # 最大奖品数量
+        # 当前的奖品快照（目录 + 别名表 + 版本号），只整体替换、从不原地修改；
+        # 抽奖只读取一次引用，不加锁
+        self._snapshot = CatalogSnapshot(PrizeCatalog())
+        self._write_lock = threading.Lock()  # 修改奖品的线程之间互斥，读取不需要
+        self.watcher = None  # 监视配置文件的后台线程
         self.load_prizes()
     
+    @property
+    def catalog(self):
+        """当前的奖品目录（只读，修改请用 add_prize/update_prize/remove_prize/set_prizes）"""
+        return self._snapshot.catalog
+    
+    @catalog.setter
+    def catalog(self, catalog):
+        self._publish(catalog)
+    
+    @property
+    def version(self):
+        """奖品的版本号，每次修改或重新加载后加一，界面据此刷新"""
+        return self._snapshot.version
+    
+    def snapshot(self):
+        """当前的奖品快照，发布后不会再变化，可在任意线程中使用"""
+        return self._snapshot
+    
+    def _publish(self, catalog, sampler=None, revision=None):
+        """发布新的奖品目录：别名表在替换前建好，抽奖从不等待重建"""
+        snapshot = CatalogSnapshot(catalog, sampler=sampler, revision=revision)
+        with self._write_lock:
+            snapshot.version = self._snapshot.version + 1
+            self._snapshot = snapshot
+    
+    def _modify(self, change):
+        """在当前目录的副本上执行 change(catalog, sampler) 后发布
+        
+        change 返回 False 时放弃修改；返回新的采样器时直接使用（层级采样器只重建受影响的层级），
+        返回 None 时按新目录整体重建。
+        """
+        with self._write_lock:
+            snapshot = self._snapshot
+            catalog = snapshot.catalog.copy()
+            sampler = change(catalog, snapshot.sampler)
+            if sampler is False:
+                return False
+            self._snapshot = CatalogSnapshot(catalog, snapshot.version + 1, sampler)
+            return True
+    
+    @property
+    def prizes(self):
+        """奖品列表"""
+        return self.catalog.prizes
+    
+    @prizes.setter
+    def prizes(self, prizes):
+        self.set_prizes(prizes)
+    
+    def get_catalog_path(self):
+        """获取目录文件的完整路径"""
+        if not self.catalog_file:
+            return None
+        return os.path.join(os.path.dirname(self.config_path), self.catalog_file)
+    
     def load_prizes(self):
         """加载奖品配置"""
         try:
-            if os.path.exists(self.config_path):
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    if 'prizes' in config:
-                        self.prizes = config['prizes']
-                        
-                # 确保每个奖品都有必要的属性
-                for prize in self.prizes:
-                    if 'name' not in prize:
-                        prize['name'] = "未命名奖品"
-                    if 'weight' not in prize:
-                        prize['weight'] = 1
-                    if 'image' not in prize:
-                        prize['image'] = "resources/images/prize1.png"
+            catalog, self.max_prizes, self.catalog_file = self._read_prizes()
+            # 沿用上次保存奖品时的版本标识，重启后仍能重算以前的抽奖
+            self._publish(catalog, revision=self.store.get('catalog_version'))
+            if self.store.get('catalog_version') is None:
+                self.store.set('catalog_version', self._snapshot.revision)
             
             # 如果没有奖品，添加默认奖品
             if not self.prizes:
@@ -36,9 +120,78 @@ class PrizeManager:
             print(f"加载奖品配置失败: {e}")
             self.add_default_prizes()
     
+    def _read_prizes(self):
+        """从共享的配置文档（和目录文件）读取 (奖品目录, 最大奖品数量, 目录文件名)"""
+        prizes = []
+        max_prizes = DEFAULT_MAX_PRIZES
+        catalog_file = None
+        tier_weights = None
+        if self.store.exists():
+            config = self.store.load()
+            max_prizes = config.get('max_prizes', DEFAULT_MAX_PRIZES)
+            catalog_file = config.get('prize_catalog')
+            tier_weights = config.get('tiers')
+            catalog_path = (os.path.join(os.path.dirname(self.config_path), catalog_file)
+                            if catalog_file else None)
+            if catalog_path and os.path.exists(catalog_path):
+                prizes = PrizeCatalog.iter_file(catalog_path)
+            elif 'prizes' in config:
+                prizes = config['prizes']
+        return PrizeCatalog(with_defaults(prizes), tier_weights), max_prizes, catalog_file
+    
+    def reload_prizes(self):
+        """从磁盘重新加载奖品，返回奖品是否有变化
+        
+        新的奖品目录和别名表在调用线程中建好后作为新快照发布，
+        正在进行的抽奖使用旧快照或新快照，不会等待重建。
+        """
+        try:
+            if self.store.changed_on_disk():
+                self.store.reload()
+            catalog, max_prizes, catalog_file = self._read_prizes()
+        except Exception as e:
+            print(f"重新加载奖品配置失败: {e}")
+            return False
+        self.max_prizes = max_prizes
+        if catalog_file != self.catalog_file:
+            self.catalog_file = catalog_file
+            if self.watcher is not None:
+                self.watcher.set_paths(self._watched_paths())
+        if not len(catalog) or catalog == self.catalog:
+            return False
+        self._publish(catalog)
+        # 文件被外部修改：记下新的版本标识，重启后不会把修改前的抽奖按新奖品重算
+        self.store.set('catalog_version', self._snapshot.revision)
+        return True
+    
+    def _watched_paths(self):
+        return [path for path in (self.config_path, self.get_catalog_path()) if path]
+    
+    def start_watching(self, poll_interval=POLL_INTERVAL):
+        """在后台监视 config.json 和目录文件，被修改时自动重新加载奖品"""
+        if self.watcher is None:
+            self.watcher = FileWatcher(self._watched_paths(), lambda paths: self.reload_prizes(),
+                                       poll_interval)
+            # 自己保存的 config.json 不触发重新加载
+            self.store.add_save_listener(self._ignore_own_write)
+            self.watcher.start()
+    
+    def stop_watching(self):
+        """停止监视"""
+        if self.watcher is not None:
+            self.store.remove_save_listener(self._ignore_own_write)
+            self.watcher.stop()
+            self.watcher = None
+    
+    def _ignore_own_write(self, path):
+        """让文件监视把自己刚写入的文件记为已知"""
+        watcher = self.watcher
+        if watcher is not None:
+            watcher.ignore(path)
+    
     def add_default_prizes(self):
         """添加默认奖品"""
-        self.prizes = [
+        self.set_prizes([
             {
                 "name": "一等奖",
                 "weight": 10,
@@ -54,27 +207,37 @@ class PrizeManager:
                 "weight": 60,
                 "image": "resources/images/prize3.png"
             }
-        ]
+        ])
         self.save_prizes()
     
     def save_prizes(self):
-        """保存奖品配置"""
+        """保存奖品配置
+        
+        奖品较多时写入独立的目录文件（每行一个奖品），config.json 只记录文件名。
+        config.json 中的奖品在共享的配置文档中修改，稍后与其他修改合并写入。
+        """
+        snapshot = self._snapshot  # 保存期间奖品被修改时仍写入同一版本
+        catalog = snapshot.catalog
         try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
-            
-            config = {}
-            if os.path.exists(self.config_path):
-                try:
-                    with open(self.config_path, 'r', encoding='utf-8') as f:
-                        config = json.load(f)
-                except:
-                    config = {}
-            
-            config['prizes'] = self.prizes
-            
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=4)
+            if catalog.tier_weights:
+                self.store.update({'tiers': dict(catalog.tier_weights)})
+            else:
+                self.store.pop('tiers')
+            if self.catalog_file or len(catalog) > INLINE_PRIZE_LIMIT:
+                if not self.catalog_file:
+                    self.catalog_file = DEFAULT_CATALOG_FILE
+                # 确保目录存在
+                os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
+                catalog.save(self.get_catalog_path())
+                self._ignore_own_write(self.get_catalog_path())
+                
+                # 每次保存都会调用，值没有变化时 store 不记修改，配置文件不会被改写
+                self.store.update({'prize_catalog': self.catalog_file})
+                self.store.pop('prizes')
+            else:
+                # 保存副本，之后修改奖品不会影响尚未写入的文档
+                self.store.update({'prizes': catalog.to_dicts()})
+            self.store.update({'catalog_version': snapshot.revision})
                 
             return True
         except Exception as e:
@@ -86,49 +249,234 @@ class PrizeManager:
         return self.prizes
     
     def set_prizes(self, prizes):
-        """设置所有奖品"""
-        self.prizes = prizes
+        """设置所有奖品（保留当前的层级权重配置）"""
+        self._publish(PrizeCatalog(prizes, self.catalog.tier_weights))
+    
+    def set_tier_weights(self, tier_weights):
+        """设置各稀有度层级的权重，如 {"SSR": 3, "SR": 17, "R": 80}（层内别名表不重建）"""
+        def change(catalog, sampler):
+            catalog.tier_weights = dict(tier_weights)
+            if isinstance(sampler, TieredSampler):
+                return TieredSampler(sampler.tiers, catalog.tier_weights)
+        return self._modify(change)
+    
+    def get_tier_odds(self):
+        """各稀有度层级的 (名称, 概率)，O(层级数)；没有层级时为空列表"""
+        return self._snapshot.tier_odds()
+    
+    def get_probability(self, index):
+        """奖品 index 被抽中的概率（有层级时为层级概率 × 层内权重占比）"""
+        snapshot = self._snapshot
+        if 0 <= index < len(snapshot.catalog):
+            return snapshot.probability(index)
+        return 0
+    
+    def get_prize_index(self, name):
+        """按名称查找奖品索引，不存在时返回-1"""
+        return self.catalog.index_of(name)
+    
+    def get_total_weight(self):
+        """获取总权重"""
+        return self.catalog.total_weight
     
     def get_prize(self, index):
         """获取指定索引的奖品"""
-        if 0 <= index < len(self.prizes):
-            return self.prizes[index]
+        catalog = self.catalog
+        if 0 <= index < len(catalog):
+            return catalog[index]
         return None
     
-    def add_prize(self, name, weight, image):
-        """添加奖品"""
-        if len(self.prizes) >= self.max_prizes:
+    def add_prize(self, name, weight, image, tier=None, extra=None):
+        """添加奖品（复制当前目录，修改后发布新快照）"""
+        def change(catalog, sampler):
+            if len(catalog) >= self.max_prizes:
+                return False
+            catalog.append(Prize(name, weight, image, extra, tier))
+            if isinstance(sampler, TieredSampler):
+                return sampler.appended(catalog, len(catalog) - 1)
+            if isinstance(sampler, BlockSampler) and not catalog.is_tiered():
+                return sampler.appended(catalog, len(catalog) - 1)
+        return self._modify(change)
+    
+    def update_prize(self, index, name, weight, image, tier=None, extra=None):
+        """更新奖品（有层级时只重建该奖品所在层级的别名表，大型目录只重建所在的块）"""
+        def change(catalog, sampler):
+            if not 0 <= index < len(catalog):
+                return False
+            old_tier = catalog.tier_of(index)
+            catalog.update(index, Prize(name, weight, image, extra, tier))
+            if isinstance(sampler, TieredSampler):
+                return sampler.updated(catalog, index, old_tier)
+            if isinstance(sampler, BlockSampler) and not catalog.is_tiered():
+                return sampler.updated(catalog, index)
+        return self._modify(change)
+    
+    def remove_prize(self, index):
+        """删除奖品（增量更新采样器的方式与 update_prize 相同）"""
+        def change(catalog, sampler):
+            if not 0 <= index < len(catalog):
+                return False
+            old_tier = catalog.tier_of(index)
+            catalog.remove(index)
+            if isinstance(sampler, TieredSampler):
+                return sampler.removed(catalog, index, old_tier)
+            if isinstance(sampler, BlockSampler):
+                return sampler.removed(catalog, index)
+        return self._modify(change)
+    
+    def apply_edits(self, edits, version=None):
+        """按顺序提交编辑记录，每条为 ('add', prize)、('update', index, prize) 或 ('remove', index)
+        
+        逐条调用 add_prize/update_prize/remove_prize，采样器只增量更新，不整体重建。
+        给出 version 且奖品已被其他地方修改（版本号不同）时不提交；任何一条失败时停止。
+        返回是否全部提交成功。
+        """
+        if version is not None and version != self.version:
             return False
+        for edit in edits:
+            if edit[0] == 'add':
+                prize = edit[1]
+                done = self.add_prize(prize.name, prize.weight, prize.image, prize.tier, prize.extra)
+            elif edit[0] == 'update':
+                index, prize = edit[1], edit[2]
+                done = self.update_prize(index, prize.name, prize.weight, prize.image,
+                                         prize.tier, prize.extra)
+            else:
+                done = self.remove_prize(edit[1])
+            if not done:
+                return False
+        return True
+    
+    def _restore_rng(self):
+        """按 config.json 中的种子和流号恢复随机数生成器，序号从上次预留的位置继续"""
+        state = self.store.get('rng') or {}
+        if 'seed' in state:
+            rng = CounterRNG(state['seed'], state.get('stream', 0), state.get('reserved', 0))
+        else:
+            rng = CounterRNG()
+        # 第一次抽奖时才预留并写入
+        self._rng_reserved = rng.counter
+        return rng
+    
+    def _reserve_sequences(self, rng, count):
+        """即将使用 count 个随机数：已预留的序号用掉一半时预留下一段
+        
+        新的预留范围通过延迟保存写入，不阻塞抽奖；剩下的一半预留足够覆盖写入前的抽奖，
+        程序意外退出后也不会重复使用已发出的序号。只有超出已预留的范围时
+        （启动后的第一次抽奖、一次抽很多次）才立即写入。
+        """
+        if rng.counter + count + RNG_RESERVE_BLOCK // 2 <= self._rng_reserved:
+            return
+        exhausted = rng.counter + count > self._rng_reserved
+        self._rng_reserved = rng.counter + count + RNG_RESERVE_BLOCK
+        self.store.set('rng', {'seed': rng.seed, 'stream': rng.stream,
+                               'reserved': self._rng_reserved})
+        if exhausted:
+            self.store.flush()
+    
+    def _take_sequences(self, rng, count, persist):
+        """从计数器生成器中原子地取出 count 个连续序号，返回第一个序号
+        
+        persist 为 True 时（共用的 self.rng）先在同一把锁内预留并记入配置。
+        """
+        if not persist:
+            return rng.reserve(count)
+        with self._rng_lock:
+            if self._persist_rng:
+                self._reserve_sequences(rng, count)
+            return rng.reserve(count)
+    
+    def get_sampler(self):
+        """获取当前奖品列表对应的别名表"""
+        return self._snapshot.sampler
+    
+    def draw(self, rng=None):
+        """抽奖（别名表采样，每次O(1)）
+        
+        多个线程可以同时抽奖：计数器生成器的序号在锁内原子地取出，不会重复；
+        也可以各自传入独立的随机数生成器（如 self.rng.spawn(n)）。
+        """
+        snapshot = self._snapshot
+        catalog = snapshot.catalog
+        if not catalog.prizes:
+            return None
             
-        prize = {
-            "name": name,
-            "weight": weight,
-            "image": image
-        }
+        persist = rng is None
+        if rng is None:
+            rng = self.rng
+        if hasattr(rng, 'reserve'):
+            sequence = self._take_sequences(rng, 1, persist)
+            index = snapshot.sampler.index_for(rng.random_at(sequence))
+        else:
+            sequence = None
+            index = snapshot.sampler.sample(rng)
         
-        self.prizes.append(prize)
-        return True
+        # 返回抽中的奖品和索引
+        return {
+            "prize": catalog.prizes[index],
+            "index": index,
+            "sequence": sequence,
+            "catalog_version": snapshot.revision,
+            "timestamp": datetime.now().isoformat()
+        }
     
-    def update_prize(self, index, name, weight, image):
-        """更新奖品"""
-        if 0 <= index < len(self.prizes):
-            self.prizes[index] = {
-                "name": name,
-                "weight": weight,
-                "image": image
+    def draw_many(self, count, rng=None):
+        """连续抽奖 count 次（如十连抽），一次采样返回所有结果"""
+        snapshot = self._snapshot
+        catalog = snapshot.catalog
+        if not catalog.prizes or count <= 0:
+            return []
+            
+        persist = rng is None
+        if rng is None:
+            rng = self.rng
+        if hasattr(rng, 'reserve'):
+            start = self._take_sequences(rng, count, persist)
+            indices = [snapshot.sampler.index_for(rng.random_at(start + i)) for i in range(count)]
+        else:
+            start = None
+            indices = snapshot.sampler.sample_many(count, rng)
+        timestamp = datetime.now().isoformat()
+        return [
+            {
+                "prize": catalog.prizes[index],
+                "index": index,
+                "sequence": start + i if start is not None else None,
+                "catalog_version": snapshot.revision,
+                "timestamp": timestamp
             }
-            return True
-        return False
+            for i, index in enumerate(indices)
+        ]
     
-    def remove_prize(self, index):
-        """删除奖品"""
-        if 0 <= index < len(self.prizes):
-            del self.prizes[index]
-            return True
-        return False
+    def replay_draw(self, sequence, catalog_version=None):
+        """重算序号为 sequence 的抽奖的结果索引（O(1)，用于审计）
+        
+        要求随机数生成器是计数器生成器，且奖品列表与当时一致：给出 catalog_version
+        （抽奖时的奖品版本标识）而与当前奖品的版本不同时返回 None；
+        种子保存在 config.json 中，以前运行时的抽奖也可以重算。
+        """
+        snapshot = self._snapshot
+        if not len(snapshot.catalog) or not hasattr(self.rng, 'random_at'):
+            return None
+        if catalog_version is not None and catalog_version != snapshot.revision:
+            return None
+        return snapshot.sampler.index_for(self.rng.random_at(sequence))
+    
+    def replay_record(self, record):
+        """重算一条历史记录的结果，返回 (重算的索引, 是否与记录一致)
+        
+        记录没有序号，或抽奖后奖品已被修改（记录的 catalog_version 与当前不同）时返回 None。
+        """
+        sequence = record.get('sequence')
+        if sequence is None:
+            return None
+        index = self.replay_draw(sequence, record.get('catalog_version'))
+        if index is None:
+            return None
+        return index, index == record.get('index')
     
-    def draw(self):
-        """抽奖"""
+    def draw_reference(self):
+        """抽奖（线性累积扫描的参考实现，用于校验别名表）"""
         if not self.prizes:
             return None
             
@@ -139,10 +487,10 @@ class PrizeManager:
         total_weight = sum(weights)
         if total_weight <= 0:
             # 如果总权重为0，则平均概率
-            index = random.randint(0, len(self.prizes) - 1)
+            index = self.rng.randint(0, len(self.prizes) - 1)
         else:
             # 按权重随机
-            r = random.randint(1, total_weight)
+            r = self.rng.randint(1, total_weight)
             cumulative_weight = 0
             index = 0
             for i, weight in enumerate(weights):
@@ -159,5 +507,5 @@ class PrizeManager:
         }
     
     def get_weights(self):
-        """获取所有奖品的权重列表"""
-        return [prize.get('weight', 1) for prize in self.prizes] 
\ No newline at end of file
+        """获取所有奖品的权重（目录内部的数组，不分配新列表；调用方不应修改）"""
+        return self.catalog.weights() 
\ No newline at end of file
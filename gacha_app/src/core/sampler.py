@@ -0,0 +1,445 @@
+import math
+import random
+from bisect import bisect_right
+
+import numpy as np
+
+# 向量化采样时每批处理的数量，限制临时数组的内存占用
+VECTOR_CHUNK_SIZE = 1 << 20
+# 小于1的最大浮点数，层内相对位置不会达到1
+ONE_BELOW = math.nextafter(1.0, 0.0) if hasattr(math, 'nextafter') else 1.0 - 2 ** -53
+
+class AliasSampler:
+    """Walker/Vose 别名表采样器
+
+    构建一次 O(n)，之后每次采样 O(1)，与奖品数量无关。
+    """
+    def __init__(self, weights):
+        self.size = len(weights)
+        self.prob = [1.0] * self.size
+        self.alias = list(range(self.size))
+        self._arrays = None  # NumPy 版本的别名表，首次向量化采样时创建
+
+        # 负权重按0处理；总权重为0时退化为平均概率
+        weights = [max(w, 0) for w in weights]
+        total = sum(weights)
+        if self.size == 0 or total <= 0:
+            return
+
+        # 将权重缩放到平均值为1
+        scaled = [w * self.size / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = (scaled[l] + scaled[s]) - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+
+        # 剩余的桶（包括浮点误差造成的）概率为1
+        for i in large + small:
+            self.prob[i] = 1.0
+
+    def __len__(self):
+        return self.size
+
+    def index_for(self, u):
+        """把一个 [0, 1) 随机数映射为索引"""
+        u = u * self.size
+        i = int(u)
+        if i >= self.size:
+            i = self.size - 1
+        return i if u - i < self.prob[i] else self.alias[i]
+
+    def sample(self, rng=random):
+        """采样一个索引，只消耗一个随机数"""
+        return self.index_for(rng.random())
+
+    def sample_many(self, count, rng=random):
+        """批量采样多个索引"""
+        return [self.sample(rng) for _ in range(count)]
+
+    def as_arrays(self):
+        """获取 NumPy 数组形式的 (prob, alias)"""
+        if self._arrays is None:
+            self._arrays = (np.asarray(self.prob, dtype=np.float64),
+                            np.asarray(self.alias, dtype=np.int32))
+        return self._arrays
+
+    def sample_array(self, count, np_rng=None):
+        """向量化批量采样，返回 int32 索引数组"""
+        if np_rng is None:
+            np_rng = np.random.default_rng()
+        out = np.empty(count, dtype=np.int32)
+        if self.size == 0:
+            return out[:0]
+
+        for start in range(0, count, VECTOR_CHUNK_SIZE):
+            stop = min(start + VECTOR_CHUNK_SIZE, count)
+            out[start:stop] = self.indices_for(np_rng.random(stop - start))
+        return out
+
+    def indices_for(self, u):
+        """index_for 的向量化版本：把 [0, 1) 随机数数组映射为 int32 索引数组"""
+        prob, alias = self.as_arrays()
+        u = u * self.size
+        index = u.astype(np.int32)
+        np.minimum(index, self.size - 1, out=index)
+        accept = (u - index) < prob[index]
+        return np.where(accept, index, alias[index])
+
+    def count_samples(self, count, np_rng=None):
+        """向量化采样 count 次，只返回每个索引的抽中次数"""
+        if np_rng is None:
+            np_rng = np.random.default_rng()
+        counts = np.zeros(self.size, dtype=np.int64)
+        for start in range(0, count, VECTOR_CHUNK_SIZE):
+            chunk = min(VECTOR_CHUNK_SIZE, count - start)
+            counts += np.bincount(self.sample_array(chunk, np_rng), minlength=self.size)
+        return counts
+
+class Tier:
+    """稀有度层级：层内奖品的索引（升序）、层内别名表和层内总权重"""
+    __slots__ = ('name', 'members', 'sampler', 'total')
+
+    def __init__(self, name, members, weights):
+        self.name = name
+        self.members = members  # 奖品在目录中的索引，np.int64 数组，建好后不再修改
+        member_weights = [weights[i] for i in members.tolist()]
+        self.sampler = AliasSampler(member_weights)
+        self.total = sum(max(w, 0) for w in member_weights)
+
+    def __len__(self):
+        return len(self.members)
+
+    def shifted(self, removed):
+        """目录中删除了索引 removed 之后的本层（别名表不变，只平移后面的索引）"""
+        tier = Tier.__new__(Tier)
+        tier.name = self.name
+        tier.members = self.members - (self.members > removed)
+        tier.sampler = self.sampler
+        tier.total = self.total
+        return tier
+
+class TieredSampler:
+    """两级采样器：先按层级概率选稀有度层级（SSR/SR/R），再用该层的别名表选层内奖品
+
+    层级的权重取目录 tier_weights 中的配置，没有配置时为层内奖品的权重之和
+    （此时与按奖品权重直接采样的概率相同）。
+    每次采样只消耗一个随机数：u 先落入某层级的概率区间，区间内的相对位置再交给层内别名表，
+    因此与 AliasSampler 一样支持 index_for 重放。
+    修改某个奖品时只需重建它所在层级的别名表，各层级概率可在 O(层级数) 内查询。
+    """
+    def __init__(self, tiers, tier_weights=None):
+        self.tiers = tiers  # 层级编号 -> Tier（与目录的 tier_names 对应，可能为空层）
+        self.tier_weights = dict(tier_weights) if tier_weights else {}
+        self.size = sum(len(tier) for tier in tiers)
+
+        weights = [max(self.tier_weights.get(tier.name, tier.total), 0) if len(tier) else 0
+                   for tier in tiers]
+        total = sum(weights)
+        if total <= 0:
+            # 所有权重都为0时退化为每个奖品平均概率
+            weights = [len(tier) for tier in tiers]
+            total = self.size
+        self.tier_prob = [w / total if total else 0 for w in weights]
+        self.upper = []  # upper[t] = 前 t+1 个层级的概率和
+        cumulative = 0.0
+        for p in self.tier_prob:
+            cumulative += p
+            self.upper.append(cumulative)
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        """按目录的层级列分组建立各层别名表，O(n)"""
+        tier_ids = np.empty(0, dtype=np.uint16)
+        if len(catalog):
+            # 共用的层级列可能比目录长
+            tier_ids = np.frombuffer(catalog.tier_column, dtype=np.uint16)[:len(catalog)]
+        order = np.argsort(tier_ids, kind='stable').astype(np.int64)
+        bounds = np.searchsorted(tier_ids[order], np.arange(len(catalog.tier_names) + 1))
+        weights = catalog.weights()
+        tiers = [Tier(name, order[bounds[t]:bounds[t + 1]], weights)
+                 for t, name in enumerate(catalog.tier_names)]
+        return cls(tiers, catalog.tier_weights)
+
+    def __len__(self):
+        return self.size
+
+    # ---- 增量更新：返回新的采样器，未受影响的层级直接共用 ----
+
+    def _replace(self, catalog, changed, removed=None):
+        """用 changed（层级编号 -> 新的成员索引数组）重建对应层级，其余层级共用"""
+        tiers = list(self.tiers)
+        weights = catalog.weights()
+        for t in range(len(tiers), len(catalog.tier_names)):
+            tiers.append(Tier(catalog.tier_names[t], np.empty(0, dtype=np.int64), weights))
+        for t, tier in enumerate(tiers):
+            if t in changed:
+                tiers[t] = Tier(catalog.tier_names[t], changed[t], weights)
+            elif removed is not None:
+                tiers[t] = tier.shifted(removed)
+        return TieredSampler(tiers, catalog.tier_weights)
+
+    def _members(self, t):
+        return self.tiers[t].members if t < len(self.tiers) else np.empty(0, dtype=np.int64)
+
+    def appended(self, catalog, index):
+        """目录末尾追加了奖品 index 之后的采样器，只重建该奖品所在的层级"""
+        t = catalog.tier_of(index)
+        return self._replace(catalog, {t: np.append(self._members(t), index)})
+
+    def updated(self, catalog, index, old_tier):
+        """奖品 index 被修改（原层级为 old_tier）之后的采样器"""
+        t = catalog.tier_of(index)
+        if t == old_tier:
+            return self._replace(catalog, {t: self._members(t)})
+        old = self._members(old_tier)
+        new = self._members(t)
+        return self._replace(catalog, {
+            old_tier: old[old != index],
+            t: np.insert(new, np.searchsorted(new, index), index),
+        })
+
+    def removed(self, catalog, index, old_tier):
+        """删除奖品 index（原层级为 old_tier）之后的采样器；其他层级只平移索引"""
+        old = self._members(old_tier)
+        old = old[old != index]
+        return self._replace(catalog, {old_tier: old - (old > index)}, removed=index)
+
+    # ---- 采样 ----
+
+    def locate_tier(self, u):
+        """u 所在的层级编号和 u 在该层级概率区间内的相对位置"""
+        t = self._nonzero_tier(min(bisect_right(self.upper, u), len(self.upper) - 1))
+        r = (u - (self.upper[t] - self.tier_prob[t])) / self.tier_prob[t]
+        return t, min(max(r, 0.0), ONE_BELOW)
+
+    def _nonzero_tier(self, t):
+        """浮点误差使 u 落在末尾概率为0的层级时，取前面最近的概率非0的层级"""
+        while self.tier_prob[t] <= 0:
+            t -= 1
+        return t
+
+    def index_for(self, u):
+        """把一个 [0, 1) 随机数映射为目录中的奖品索引"""
+        t, r = self.locate_tier(u)
+        tier = self.tiers[t]
+        return int(tier.members[tier.sampler.index_for(r)])
+
+    def sample(self, rng=random):
+        """采样一个索引，只消耗一个随机数"""
+        return self.index_for(rng.random())
+
+    def sample_many(self, count, rng=random):
+        """批量采样多个索引"""
+        return [self.sample(rng) for _ in range(count)]
+
+    def sample_array(self, count, np_rng=None):
+        """向量化批量采样，返回 int32 索引数组"""
+        if np_rng is None:
+            np_rng = np.random.default_rng()
+        out = np.empty(count, dtype=np.int32)
+        if self.size == 0:
+            return out[:0]
+
+        upper = np.asarray(self.upper)
+        prob = np.asarray(self.tier_prob)
+        for start in range(0, count, VECTOR_CHUNK_SIZE):
+            stop = min(start + VECTOR_CHUNK_SIZE, count)
+            u = np_rng.random(stop - start)
+            tier_index = np.minimum(np.searchsorted(upper, u, side='right'), len(upper) - 1)
+            chunk = out[start:stop]
+            for t in np.unique(tier_index).tolist():
+                mask = tier_index == t
+                t = self._nonzero_tier(t)
+                r = (u[mask] - (upper[t] - prob[t])) / prob[t]
+                np.clip(r, 0.0, ONE_BELOW, out=r)
+                tier = self.tiers[t]
+                chunk[mask] = tier.members[tier.sampler.indices_for(r)]
+        return out
+
+    def count_samples(self, count, np_rng=None):
+        """向量化采样 count 次，只返回每个索引的抽中次数"""
+        if np_rng is None:
+            np_rng = np.random.default_rng()
+        counts = np.zeros(self.size, dtype=np.int64)
+        for start in range(0, count, VECTOR_CHUNK_SIZE):
+            chunk = min(VECTOR_CHUNK_SIZE, count - start)
+            counts += np.bincount(self.sample_array(chunk, np_rng), minlength=self.size)
+        return counts
+
+    # ---- 概率 ----
+
+    def tier_odds(self):
+        """各非空层级的 (名称, 概率)，O(层级数)"""
+        return [(tier.name, p) for tier, p in zip(self.tiers, self.tier_prob) if len(tier)]
+
+    def probability(self, index, catalog):
+        """奖品 index 被抽中的概率 = 层级概率 × 层内权重占比"""
+        t = catalog.tier_of(index)
+        tier = self.tiers[t]
+        if tier.total <= 0:
+            return self.tier_prob[t] / len(tier)
+        return self.tier_prob[t] * max(catalog.weight_column[index], 0) / tier.total
+
+# 分块采样器每块的奖品数量
+BLOCK_SIZE = 1024
+
+class Block:
+    """分块采样器中的一块：一段连续索引的别名表和权重和"""
+    __slots__ = ('sampler', 'total')
+
+    def __init__(self, weights):
+        self.sampler = AliasSampler(weights)
+        self.total = sum(max(w, 0) for w in weights)
+
+    def __len__(self):
+        return self.sampler.size
+
+class BlockSampler:
+    """按位置分块的两级采样器，用于没有层级的大型目录
+
+    奖品按索引顺序每 BLOCK_SIZE 个分为一块，先按各块的权重和选块，再用块内别名表选奖品，
+    与 TieredSampler 一样每次采样只消耗一个随机数。修改、追加或删除一个奖品只重建它所在的块
+    （O(BLOCK_SIZE)），其余块直接共用，块的起始位置和概率区间在 O(块数) 内重新计算，
+    不需要整表重建。
+    """
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.starts = []  # starts[b] = 第 b 块第一个奖品的索引
+        self.size = 0
+        for block in blocks:
+            self.starts.append(self.size)
+            self.size += len(block)
+
+        weights = [block.total for block in blocks]
+        total = sum(weights)
+        if total <= 0:
+            # 所有权重都为0时退化为每个奖品平均概率
+            weights = [len(block) for block in blocks]
+            total = self.size
+        self.block_prob = [w / total if total else 0 for w in weights]
+        self.upper = []  # upper[b] = 前 b+1 块的概率和
+        cumulative = 0.0
+        for p in self.block_prob:
+            cumulative += p
+            self.upper.append(cumulative)
+        self._arrays = None  # 向量化采样用的拼接表，首次使用时创建
+
+    @classmethod
+    def from_weights(cls, weights):
+        """按 BLOCK_SIZE 分块建立，O(n)"""
+        return cls([Block(weights[start:start + BLOCK_SIZE])
+                    for start in range(0, len(weights), BLOCK_SIZE)])
+
+    def __len__(self):
+        return self.size
+
+    # ---- 增量更新：返回新的采样器，未受影响的块直接共用 ----
+
+    def _block_of(self, index):
+        return bisect_right(self.starts, index) - 1
+
+    def _rebuilt(self, catalog, b, size):
+        """把第 b 块按目录中的当前权重重建为 size 个奖品（size 为0时去掉该块）"""
+        blocks = list(self.blocks)
+        start = self.starts[b] if b < len(self.starts) else self.size
+        if size:
+            block = Block(catalog.weights()[start:start + size])
+            if b < len(blocks):
+                blocks[b] = block
+            else:
+                blocks.append(block)
+        else:
+            del blocks[b]
+        return BlockSampler(blocks)
+
+    def appended(self, catalog, index):
+        """目录末尾追加了奖品 index 之后的采样器：末块未满时重建末块，否则新开一块"""
+        if self.blocks and len(self.blocks[-1]) < BLOCK_SIZE:
+            b = len(self.blocks) - 1
+            return self._rebuilt(catalog, b, len(self.blocks[b]) + 1)
+        return self._rebuilt(catalog, len(self.blocks), 1)
+
+    def updated(self, catalog, index):
+        """奖品 index 的权重被修改之后的采样器"""
+        b = self._block_of(index)
+        return self._rebuilt(catalog, b, len(self.blocks[b]))
+
+    def removed(self, catalog, index):
+        """删除奖品 index 之后的采样器：所在块少一个奖品，后面的块只平移起始位置"""
+        b = self._block_of(index)
+        return self._rebuilt(catalog, b, len(self.blocks[b]) - 1)
+
+    # ---- 采样 ----
+
+    def index_for(self, u):
+        """把一个 [0, 1) 随机数映射为目录中的奖品索引"""
+        b = min(bisect_right(self.upper, u), len(self.upper) - 1)
+        while self.block_prob[b] <= 0:
+            b -= 1
+        r = (u - (self.upper[b] - self.block_prob[b])) / self.block_prob[b]
+        r = min(max(r, 0.0), ONE_BELOW)
+        return self.starts[b] + self.blocks[b].sampler.index_for(r)
+
+    def sample(self, rng=random):
+        """采样一个索引，只消耗一个随机数"""
+        return self.index_for(rng.random())
+
+    def sample_many(self, count, rng=random):
+        """批量采样多个索引"""
+        return [self.sample(rng) for _ in range(count)]
+
+    def as_arrays(self):
+        """向量化采样用的数组：各块的 (起点, 大小, 概率区间下界, 概率) 和拼接后的全局 prob/alias"""
+        if self._arrays is None:
+            starts = np.asarray(self.starts, dtype=np.int64)
+            sizes = np.asarray([len(block) for block in self.blocks], dtype=np.int64)
+            prob = np.asarray(self.block_prob, dtype=np.float64)
+            lower = np.asarray(self.upper, dtype=np.float64) - prob
+            alias_prob = np.concatenate([block.sampler.as_arrays()[0] for block in self.blocks])
+            # 块内别名换成全局索引
+            alias = np.concatenate([block.sampler.as_arrays()[1].astype(np.int64) + start
+                                    for block, start in zip(self.blocks, self.starts)])
+            self._arrays = (starts, sizes, lower, prob, alias_prob, alias)
+        return self._arrays
+
+    def sample_array(self, count, np_rng=None):
+        """向量化批量采样，返回 int32 索引数组"""
+        if np_rng is None:
+            np_rng = np.random.default_rng()
+        out = np.empty(count, dtype=np.int32)
+        if self.size == 0:
+            return out[:0]
+
+        starts, sizes, lower, prob, alias_prob, alias = self.as_arrays()
+        upper = np.asarray(self.upper)
+        # 浮点误差落到末尾概率为0的块时，取前面最近的概率非0的块
+        nonzero = np.maximum.accumulate(np.where(prob > 0, np.arange(len(prob)), 0))
+        for start in range(0, count, VECTOR_CHUNK_SIZE):
+            stop = min(start + VECTOR_CHUNK_SIZE, count)
+            u = np_rng.random(stop - start)
+            b = nonzero[np.minimum(np.searchsorted(upper, u, side='right'), len(upper) - 1)]
+            r = np.clip((u - lower[b]) / prob[b], 0.0, ONE_BELOW) * sizes[b]
+            local = np.minimum(r.astype(np.int64), sizes[b] - 1)
+            index = starts[b] + local
+            accept = (r - local) < alias_prob[index]
+            out[start:stop] = np.where(accept, index, alias[index])
+        return out
+
+    def count_samples(self, count, np_rng=None):
+        """向量化采样 count 次，只返回每个索引的抽中次数"""
+        if np_rng is None:
+            np_rng = np.random.default_rng()
+        counts = np.zeros(self.size, dtype=np.int64)
+        for start in range(0, count, VECTOR_CHUNK_SIZE):
+            chunk = min(VECTOR_CHUNK_SIZE, count - start)
+            counts += np.bincount(self.sample_array(chunk, np_rng), minlength=self.size)
+        return counts
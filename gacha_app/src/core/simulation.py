@@ -0,0 +1,37 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+def split_draws(num_draws, workers):
+    """把抽奖次数尽量平均地分给各个进程"""
+    base, extra = divmod(num_draws, workers)
+    return [base + (1 if i < extra else 0) for i in range(workers)]
+
+def _count_worker(sampler, num_draws, seed_seq):
+    """子进程：用独立的随机数流采样，只返回计数"""
+    return sampler.count_samples(num_draws, np.random.default_rng(seed_seq))
+
+def parallel_simulate(sampler, num_draws, workers=None, seed=None):
+    """多进程蒙特卡洛模拟，返回每个奖品的抽中次数数组
+    
+    每个子进程从 SeedSequence(seed) 派生出独立的随机数流，
+    相同的 seed 和 workers 总能得到相同的结果。
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, num_draws)) if num_draws > 0 else 1
+    
+    seed_seqs = np.random.SeedSequence(seed).spawn(workers)
+    shares = split_draws(num_draws, workers)
+    
+    # 单进程时直接在当前进程计算，避免进程池开销
+    if workers == 1:
+        return _count_worker(sampler, shares[0], seed_seqs[0])
+    
+    counts = np.zeros(len(sampler), dtype=np.int64)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for worker_counts in executor.map(_count_worker,
+                                          [sampler] * workers, shares, seed_seqs):
+            counts += worker_counts
+    return counts
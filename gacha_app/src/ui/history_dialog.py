@@ -1,16 +1,33 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-from ..utils.config import COLOR_PALETTE
-from datetime import datetime
+from tkinter import ttk, messagebox, filedialog
+import threading
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import os
 
+# 抽奖记录表格每页加载的条数
+RECORDS_PAGE_SIZE = 100
+
+# 导出进度的刷新间隔（毫秒）
+EXPORT_POLL_MS = 100
+
+# 图表使用的颜色
+CHART_COLORS = ['#FFC107', '#2196F3', '#4CAF50', '#F44336', '#9C27B0',
+                '#FF9800', '#00BCD4', '#8BC34A', '#E91E63', '#607D8B']
+
+def prize_color(prize_name):
+    """按奖品名称分配一个稳定的图表颜色"""
+    return CHART_COLORS[sum(map(ord, prize_name)) % len(CHART_COLORS)]
+
 class HistoryDialog(tk.Toplevel):
     def __init__(self, parent, history):
         super().__init__(parent)
         self.history = history
         
+        # 后台导出线程及其进度（由导出线程写入，界面线程定时读取）
+        self.export_thread = None
+        self.export_state = None
+        
         self.title("历史记录")
         self.geometry("800x600")
         self.resizable(True, True)
@@ -119,6 +136,13 @@ class HistoryDialog(tk.Toplevel):
         scrollbar_y.grid(row=0, column=1, sticky='ns')
         scrollbar_x.grid(row=1, column=0, sticky='ew')
         
+        # 分页加载更早的记录
+        self.records_offset = 0
+        self.record_ids = {}  # 表格行 -> 记录编号
+        self.load_more_button = ttk.Button(parent, text="加载更多",
+                                           command=self.load_more_records)
+        self.load_more_button.grid(row=2, column=0, columnspan=2, pady=(5, 0))
+        
         # 配置网格
         parent.grid_columnconfigure(0, weight=1)
         parent.grid_rowconfigure(0, weight=1)
@@ -206,23 +230,36 @@ class HistoryDialog(tk.Toplevel):
             print(f"加载图表失败: {e}")
         
         # 更新状态栏
-        history_data = self.history.load()
-        total_draws = len(history_data.get('draws', []))
-        self.status_label.config(text=f"共 {total_draws} 次抽奖记录")
+        self.update_records_status()
+        
+    def update_records_status(self):
+        """在状态栏显示记录总数和已加载的条数"""
+        total_draws = self.history.count()
+        if total_draws > self.records_offset:
+            self.status_label.config(text=f"共 {total_draws} 次抽奖记录，显示最近 {self.records_offset} 条")
+        else:
+            self.status_label.config(text=f"共 {total_draws} 次抽奖记录")
         
     def load_records(self):
-        """加载抽奖记录"""
+        """加载抽奖记录（第一页）"""
         # 清空表格
         for item in self.records_tree.get_children():
             self.records_tree.delete(item)
-            
-        # 加载数据
-        history_data = self.history.load()
-        for i, draw in enumerate(reversed(history_data.get('draws', []))):
+        self.records_offset = 0
+        self.record_ids = {}
+        self.load_more_records(update_status=False)
+        
+        # 设置交替行颜色
+        self.records_tree.tag_configure('odd', background='#f0f0f0')
+        self.records_tree.tag_configure('even', background='#ffffff')
+        
+    def load_more_records(self, update_status=True):
+        """按页从存储中读取下一批更早的记录，追加到表格末尾"""
+        records = self.history.page(self.records_offset, RECORDS_PAGE_SIZE)
+        for i, draw in enumerate(records, self.records_offset):
             try:
-                # 转换时间格式
-                timestamp = datetime.fromisoformat(draw['timestamp'])
-                time_str = timestamp.strftime("%Y-%m-%d %H:%M:%S")
+                # ISO 时间戳直接截取到秒，不逐行解析
+                time_str = draw['timestamp'][:19].replace('T', ' ')
                 
                 prize_name = draw['prize']['name']
                 prize_weight = draw['prize']['weight']
@@ -236,13 +273,18 @@ class HistoryDialog(tk.Toplevel):
                 # 交替行颜色
                 tags = ('even',) if i % 2 == 0 else ('odd',)
                 
-                self.records_tree.insert('', tk.END, values=values, tags=tags)
+                item = self.records_tree.insert('', tk.END, values=values, tags=tags)
+                if draw.get('id') is not None:
+                    self.record_ids[item] = draw['id']
             except Exception as e:
                 print(f"加载记录失败: {e}")
-                
-        # 设置交替行颜色
-        self.records_tree.tag_configure('odd', background='#f0f0f0')
-        self.records_tree.tag_configure('even', background='#ffffff')
+        self.records_offset += len(records)
+        
+        # 不足一页说明已经没有更早的记录
+        self.load_more_button.config(
+            state=tk.NORMAL if len(records) == RECORDS_PAGE_SIZE else tk.DISABLED)
+        if update_status:
+            self.update_records_status()
                 
     def load_statistics(self):
         """加载统计信息"""
@@ -251,9 +293,8 @@ class HistoryDialog(tk.Toplevel):
             self.stats_tree.delete(item)
             
         # 加载数据
-        history_data = self.history.load()
-        stats = history_data.get('statistics', {})
-        total_draws = len(history_data.get('draws', []))
+        stats = self.get_statistics()
+        total_draws = sum(data['count'] for data in stats.values())
         
         if total_draws > 0:
             for i, (prize_name, data) in enumerate(sorted(stats.items(), 
@@ -278,11 +319,17 @@ class HistoryDialog(tk.Toplevel):
             self.stats_tree.tag_configure('odd', background='#f0f0f0')
             self.stats_tree.tag_configure('even', background='#ffffff')
                 
+    def get_statistics(self):
+        """获取每个奖品的统计 {奖品名称: {'count': 次数, 'color': 颜色}}"""
+        return {
+            prize_name: {'count': count, 'color': prize_color(prize_name)}
+            for prize_name, count in self.history.count_by_prize().items()
+        }
+        
     def load_charts(self):
         """加载图表"""
-        history_data = self.history.load()
-        stats = history_data.get('statistics', {})
-        total_draws = len(history_data.get('draws', []))
+        stats = self.get_statistics()
+        total_draws = sum(data['count'] for data in stats.values())
         
         if total_draws > 0:
             # 饼图
@@ -292,7 +339,7 @@ class HistoryDialog(tk.Toplevel):
             self.create_bar_chart(stats, total_draws)
             
             # 时间趋势图
-            self.create_trend_chart(history_data.get('draws', []))
+            self.create_trend_chart(self.history.get_rollups('daily'))
             
     def create_pie_chart(self, stats, total_draws):
         """创建饼图"""
@@ -388,11 +435,8 @@ class HistoryDialog(tk.Toplevel):
         except Exception as e:
             print(f"创建柱状图失败: {e}")
         
-    def create_trend_chart(self, draws):
-        """创建时间趋势图"""
-        if not draws:
-            return
-            
+    def create_trend_chart(self, daily_counts):
+        """创建时间趋势图，数据为按日汇总的次数 {日期: {奖品名称: 次数}}"""
         try:
             # 获取趋势图页面
             notebook = self.winfo_children()[0].winfo_children()[3]
@@ -406,44 +450,18 @@ class HistoryDialog(tk.Toplevel):
             for widget in trend_frame.winfo_children():
                 widget.destroy()
                 
-            # 准备数据
-            dates = []
+            # 准备数据：每个奖品按日期排序的次数
             prizes = {}
-            
-            for draw in draws:
-                try:
-                    timestamp = datetime.fromisoformat(draw['timestamp'])
-                    date_str = timestamp.strftime("%Y-%m-%d")
-                    
-                    prize_name = draw['prize']['name']
-                    prize_color = draw['prize']['color']
-                    
-                    dates.append(date_str)
-                    
+            for date_str in sorted(daily_counts):
+                for prize_name, count in daily_counts[date_str].items():
                     if prize_name not in prizes:
                         prizes[prize_name] = {
-                            'dates': [],
+                            'sorted_dates': [],
                             'counts': [],
-                            'color': prize_color
+                            'color': prize_color(prize_name)
                         }
-                        
-                    prizes[prize_name]['dates'].append(date_str)
-                    
-                except Exception as e:
-                    print(f"处理抽奖记录失败: {e}")
-                    
-            # 计算每个日期的累计次数
-            for prize_name, data in prizes.items():
-                date_counts = {}
-                for date in data['dates']:
-                    if date not in date_counts:
-                        date_counts[date] = 0
-                    date_counts[date] += 1
-                    
-                # 排序并转换为列表
-                sorted_dates = sorted(date_counts.keys())
-                data['sorted_dates'] = sorted_dates
-                data['counts'] = [date_counts[date] for date in sorted_dates]
+                    prizes[prize_name]['sorted_dates'].append(date_str)
+                    prizes[prize_name]['counts'].append(count)
                 
             # 创建图表
             fig, ax = plt.subplots(figsize=(6, 4), dpi=100)
@@ -513,18 +531,112 @@ class HistoryDialog(tk.Toplevel):
         if not selection:
             return
             
+        record_id = self.record_ids.get(selection[0])
+        if record_id is None:
+            messagebox.showinfo("提示", "这条记录没有编号，无法删除")
+            return
+            
         if messagebox.askyesno("确认", "确定要删除此记录吗？"):
-            # 获取选中的记录
-            values = self.records_tree.item(selection[0], 'values')
-            if values:
-                # 在这里实现删除记录的逻辑
-                # 注意：当前的History类没有提供删除单条记录的方法，需要扩展
-                messagebox.showinfo("提示", "此功能尚未实现")
+            if self.history.delete(record_id):
+                self.load_data()
+            else:
+                messagebox.showerror("错误", "删除记录失败！")
                 
     def export_data(self):
-        """导出数据"""
-        # 在这里实现导出数据的逻辑
-        messagebox.showinfo("提示", "此功能尚未实现")
+        """导出数据：在后台线程中分批写出，界面显示进度"""
+        if self.export_thread is not None and self.export_thread.is_alive():
+            messagebox.showinfo("提示", "正在导出，请稍候")
+            return
+            
+        path = filedialog.asksaveasfilename(
+            parent=self,
+            title="导出历史记录",
+            defaultextension='.csv',
+            filetypes=[("CSV 文件", "*.csv"), ("JSON Lines 文件", "*.jsonl")])
+        if not path:
+            return
+        fmt = 'jsonl' if path.lower().endswith('.jsonl') else 'csv'
+        
+        self.export_state = {
+            'done': 0,
+            'total': self.history.count(),
+            'finished': False,
+            'cancelled': False,
+            'error': None
+        }
+        self.show_export_progress(path)
+        
+        self.export_thread = threading.Thread(target=self.run_export, args=(path, fmt),
+                                              name='HistoryExport', daemon=True)
+        self.export_thread.start()
+        self.after(EXPORT_POLL_MS, self.poll_export)
+        
+    def show_export_progress(self, path):
+        """显示导出进度窗口"""
+        self.export_window = tk.Toplevel(self)
+        self.export_window.title("导出历史记录")
+        self.export_window.resizable(False, False)
+        self.export_window.transient(self)
+        self.export_window.protocol("WM_DELETE_WINDOW", self.cancel_export)
+        
+        frame = ttk.Frame(self.export_window, padding="15")
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(frame, text=f"正在导出到: {os.path.basename(path)}").pack(anchor=tk.W)
+        self.export_progress = ttk.Progressbar(frame, length=300, mode='determinate',
+                                               maximum=max(self.export_state['total'], 1))
+        self.export_progress.pack(fill=tk.X, pady=10)
+        self.export_label = ttk.Label(frame, text="准备中...")
+        self.export_label.pack(anchor=tk.W)
+        ttk.Button(frame, text="取消", command=self.cancel_export).pack(anchor=tk.E, pady=(10, 0))
+        
+    def run_export(self, path, fmt):
+        """后台线程：流式导出历史记录"""
+        # 导出模块同时是命令行入口，在这里才导入，避免 python -m 运行时重复导入的警告
+        from ..utils.history_export import export_history, ExportCancelled
+        
+        state = self.export_state
+        
+        def progress(done, total):
+            state['done'] = done
+            
+        try:
+            export_history(self.history, path, fmt, progress=progress,
+                           cancel=lambda: state['cancelled'])
+        except ExportCancelled:
+            pass
+        except Exception as e:
+            state['error'] = e
+        state['finished'] = True
+        
+    def poll_export(self):
+        """界面线程：刷新导出进度，完成后提示结果"""
+        state = self.export_state
+        try:
+            if not self.export_window.winfo_exists():
+                return
+        except tk.TclError:
+            return
+            
+        done, total = state['done'], state['total']
+        self.export_progress['value'] = min(done, total)
+        self.export_label.config(text=f"已导出 {done}/{total} 条")
+        
+        if not state['finished']:
+            self.after(EXPORT_POLL_MS, self.poll_export)
+            return
+            
+        self.export_window.destroy()
+        if state['error'] is not None:
+            messagebox.showerror("错误", f"导出失败: {state['error']}", parent=self)
+        elif not state['cancelled']:
+            messagebox.showinfo("成功", f"已导出 {done} 条记录！", parent=self)
+        
+    def cancel_export(self):
+        """取消正在进行的导出"""
+        if self.export_state is not None:
+            self.export_state['cancelled'] = True
+        self.export_label.config(text="正在取消...")
         
     def clear_history(self):
         """清空历史记录"""
@@ -1,14 +1,24 @@
 import tkinter as tk
-from tkinter import font, messagebox, filedialog
+from tkinter import font, messagebox
 from PIL import Image, ImageTk, ImageDraw
 import os
-import random
+import threading
 from datetime import datetime
 
 from ..utils.config import COLOR_PALETTE
+from ..utils.history_writer import HistoryWriter
 from .prize_dialog import PrizeDialog
 from .history_dialog import HistoryDialog
 
+# 统计区域最多列出的奖品数量
+STATS_DISPLAY_LIMIT = 50
+# 多连抽的次数
+MULTI_DRAW_COUNT = 10
+# 检查后台历史写入进度的间隔（毫秒）
+HISTORY_POLL_MS = 300
+# 检查后台任务（刷新统计、写完历史记录）是否完成的间隔（毫秒）
+BACKGROUND_POLL_MS = 50
+
 class MainWindow:
     def __init__(self, master, gacha_engine, prize_manager, config, history):
         self.master = master
@@ -16,6 +26,16 @@ class MainWindow:
         self.prize_manager = prize_manager
         self.config = config
         self.history = history
+        # 配置文件在外部被修改时自动重新加载奖品，不需要重启
+        self.prize_manager.start_watching()
+        self.prize_version = self.prize_manager.version
+        # 历史记录由后台线程分组写入，界面线程不等待磁盘
+        self.history_writer = HistoryWriter(history)
+        self.last_commit_count = 0
+        # 统计信息在后台读取，读取期间再次请求时读完后重新读取一次
+        self.stats_loading = False
+        self.stats_stale = False
+        self.opening_history = False
         
         # 基础设置
         self.master.title('扭蛋机 v3.0 - 自定义奖品版')
@@ -55,6 +75,35 @@ class MainWindow:
         # 绑定窗口大小变化事件
         self.master.bind("<Configure>", self.on_window_resize)
         
+        # 关闭窗口前把未写入的历史记录写完
+        self.master.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.poll_history_writer()
+        
+    def on_close(self):
+        """关闭窗口"""
+        self.history_writer.close()
+        self.prize_manager.stop_watching()
+        self.config.flush()
+        self.master.destroy()
+        
+    def poll_history_writer(self):
+        """后台写入完成后刷新统计信息"""
+        metrics = self.history_writer.get_metrics()
+        commit_count = metrics['commit_count']
+        if commit_count != self.last_commit_count:
+            self.last_commit_count = commit_count
+            self.update_statistics()
+        # 写入失败的记录会自动重试，期间在状态栏提示
+        if metrics['last_error']:
+            self.stats_label.config(
+                text=f"⚠ 历史记录写入失败，{metrics['backlog']} 条记录等待重试: {metrics['last_error']}")
+        # 奖品被重新加载后刷新图片（动画进行中时等动画结束）
+        if self.prize_manager.version != self.prize_version and not self.animating:
+            self.prize_version = self.prize_manager.version
+            self.load_images()
+            self.update_statistics()
+        self.master.after(HISTORY_POLL_MS, self.poll_history_writer)
+        
     def update_fonts(self):
         """根据缩放因子更新字体大小"""
         base_title_size = 18
@@ -119,6 +168,12 @@ class MainWindow:
             button_height = max(int(2 * self.scale_factor), 1)
             self.draw_btn.configure(width=button_width, height=button_height)
             
+        if hasattr(self, 'multi_draw_btn'):
+            self.multi_draw_btn.configure(font=self.button_font)
+            button_width = max(int(10 * self.scale_factor), 6)
+            button_height = max(int(2 * self.scale_factor), 1)
+            self.multi_draw_btn.configure(width=button_width, height=button_height)
+            
         # 更新小按钮字体和大小
         if hasattr(self, 'history_btn'):
             self.history_btn.configure(font=self.small_button_font)
@@ -172,12 +227,16 @@ class MainWindow:
             display_size = min(label_width, label_height) * 0.8
             scaled_size = int(max(display_size, 50))
             
-            # 为所有奖品图像创建统一尺寸的缩放版本
+            # 为所有奖品图像创建统一尺寸的缩放版本（共用的图像只缩放一次）
             self.scaled_images = []
+            resized = {}
             for i, original_img in enumerate(self.original_images):
                 try:
-                    img = original_img.resize((scaled_size, scaled_size), Image.LANCZOS)
-                    photo = ImageTk.PhotoImage(img)
+                    photo = resized.get(id(original_img))
+                    if photo is None:
+                        img = original_img.resize((scaled_size, scaled_size), Image.LANCZOS)
+                        photo = ImageTk.PhotoImage(img)
+                        resized[id(original_img)] = photo
                     self.scaled_images.append(photo)
                 except Exception as e:
                     print(f"预处理图像 {i} 失败: {e}")
@@ -244,8 +303,15 @@ class MainWindow:
         self.images = []
         self.scaled_images = []
         self.original_images = []  # 存储原始图像对象
+        loaded = {}  # 图片路径 -> (原始图像, 显示图像)，多个奖品共用同一图片时只加载一次
         
         for prize in self.prize_manager.get_all_prizes():
+            cached = loaded.get(prize['image'])
+            if cached:
+                self.original_images.append(cached[0])
+                self.images.append(cached[1])
+                self.scaled_images.append(cached[1])
+                continue
             try:
                 img_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), prize['image'])
                 
@@ -278,6 +344,7 @@ class MainWindow:
                 photo = ImageTk.PhotoImage(img)
                 self.images.append(photo)
                 self.scaled_images.append(photo)  # 初始时缩放图像与原始图像相同
+                loaded[prize['image']] = (self.original_images[-1], photo)
             except Exception as e:
                 print(f"加载图片失败: {e}")
                 img = self.create_default_image(prize)
@@ -349,7 +416,19 @@ class MainWindow:
                                 width=15, height=2,
                                 activebackground="#FFB300",
                                 cursor="hand2")
-        self.draw_btn.pack(side=tk.LEFT, padx=20)
+        self.draw_btn.pack(side=tk.LEFT, padx=(20, 5))
+        
+        # 多连抽按钮
+        self.multi_draw_btn = tk.Button(button_frame, text=f'🎯 {MULTI_DRAW_COUNT}连抽',
+                                      font=self.button_font,
+                                      bg=COLOR_PALETTE['yellow_btn'],
+                                      fg=COLOR_PALETTE['dark_text'],
+                                      command=self.start_multi_draw,
+                                      relief=tk.RAISED, bd=4,
+                                      width=10, height=2,
+                                      activebackground="#FFB300",
+                                      cursor="hand2")
+        self.multi_draw_btn.pack(side=tk.LEFT, padx=5)
         
         # 功能按钮组
         func_frame = tk.Frame(button_frame, bg=COLOR_PALETTE['background'])
@@ -415,7 +494,14 @@ class MainWindow:
             img_idx = 0
         self.update_displayed_image(img_idx)
     
-    def play_frames(self, frames, idx, result=None):
+    def set_draw_buttons_enabled(self, enabled):
+        """启用或禁用抽奖按钮"""
+        state = tk.NORMAL if enabled else tk.DISABLED
+        relief = tk.RAISED if enabled else tk.SUNKEN
+        self.draw_btn.config(state=state, relief=relief)
+        self.multi_draw_btn.config(state=state, relief=relief)
+    
+    def play_frames(self, frames, idx, result=None, results=None):
         """播放动画帧"""
         if idx < len(frames) and self.animating:
             # 显示当前帧
@@ -424,14 +510,16 @@ class MainWindow:
                 self.image_label.configure(image=self.scaled_images[frame_idx])
             
             # 继续下一帧
-            self.master.after(50, lambda: self.play_frames(frames, idx + 1, result))
+            self.master.after(50, lambda: self.play_frames(frames, idx + 1, result, results))
         else:
             # 动画结束，显示最终结果
-            if result:
+            if results:
+                self.show_multi_result(results)
+            elif result:
                 self.show_result(result)
             else:
                 self.animating = False
-                self.draw_btn.config(state=tk.NORMAL, relief=tk.RAISED)
+                self.set_draw_buttons_enabled(True)
                 # 动画结束后，确保图像尺寸正确
                 if hasattr(self, 'current_result') and self.current_result:
                     img_idx = self.current_result.get('index', 0)
@@ -443,8 +531,7 @@ class MainWindow:
             try:
                 # 添加时间戳
                 result["timestamp"] = datetime.now().isoformat()
-                self.history.add_record(result)
-                self.update_statistics()
+                self.history_writer.submit(result)
                 
                 # 保存当前结果
                 self.current_result = result
@@ -456,8 +543,7 @@ class MainWindow:
                 time_str = timestamp.strftime("%Y-%m-%d %H:%M:%S")
                 
                 # 计算概率
-                total_weight = sum(self.prize_manager.get_weights())
-                probability = f"{(prize_weight / total_weight * 100):.2f}%" if total_weight > 0 else "0%"
+                probability = f"{self.prize_manager.get_probability(result['index']) * 100:.2f}%"
                 
                 # 设置结果标签
                 self.result_label.config(
@@ -477,7 +563,60 @@ class MainWindow:
                 self.result_label.config(text="抽奖出错，请重试")
         
         self.animating = False
-        self.draw_btn.config(state=tk.NORMAL, relief=tk.RAISED)
+        self.set_draw_buttons_enabled(True)
+        
+    def show_multi_result(self, results):
+        """显示多连抽结果，所有记录一次写入历史"""
+        try:
+            timestamp = datetime.now().isoformat()
+            for result in results:
+                result["timestamp"] = timestamp
+            self.history_writer.submit_many(results)
+            
+            # 最后一个结果作为当前结果显示
+            self.current_result = results[-1]
+            self.result_label.config(
+                text=f"🎉 {len(results)}连抽完成 🎉",
+                fg=COLOR_PALETTE['dark_text'],
+                font=self.result_font
+            )
+            self.flash_result_label(5)
+            self.update_displayed_image(self.current_result["index"])
+            
+            self.show_multi_result_dialog(results)
+        except Exception as e:
+            print(f"显示多连抽结果失败: {e}")
+            self.result_label.config(text="抽奖出错，请重试")
+            
+        self.animating = False
+        self.set_draw_buttons_enabled(True)
+        
+    def show_multi_result_dialog(self, results):
+        """在一个窗口中列出多连抽的全部结果"""
+        dialog = tk.Toplevel(self.master)
+        dialog.title(f"{len(results)}连抽结果")
+        dialog.configure(bg=COLOR_PALETTE['background'])
+        dialog.transient(self.master)
+        
+        tk.Label(dialog, text=f"🎉 {len(results)}连抽结果 🎉", font=self.result_font,
+                 bg=COLOR_PALETTE['background'], fg=COLOR_PALETTE['dark_text']).pack(padx=20, pady=10)
+        
+        grid_frame = tk.Frame(dialog, bg=COLOR_PALETTE['background'])
+        grid_frame.pack(padx=20, pady=5)
+        
+        # 每行显示5个结果
+        for i, result in enumerate(results):
+            cell = tk.Frame(grid_frame, bg=COLOR_PALETTE['light_bg'], bd=1, relief=tk.GROOVE)
+            cell.grid(row=i // 5, column=i % 5, padx=4, pady=4)
+            index = result["index"]
+            image = self.images[index] if 0 <= index < len(self.images) else None
+            tk.Label(cell, image=image, bg=COLOR_PALETTE['light_bg']).pack(padx=4, pady=(4, 0))
+            tk.Label(cell, text=result["prize"]["name"], font=self.small_button_font,
+                     bg=COLOR_PALETTE['light_bg'], fg=COLOR_PALETTE['dark_text']).pack(padx=4, pady=(0, 4))
+        
+        tk.Button(dialog, text="确定", font=self.small_button_font,
+                  bg=COLOR_PALETTE['blue_btn'], fg=COLOR_PALETTE['light_text'],
+                  command=dialog.destroy, width=8).pack(pady=10)
         
     def flash_result_label(self, count):
         """闪烁结果标签"""
@@ -499,24 +638,71 @@ class MainWindow:
         dialog = PrizeDialog(self.master, self.prize_manager)
         self.master.wait_window(dialog.dialog)
         # 重新加载图片以反映可能的变化
+        self.prize_version = self.prize_manager.version
         self.load_images()
         # 更新统计信息
         self.update_statistics()
         
+    def run_in_background(self, work, done):
+        """在后台线程中执行 work()，完成后在界面线程中调用 done(结果)
+        
+        界面线程只用 after() 定时检查是否完成，不等待历史记录的锁或磁盘写入。
+        """
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(value=work()), daemon=True)
+        thread.start()
+        
+        def check():
+            if thread.is_alive():
+                self.master.after(BACKGROUND_POLL_MS, check)
+            else:
+                done(result.get('value'))
+        self.master.after(BACKGROUND_POLL_MS, check)
+        
     def open_history(self):
         """打开历史记录对话框"""
-        dialog = HistoryDialog(self.master, self.history)
+        if self.opening_history:
+            return
+        self.opening_history = True
+        
+        def opened(_):
+            self.opening_history = False
+            HistoryDialog(self.master, self.history)
+        # 先在后台写完队列中的记录，对话框中才能看到最新的抽奖
+        self.run_in_background(lambda: self.history_writer.flush(timeout=2.0), opened)
         
     def open_settings(self):
         """打开设置对话框"""
         messagebox.showinfo("设置", "设置功能开发中...")
         
     def update_statistics(self):
-        """更新统计信息"""
+        """更新统计信息：在后台读取历史统计，读完后在界面线程中显示"""
+        if self.stats_loading:
+            self.stats_stale = True
+            return
+        self.stats_loading = True
+        self.run_in_background(self.read_statistics, self.show_statistics)
+        
+    def read_statistics(self):
+        """读取统计区域需要的历史数据 (总次数, 各奖品次数, 最新记录)（在后台线程中调用）"""
+        try:
+            latest = self.history.get_latest(1)
+            return self.history.count(), self.history.count_by_prize(), latest[0] if latest else None
+        except Exception as e:
+            print(f"读取统计信息失败: {e}")
+            return None
+        
+    def show_statistics(self, data):
+        """显示后台读取的统计信息"""
+        self.stats_loading = False
+        if self.stats_stale:
+            # 读取期间又有新的记录写入，再读一次
+            self.stats_stale = False
+            self.update_statistics()
+        if data is None:
+            return
+        total_draws, prize_counts, last_record = data
         try:
-            records = self.history.get_all_records()
-            total_draws = len(records)
-            
             # 清空文本区域
             self.stats_text.config(state=tk.NORMAL)
             self.stats_text.delete(1.0, tk.END)
@@ -526,44 +712,41 @@ class MainWindow:
             self.stats_text.insert(tk.END, f"当前奖品数量: {len(self.prize_manager.get_all_prizes())}\n")
             self.stats_text.insert(tk.END, f"最大奖品数量: {self.prize_manager.max_prizes}\n\n")
             
+            # 奖品列表和概率来自同一版本的快照
+            snapshot = self.prize_manager.snapshot()
+            
+            # 各稀有度层级的概率
+            tier_odds = snapshot.tier_odds()
+            if tier_odds:
+                self.stats_text.insert(tk.END, "各层级概率:\n")
+                for tier, odds in tier_odds:
+                    self.stats_text.insert(tk.END, f"  {tier if tier is not None else '未分级'}: {odds * 100:.2f}%\n")
+                self.stats_text.insert(tk.END, "\n")
+            
             # 各奖品统计
             self.stats_text.insert(tk.END, "各奖品统计:\n")
             self.stats_text.insert(tk.END, "-" * 30 + "\n")
             
-            if total_draws > 0:
-                prize_counts = {}
-                for record in records:
-                    prize_name = record["prize"]["name"]
-                    prize_counts[prize_name] = prize_counts.get(prize_name, 0) + 1
+            # 显示每个奖品的统计（奖品很多时只显示前若干个）
+            prizes = snapshot.catalog
+            for index, prize in enumerate(prizes[:STATS_DISPLAY_LIMIT]):
+                name = prize["name"]
+                count = prize_counts.get(name, 0)
+                percentage = (count / total_draws * 100) if total_draws > 0 else 0
+                weight = prize["weight"]
+                expected_percentage = snapshot.probability(index) * 100
                 
-                # 显示每个奖品的统计
-                for prize in self.prize_manager.get_all_prizes():
-                    name = prize["name"]
-                    count = prize_counts.get(name, 0)
-                    percentage = (count / total_draws * 100) if total_draws > 0 else 0
-                    weight = prize["weight"]
-                    total_weight = sum(self.prize_manager.get_weights())
-                    expected_percentage = (weight / total_weight * 100) if total_weight > 0 else 0
-                    
-                    self.stats_text.insert(tk.END, f"{name}:\n")
-                    self.stats_text.insert(tk.END, f"  抽取: {count}次 ({percentage:.1f}%)\n")
-                    self.stats_text.insert(tk.END, f"  权重: {weight} ({expected_percentage:.1f}%)\n\n")
-            else:
-                for prize in self.prize_manager.get_all_prizes():
-                    name = prize["name"]
-                    weight = prize["weight"]
-                    total_weight = sum(self.prize_manager.get_weights())
-                    expected_percentage = (weight / total_weight * 100) if total_weight > 0 else 0
-                    
-                    self.stats_text.insert(tk.END, f"{name}:\n")
-                    self.stats_text.insert(tk.END, f"  抽取: 0次 (0.0%)\n")
-                    self.stats_text.insert(tk.END, f"  权重: {weight} ({expected_percentage:.1f}%)\n\n")
+                self.stats_text.insert(tk.END, f"{name}:\n")
+                self.stats_text.insert(tk.END, f"  抽取: {count}次 ({percentage:.1f}%)\n")
+                self.stats_text.insert(tk.END, f"  权重: {weight} ({expected_percentage:.1f}%)\n\n")
+            
+            if len(prizes) > STATS_DISPLAY_LIMIT:
+                self.stats_text.insert(tk.END, f"... 还有 {len(prizes) - STATS_DISPLAY_LIMIT} 个奖品\n")
             
             self.stats_text.config(state=tk.DISABLED)
             
             # 更新状态栏
-            if total_draws > 0:
-                last_record = records[-1]
+            if last_record:
                 last_prize = last_record["prize"]["name"]
                 self.stats_label.config(text=f"上次抽中: {last_prize}")
             else:
@@ -582,7 +765,7 @@ class MainWindow:
             return
             
         self.animating = True
-        self.draw_btn.config(state=tk.DISABLED, relief=tk.SUNKEN)
+        self.set_draw_buttons_enabled(False)
         self.result_label.config(text="抽奖中...")
         
         # 生成动画帧
@@ -594,5 +777,29 @@ class MainWindow:
             self.play_frames(frames, 0, result)
         else:
             self.animating = False
-            self.draw_btn.config(state=tk.NORMAL, relief=tk.RAISED)
+            self.set_draw_buttons_enabled(True)
+            messagebox.showerror("错误", "抽奖失败，请检查奖品配置！")
+            
+    def start_multi_draw(self):
+        """开始多连抽"""
+        if self.animating:
+            return
+            
+        if not self.prize_manager.get_all_prizes():
+            messagebox.showwarning("警告", "请先添加奖品！")
+            return
+            
+        self.animating = True
+        self.set_draw_buttons_enabled(False)
+        self.result_label.config(text=f"{MULTI_DRAW_COUNT}连抽中...")
+        
+        # 一次抽出全部结果，动画停在最后一个结果上
+        results = self.gacha_engine.draw_many(MULTI_DRAW_COUNT)
+        if results:
+            self.prepare_animation_images()
+            frames = self.gacha_engine.generate_animation_frames(results[-1]["index"])
+            self.play_frames(frames, 0, results=results)
+        else:
+            self.animating = False
+            self.set_draw_buttons_enabled(True)
             messagebox.showerror("错误", "抽奖失败，请检查奖品配置！") 
\ No newline at end of file
@@ -6,16 +6,23 @@ import shutil
 from PIL import Image, ImageTk
 
 from ..utils.config import COLOR_PALETTE
+from ..core.prize import Prize
 from ..core.prize_manager import PrizeManager
 
+# 奖品列表每页显示的数量，百万级目录也只插入一页的行
+PAGE_SIZE = 200
+
 class PrizeDialog:
     def __init__(self, parent, prize_manager):
         self.parent = parent
         self.prize_manager = prize_manager
         self.dialog = None
-        self.prizes = prize_manager.get_all_prizes()
-        self.current_index = 0
-        self.original_prizes = None  # 用于存储原始奖品列表
+        # 编辑副本（与当前目录共用各列，修改时才复制被修改的列），保存时再提交
+        self.catalog = prize_manager.catalog.copy()
+        # 对编辑副本做过的修改，保存时逐条提交给奖品管理器（只增量更新采样器）
+        self.edits = []
+        self.base_version = prize_manager.version
+        self.page = 0
         
         # 创建对话框
         self.create_dialog()
@@ -40,9 +47,6 @@ class PrizeDialog:
         y = (self.parent.winfo_height() // 2) - (height // 2) + self.parent.winfo_y()
         self.dialog.geometry(f"+{x}+{y}")
         
-        # 保存原始奖品列表，以便在取消时恢复
-        self.original_prizes = [prize.copy() for prize in self.prizes]
-        
         # 创建UI
         self.setup_ui()
         
@@ -86,6 +90,21 @@ class PrizeDialog:
         scrollbar_y.grid(row=0, column=1, sticky='ns')
         scrollbar_x.grid(row=1, column=0, sticky='ew')
         
+        # 翻页和按名称查找
+        nav_frame = ttk.Frame(list_frame)
+        nav_frame.grid(row=2, column=0, columnspan=2, sticky='ew', pady=(5, 0))
+        ttk.Button(nav_frame, text="上一页", command=lambda: self.go_to_page(self.page - 1),
+                   width=8).pack(side=tk.LEFT)
+        self.page_label = ttk.Label(nav_frame, text="")
+        self.page_label.pack(side=tk.LEFT, padx=5)
+        ttk.Button(nav_frame, text="下一页", command=lambda: self.go_to_page(self.page + 1),
+                   width=8).pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        ttk.Button(nav_frame, text="查找", command=self.find_prize, width=6).pack(side=tk.RIGHT)
+        search_entry = ttk.Entry(nav_frame, textvariable=self.search_var, width=15)
+        search_entry.pack(side=tk.RIGHT, padx=5)
+        search_entry.bind("<Return>", lambda e: self.find_prize())
+        
         # 配置网格
         list_frame.grid_columnconfigure(0, weight=1)
         list_frame.grid_rowconfigure(0, weight=1)
@@ -117,87 +136,123 @@ class PrizeDialog:
         # 刷新表格
         self.refresh_table()
         
-    def refresh_table(self):
-        """刷新奖品列表"""
+    def page_count(self):
+        return max(1, (len(self.catalog) + PAGE_SIZE - 1) // PAGE_SIZE)
+        
+    def go_to_page(self, page):
+        """翻到第 page 页（从0开始）"""
+        page = min(max(page, 0), self.page_count() - 1)
+        if page != self.page:
+            self.page = page
+            self.refresh_table()
+            
+    def refresh_table(self, select=None):
+        """刷新奖品列表（只显示当前页），select 为要选中的奖品索引"""
         for item in self.tree.get_children():
             self.tree.delete(item)
             
-        for i, prize in enumerate(self.prizes):
+        self.page = min(self.page, self.page_count() - 1)
+        start = self.page * PAGE_SIZE
+        for i in range(start, min(start + PAGE_SIZE, len(self.catalog))):
+            prize = self.catalog[i]
             values = (
                 i + 1,
-                prize['name'],
-                os.path.basename(prize['image']),
-                prize['weight']
+                prize.name,
+                os.path.basename(prize.image),
+                prize.weight
             )
-            self.tree.insert('', tk.END, values=values)
+            item = self.tree.insert('', tk.END, values=values)
+            if i == select:
+                self.tree.selection_set(item)
+                self.tree.see(item)
             
         # 更新状态栏
-        total = len(self.prizes)
+        total = len(self.catalog)
+        self.page_label.config(text=f"第 {self.page + 1}/{self.page_count()} 页")
         self.status_label.config(text=f"共 {total} 个奖品")
+        
+    def find_prize(self):
+        """按名称查找奖品并翻到它所在的页"""
+        name = self.search_var.get().strip()
+        if not name:
+            return
+        index = self.catalog.index_of(name)
+        if index < 0:
+            self.status_label.config(text=f"未找到奖品: {name}")
+            return
+        self.page = index // PAGE_SIZE
+        self.refresh_table(select=index)
+        
+    def selected_index(self):
+        """选中行对应的奖品索引，没有选中时返回 None"""
+        selection = self.tree.selection()
+        if not selection:
+            return None
+        return self.page * PAGE_SIZE + self.tree.index(selection[0])
             
     def add_prize(self):
         """添加奖品"""
+        if len(self.catalog) >= self.prize_manager.max_prizes:
+            messagebox.showwarning("警告", f"奖品数量已达上限 {self.prize_manager.max_prizes}")
+            return
+            
         self.status_label.config(text="添加新奖品...")
         dialog = PrizeEditDialog(self.dialog, "添加奖品")
         if dialog.result:
-            new_prize = {
-                'name': dialog.result['name'],
-                'weight': dialog.result['weight'],
-                'image': dialog.result['image']
-            }
-            self.prizes.append(new_prize)
-            self.refresh_table()
+            prize = Prize(dialog.result['name'], dialog.result['weight'], dialog.result['image'])
+            self.catalog.append(prize)
+            self.edits.append(('add', prize))
+            self.page = self.page_count() - 1
+            self.refresh_table(select=len(self.catalog) - 1)
             self.status_label.config(text=f"已添加奖品: {dialog.result['name']}")
                 
     def edit_prize(self):
         """编辑奖品"""
-        selection = self.tree.selection()
-        if not selection:
+        index = self.selected_index()
+        if index is None:
             messagebox.showwarning("警告", "请先选择一个奖品")
             return
             
         self.status_label.config(text="编辑奖品...")
-        index = self.tree.index(selection[0])
-        prize = self.prizes[index]
-        if prize:
-            dialog = PrizeEditDialog(self.dialog, "编辑奖品", prize)
-            if dialog.result:
-                self.prizes[index] = {
-                    'name': dialog.result['name'],
-                    'weight': dialog.result['weight'],
-                    'image': dialog.result['image']
-                }
-                self.refresh_table()
-                self.status_label.config(text=f"已更新奖品: {dialog.result['name']}")
+        prize = self.catalog[index]
+        dialog = PrizeEditDialog(self.dialog, "编辑奖品", prize)
+        if dialog.result:
+            # 保留奖品的稀有度层级和附加字段
+            prize = Prize(dialog.result['name'], dialog.result['weight'],
+                          dialog.result['image'], prize.extra, prize.tier)
+            self.catalog.update(index, prize)
+            self.edits.append(('update', index, prize))
+            self.refresh_table(select=index)
+            self.status_label.config(text=f"已更新奖品: {dialog.result['name']}")
                 
     def delete_prize(self):
         """删除奖品"""
-        selection = self.tree.selection()
-        if not selection:
+        index = self.selected_index()
+        if index is None:
             messagebox.showwarning("警告", "请先选择一个奖品")
             return
             
-        index = self.tree.index(selection[0])
-        prize = self.prizes[index]
-        if prize and messagebox.askyesno("确认", f"确定要删除奖品 '{prize['name']}' 吗？"):
-            del self.prizes[index]
+        prize = self.catalog[index]
+        if messagebox.askyesno("确认", f"确定要删除奖品 '{prize.name}' 吗？"):
+            self.catalog.remove(index)
+            self.edits.append(('remove', index))
             self.refresh_table()
-            self.status_label.config(text=f"已删除奖品: {prize['name']}")
+            self.status_label.config(text=f"已删除奖品: {prize.name}")
             
     def save_changes(self):
         """保存更改"""
         self.status_label.config(text="正在保存...")
-        # 更新奖品管理器
-        self.prize_manager.set_prizes(self.prizes)
+        # 逐条提交修改；打开对话框后奖品被其他地方修改过（如热加载）时，
+        # 记录中的索引已不可靠，改为用编辑副本整体替换
+        if not self.prize_manager.apply_edits(self.edits, self.base_version):
+            self.prize_manager.set_prizes(self.catalog)
         # 保存到配置
         self.prize_manager.save_prizes()
         messagebox.showinfo("成功", "奖品配置已保存！")
         self.dialog.destroy()
         
     def cancel(self):
-        """取消所有更改"""
-        # 恢复原始奖品列表
-        self.prizes = self.original_prizes
+        """取消所有更改（丢弃编辑副本，奖品管理器中的目录没有被修改）"""
         # 关闭对话框
         self.dialog.destroy()
 
@@ -1,6 +1,8 @@
 import os
 import json
 
+from .config_store import ConfigStore
+
 # 颜色配置
 COLOR_PALETTE = {
     'background': '#F5F5F5',      # 背景色
@@ -15,8 +17,10 @@ COLOR_PALETTE = {
 }
 
 class Config:
-    def __init__(self, config_path):
+    def __init__(self, config_path, store=None):
         self.config_path = config_path
+        # 与 PrizeManager 共用的配置文档，config.json 只解析一次
+        self.store = store if store is not None else ConfigStore(config_path)
         
     def load(self):
         """加载配置"""
@@ -47,10 +51,10 @@ class Config:
         }
         
         # 如果配置文件存在，加载它
-        if os.path.exists(self.config_path):
+        if self.store.exists():
             try:
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
+                # 返回副本，补上的默认值不会写回共享的配置文档
+                config = dict(self.store.load())
                     
                 # 确保所有必要的配置项都存在
                 if 'prizes' not in config:
@@ -60,6 +64,7 @@ class Config:
                     config['settings'] = default_config['settings']
                 else:
                     # 确保设置中的所有项都存在
+                    config['settings'] = dict(config['settings'])
                     for key, value in default_config['settings'].items():
                         if key not in config['settings']:
                             config['settings'][key] = value
@@ -71,20 +76,17 @@ class Config:
         else:
             # 如果配置文件不存在，创建一个默认配置
             self.save(default_config)
+            self.flush()
             return default_config
     
     def save(self, config):
-        """保存配置"""
-        try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
-            
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=4)
-            return True
-        except Exception as e:
-            print(f"保存配置失败: {e}")
-            return False
+        """保存配置（只记下变化的配置项，稍后合并写入）"""
+        self.store.update(config)
+        return True
+        
+    def flush(self):
+        """立即写入尚未保存的配置"""
+        return self.store.flush()
             
     def get_example_config_path(self):
         """获取示例配置文件路径"""
@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+
+from .history import file_signature
+
+# 修改后等待多少秒再写入文件，期间的多次修改合并为一次写入
+SAVE_DELAY = 0.5
+
+class ConfigStore:
+    """config.json 的共享内存文档
+
+    启动时只解析一次，Config、PrizeManager 和奖品对话框共用同一份文档。
+    修改时记下改动的顶层配置项，延迟 SAVE_DELAY 秒后合并写入（先写临时文件再原子替换）；
+    写入前如果文件被其他程序修改过，只把自己改动的配置项合并到磁盘上的新内容中。
+    退出前调用 flush() 写入尚未保存的修改（程序入口用 atexit 注册一次）。
+    """
+    def __init__(self, config_path, save_delay=SAVE_DELAY):
+        self.config_path = config_path
+        self.save_delay = save_delay
+        self.lock = threading.RLock()
+        self._document = None  # 解析后的配置
+        self._signature = None  # 解析或写入时文件的 (mtime, 大小, inode)
+        self._dirty = set()  # 尚未写入的顶层配置项
+        self._removed = set()  # 尚未写入的已删除配置项
+        self._timer = None
+        self._save_listeners = []  # 每次写入文件后调用 listener(文件路径)
+
+    def load(self):
+        """获取配置文档（首次调用时解析文件，文件不存在或损坏时为空文档）"""
+        with self.lock:
+            if self._document is None:
+                self._document = self._read()
+            return self._document
+
+    def _read(self):
+        if not os.path.exists(self.config_path):
+            return {}
+        try:
+            self._signature = file_signature(self.config_path)
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                document = json.load(f)
+            return document if isinstance(document, dict) else {}
+        except Exception as e:
+            print(f"加载配置失败: {e}")
+            return {}
+
+    def exists(self):
+        """配置文件是否存在"""
+        return os.path.exists(self.config_path)
+
+    def changed_on_disk(self):
+        """文件是否在解析或写入之后被其他程序修改过"""
+        with self.lock:
+            return self.exists() and file_signature(self.config_path) != self._signature
+
+    def reload(self):
+        """丢弃内存中的文档，重新解析文件（尚未写入的修改会先写入）"""
+        with self.lock:
+            self.flush()
+            self._document = None
+            return self.load()
+
+    def get(self, key, default=None):
+        """获取一个顶层配置项"""
+        return self.load().get(key, default)
+
+    def set(self, key, value):
+        """修改一个顶层配置项，延迟写入"""
+        with self.lock:
+            self.load()[key] = value
+            self._removed.discard(key)
+            self.mark_dirty(key)
+
+    def pop(self, key):
+        """删除一个顶层配置项，延迟写入"""
+        with self.lock:
+            if key not in self.load():
+                return
+            del self._document[key]
+            self._dirty.discard(key)
+            self._removed.add(key)
+            self.schedule_save()
+
+    def update(self, values):
+        """修改多个顶层配置项，只有值变化的配置项会被记为已修改"""
+        with self.lock:
+            document = self.load()
+            for key, value in values.items():
+                if key not in document or document[key] != value:
+                    self.set(key, value)
+
+    def add_save_listener(self, listener):
+        """注册写入文件后的回调（如让文件监视忽略自己刚写入的内容）"""
+        with self.lock:
+            self._save_listeners.append(listener)
+
+    def remove_save_listener(self, listener):
+        """取消写入文件后的回调"""
+        with self.lock:
+            if listener in self._save_listeners:
+                self._save_listeners.remove(listener)
+
+    def mark_dirty(self, *keys):
+        """记下原地修改过的配置项（如直接修改了 get 返回的字典），延迟写入"""
+        with self.lock:
+            self._dirty.update(keys)
+            self.schedule_save()
+
+    def is_dirty(self):
+        """是否有尚未写入的修改"""
+        with self.lock:
+            return bool(self._dirty or self._removed)
+
+    def schedule_save(self):
+        """SAVE_DELAY 秒后写入，期间再次修改会重新计时"""
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.save_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """立即写入尚未保存的修改，返回是否成功"""
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.is_dirty():
+                return True
+            try:
+                document = self._document
+                if self.changed_on_disk():
+                    # 文件被其他程序改过：以磁盘上的内容为准，只合并自己改动的配置项
+                    document = self._read()
+                    for key in self._dirty:
+                        document[key] = self._document[key]
+                    for key in self._removed:
+                        document.pop(key, None)
+                    self._document = document
+
+                os.makedirs(os.path.dirname(self.config_path) or '.', exist_ok=True)
+                tmp_path = self.config_path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(document, f, ensure_ascii=False, indent=4)
+                os.replace(tmp_path, self.config_path)
+                self._signature = file_signature(self.config_path)
+                self._dirty.clear()
+                self._removed.clear()
+                for listener in self._save_listeners:
+                    listener(self.config_path)
+                return True
+            except Exception as e:
+                print(f"保存配置失败: {e}")
+                return False
@@ -0,0 +1,141 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import threading
+
+from .history import file_signature
+
+# 轮询文件修改时间的间隔（秒），也是停止监视时最多等待的时间
+POLL_INTERVAL = 1.0
+# 收到变化后再等待多少秒，把一次保存产生的多个事件合并为一次回调
+SETTLE_DELAY = 0.1
+
+# inotify 事件（见 <sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+def _load_inotify():
+    """Linux 下通过 ctypes 取得 inotify 函数，不可用时返回 None"""
+    if not hasattr(os, 'uname') or os.uname().sysname != 'Linux':
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init.restype = ctypes.c_int
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_add_watch.restype = ctypes.c_int
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+class FileWatcher:
+    """在后台线程中监视若干文件，内容变化时调用 callback(变化的路径列表)
+
+    Linux 下使用 inotify 监视文件所在的目录（原子替换会换掉文件本身），
+    其他平台或 inotify 不可用时按 POLL_INTERVAL 轮询文件的 (mtime, 大小, inode)。
+    回调在监视线程中执行。
+    """
+    def __init__(self, paths, callback, poll_interval=POLL_INTERVAL):
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self.signatures = {}  # 路径 -> 上次看到的文件签名
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.inotify_fd = None
+        self.set_paths(paths)
+
+    def set_paths(self, paths):
+        """更换监视的文件（如奖品改为存入目录文件后）"""
+        with self.lock:
+            self.signatures = {os.path.abspath(path): file_signature(path) for path in paths}
+        if self.inotify_fd is not None:
+            self._add_watches()
+
+    def ignore(self, path):
+        """把文件当前的状态记为已知（自己刚写入的内容不触发回调）"""
+        path = os.path.abspath(path)
+        with self.lock:
+            if path in self.signatures:
+                self.signatures[path] = file_signature(path)
+
+    def start(self):
+        """启动监视线程"""
+        if self.thread is not None:
+            return
+        self._init_inotify()
+        self.thread = threading.Thread(target=self._run, name='FileWatcher', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        """停止监视"""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout if timeout is not None else self.poll_interval + 1)
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+
+    def _init_inotify(self):
+        libc = _load_inotify()
+        if libc is None:
+            return
+        fd = libc.inotify_init()
+        if fd < 0:
+            return
+        self.inotify_fd = fd
+        self._libc = libc
+        self._add_watches()
+
+    def _add_watches(self):
+        with self.lock:
+            directories = {os.path.dirname(path) for path in self.signatures}
+        for directory in directories:
+            if os.path.isdir(directory):
+                # 同一目录重复添加只会更新原来的监视
+                self._libc.inotify_add_watch(self.inotify_fd, os.fsencode(directory),
+                                             IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            if self.inotify_fd is not None:
+                self._wait_inotify()
+            else:
+                self.stopped.wait(self.poll_interval)
+            if self.stopped.is_set():
+                return
+            changed = self._changed_paths()
+            if changed:
+                try:
+                    self.callback(changed)
+                except Exception as e:
+                    print(f"处理文件变化失败: {e}")
+
+    def _wait_inotify(self):
+        """等待相关文件的 inotify 事件（最多 poll_interval 秒）"""
+        ready, _, _ = select.select([self.inotify_fd], [], [], self.poll_interval)
+        if not ready:
+            return
+        self._drain_events()
+        # 写入通常由多个事件组成（创建临时文件、写入、改名），稍等片刻一起处理
+        while select.select([self.inotify_fd], [], [], SETTLE_DELAY)[0]:
+            self._drain_events()
+
+    def _drain_events(self):
+        """读出并丢弃已到达的事件，是否真的变化由文件签名判断"""
+        try:
+            os.read(self.inotify_fd, 64 * 1024)
+        except OSError:
+            pass
+
+    def _changed_paths(self):
+        """签名发生变化的文件（文件刚被删除、尚未替换时不算变化）"""
+        changed = []
+        with self.lock:
+            for path, signature in self.signatures.items():
+                current = file_signature(path)
+                if current is not None and current != signature:
+                    self.signatures[path] = current
+                    changed.append(path)
+        return changed
@@ -1,49 +1,349 @@
 import json
 import os
+import functools
+import threading
 from datetime import datetime
+from itertools import islice
+
+import numpy as np
+
+from .history_columns import HistoryColumns, RecordsView, micros_to_iso, try_iso_to_micros
+
+# 墓碑（已删除但尚未整理的记录）达到这个数量时在后台整理存储
+COMPACT_THRESHOLD = 64
+# iter_records 每次在锁内生成的记录数
+ITER_CHUNK_SIZE = 1000
+
+# 时间汇总粒度 -> ISO 时间戳中作为时间桶的前缀长度（'YYYY-MM-DDTHH' / 'YYYY-MM-DD'）
+ROLLUP_GRANULARITIES = {
+    'hourly': 13,
+    'daily': 10,
+}
+
+def synchronized(method):
+    """在 self.lock 下执行方法，供后台写入线程和界面线程同时使用"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 class History:
     def __init__(self, history_path):
         self.history_path = history_path
         self.default_history = {
             'draws': [],
-            'statistics': {}
+            'statistics': {},
+            'rollups': {},
+            'next_id': 0
         }
+        # 解析后的历史记录缓存（记录以列式存储），文件的 mtime/大小/inode 变化时失效
+        self._cache = None
+        self._cache_signature = None
+        self.lock = threading.RLock()
+        self._compaction = None  # 后台整理线程
+        self._row_generation = 0  # 删除记录（行号前移）的次数，迭代中的行号据此判断是否失效
         
+    @synchronized
     def load(self):
-        """加载历史记录"""
+        """加载历史记录
+        
+        返回的是内存缓存，文件未被其他程序修改时不会重复解析；调用方不应修改返回值。
+        其中 draws 是列式记录的惰性视图，访问时才生成字典。
+        """
         try:
             if os.path.exists(self.history_path):
-                with open(self.history_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                signature = file_signature(self.history_path)
+                if self._cache is None or signature != self._cache_signature:
+                    with open(self.history_path, 'r', encoding='utf-8') as f:
+                        history_data = json.load(f)
+                    self._ensure_statistics(history_data)
+                    self._cache = self._to_cache(history_data)
+                    self._cache_signature = signature
             else:
-                return self._create_default_history()
+                self._create_default_history()
         except Exception as e:
             print(f"加载历史记录失败: {e}")
-            return self._create_default_history()
+            self._create_default_history()
+        return self._from_cache()
+        
+    def _to_cache(self, history_data):
+        """把解析出的文档转换为列式缓存，字典形式的记录随后即可释放"""
+        cache = dict(history_data)
+        draws = history_data.get('draws', [])
+        if isinstance(draws, RecordsView):
+            # 已经是列式数据（例如对 load() 的结果调用 save），直接复用
+            cache['draws'] = draws.columns
+        else:
+            cache['draws'] = HistoryColumns(draws)
+        cache['statistics'] = history_data.get('statistics', {})
+        cache['rollups'] = history_data.get('rollups', {})
+        # 编号只增不减（清空后也不重复使用），旧记录按顺序补上编号
+        next_id = max(history_data.get('next_id', 0), cache['draws'].max_id() + 1,
+                      self._cache['next_id'] if self._cache else 0)
+        cache['next_id'] = cache['draws'].assign_ids(next_id)
+        return cache
+        
+    def _from_cache(self):
+        """从缓存生成 load() 的返回值"""
+        if self._cache is None:
+            self._cache = self._to_cache(self._empty_history())
+        history_data = dict(self._cache)
+        history_data['draws'] = self._cache['draws'].records
+        return history_data
+        
+    def get_columns(self):
+        """获取列式存储的全部记录"""
+        self.load()
+        return self._cache['draws']
     
     def get_all_records(self):
         """获取所有抽奖记录"""
         history_data = self.load()
         return history_data.get('draws', [])
+        
+    def iter_records(self, since=None, until=None, prize=None, newest_first=False):
+        """按条件逐条产生抽奖记录
+        
+        since/until 为 datetime 或 ISO 字符串，取 [since, until) 范围；prize 为奖品名称；
+        newest_first 为 True 时从最新的记录开始。
+        开始时在锁内记下满足条件的记录编号，之后每次在锁内生成一小块记录；
+        迭代期间有记录被删除或文件被重新加载时按编号重新定位，已删除的记录跳过。
+        """
+        with self.lock:
+            columns, rows = self._select_rows(since, until, prize, newest_first)
+            if rows is None:
+                # 存在非标准格式的时间戳时逐条按字符串比较（在锁内取出全部记录）
+                records = list(reversed(columns.records) if newest_first else columns.records)
+            else:
+                generation = self._row_generation
+                ids = np.frombuffer(columns.id_column, dtype=np.int64)[rows]
+        if rows is None:
+            yield from filter_records(records, _to_iso(since), _to_iso(until), prize)
+            return
+        locate = None  # 行号失效后的 (列, 删除次数, 按编号排序的行号, 排序后的编号)
+        for start in range(0, len(ids), ITER_CHUNK_SIZE):
+            with self.lock:
+                current = self.get_columns()
+                if current is columns and self._row_generation == generation:
+                    chunk_rows = rows[start:start + ITER_CHUNK_SIZE]
+                else:
+                    if locate is None or locate[0] is not current or locate[1] != self._row_generation:
+                        all_ids = np.frombuffer(current.id_column, dtype=np.int64)
+                        order = np.argsort(all_ids, kind='stable')
+                        locate = (current, self._row_generation, order, all_ids[order])
+                    chunk_rows = self._locate_ids(locate, ids[start:start + ITER_CHUNK_SIZE])
+                chunk = [current.record(int(row)) for row in chunk_rows]
+            yield from chunk
+            
+    @staticmethod
+    def _locate_ids(locate, ids):
+        """按编号找到当前的行号（保持 ids 的顺序），已删除的编号跳过"""
+        _, _, order, sorted_ids = locate
+        if not len(sorted_ids):
+            return []
+        positions = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+        found = sorted_ids[positions] == ids
+        return order[positions[found]]
+            
+    def page(self, offset, limit, since=None, until=None, prize=None, newest_first=True):
+        """获取一页记录：跳过 offset 条后最多 limit 条，默认最新的在前"""
+        if limit <= 0:
+            return []
+        return list(islice(self.iter_records(since, until, prize, newest_first),
+                           offset, offset + limit))
+        
+    @synchronized
+    def _select_rows(self, since, until, prize, newest_first):
+        """在列式缓存上筛选行号，返回 (列, 行号序列)；无法按列筛选时行号为 None"""
+        columns = self.get_columns()
+        count = len(columns)
+        since = _to_iso(since)
+        until = _to_iso(until)
+        if since is None and until is None and prize is None:
+            # 不筛选时不需要遍历，按位置直接取
+            return columns, range(count - 1, -1, -1) if newest_first else range(count)
+        start_micros = try_iso_to_micros(since) if since is not None else None
+        end_micros = try_iso_to_micros(until) if until is not None else None
+        if since is not None or until is not None:
+            if (columns.raw_timestamps
+                    or (since is not None and start_micros is None)
+                    or (until is not None and end_micros is None)):
+                return columns, None
+        rows = columns.select_rows(start_micros, end_micros, prize)
+        return columns, rows[::-1] if newest_first else rows
+        
+    @synchronized
+    def get_statistics(self):
+        """获取每个奖品的统计 {奖品名称: {'count', 'first_seen', 'last_seen'}}（副本）"""
+        stats = self.load().get('statistics', {})
+        return {prize_name: dict(data) for prize_name, data in stats.items()}
+        
+    @synchronized
+    def get_rollups(self, granularity='daily'):
+        """获取按时间桶汇总的次数 {时间桶: {奖品名称: 次数}}（副本）
+        
+        granularity 为 'hourly'（桶为 'YYYY-MM-DDTHH'）或 'daily'（桶为 'YYYY-MM-DD'）。
+        汇总随记录增量维护，读取只与时间桶的数量有关。
+        """
+        check_granularity(granularity)
+        rollups = self.load().get('rollups', {}).get(granularity, {})
+        return {bucket: dict(counts) for bucket, counts in rollups.items()}
+        
+    def count(self):
+        """获取抽奖总次数"""
+        return sum(data['count'] for data in self.get_statistics().values())
+        
+    def count_by_prize(self):
+        """获取每个奖品的抽中次数 {奖品名称: 次数}"""
+        return {prize_name: data['count'] for prize_name, data in self.get_statistics().items()}
+        
+    def get_latest(self, limit):
+        """获取最近的 limit 条记录（最新的在前）"""
+        return self.page(0, limit)
+        
+    def get_records_between(self, start=None, end=None):
+        """获取 [start, end) 时间范围内的记录，参数为 datetime 或 ISO 字符串"""
+        return list(self.iter_records(since=start, until=end))
+        
+    def count_by_prize_between(self, start=None, end=None):
+        """统计 [start, end) 时间范围内每个奖品的抽中次数"""
+        counts = {}
+        for record in self.get_records_between(start, end):
+            prize_name = record['prize']['name']
+            counts[prize_name] = counts.get(prize_name, 0) + 1
+        return counts
+        
+    def migrate_from_json(self, json_path):
+        """一次性从旧的 history.json 导入记录
+        
+        当前存储已存在或旧文件不存在时不做任何事；旧文件保留不动。
+        """
+        if os.path.abspath(json_path) == os.path.abspath(self.history_path):
+            return False
+        if self._storage_exists() or not os.path.exists(json_path):
+            return False
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                history_data = json.load(f)
+        except Exception as e:
+            print(f"读取旧历史记录失败: {e}")
+            return False
+        return self.save(history_data)
+        
+    def _storage_exists(self):
+        """存储是否已经存在"""
+        return os.path.exists(self.history_path)
             
+    @synchronized
     def save(self, history_data):
         """保存历史记录"""
+        if 'statistics' not in history_data or 'rollups' not in history_data:
+            history_data = dict(history_data)
+            self._update_statistics(history_data)
+        self._cache = self._to_cache(history_data)
+        return self._write_cache()
+        
+    def _write_cache(self):
+        """把缓存写回文件（格式与 json.dump(indent=4) 相同），先写临时文件再原子替换"""
         try:
             os.makedirs(os.path.dirname(self.history_path), exist_ok=True)
-            with open(self.history_path, 'w', encoding='utf-8') as f:
-                json.dump(history_data, f, ensure_ascii=False, indent=4)
+            tmp_path = self.history_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                write_document(f, self._from_cache())
+            os.replace(tmp_path, self.history_path)
+            # 自己写入的内容直接作为缓存
+            self._cache_signature = file_signature(self.history_path)
             return True
         except Exception as e:
             print(f"保存历史记录失败: {e}")
+            self.invalidate_cache()
             return False
             
+    def invalidate_cache(self):
+        """丢弃内存缓存，下次读取时重新解析文件"""
+        self._cache = None
+        self._cache_signature = None
+            
     def add_record(self, prize_data):
         """添加抽奖记录"""
-        history_data = self.load()
+        return self.add_records([prize_data])
+        
+    @synchronized
+    def add_records(self, prize_data_list):
+        """批量添加抽奖记录（如十连抽），只读写一次文件"""
+        if not prize_data_list:
+            return True
+            
+        self.load()
+        columns = self._cache['draws']
+        stats = self._cache['statistics']
+        rollups = self._cache['rollups']
         
-        # 创建新的记录
-        record = {
+        # 统计信息和时间汇总随记录增量更新，不再重新遍历全部记录
+        for prize_data in prize_data_list:
+            record = self._make_record(prize_data, self._cache['next_id'])
+            self._cache['next_id'] += 1
+            columns.append(record)
+            count_record(stats, record)
+            rollup_record(rollups, record)
+            
+        return self._write_cache()
+        
+    @synchronized
+    def delete(self, record_id):
+        """按编号删除一条记录，统计信息和时间汇总随之增量扣除
+        
+        JSON 文档没有追加写入的方式，每次写入（包括新增记录）都会整体重写 history.json，
+        墓碑也只能随整个文件一起写入，所以这里直接去掉该行并重写文件。
+        记录很多、需要删除时不重写整个文件的，请使用 jsonl/sqlite/segments/binary/shards
+        存储方式（删除时只追加墓碑或更新一行）。返回是否删除成功（编号不存在时为 False）。
+        """
+        self.load()
+        columns = self._cache['draws']
+        row = columns.find_row(record_id)
+        if row is None:
+            return False
+        record = columns.record(row)
+        columns.remove_row(row)
+        self._row_generation += 1
+        uncount_record(self._cache['statistics'], record, self._prize_bounds)
+        unrollup_record(self._cache['rollups'], record)
+        return self._write_cache()
+        
+    def _prize_bounds(self, prize_name):
+        """某个奖品剩余记录的 (最早, 最晚) 时间戳，没有记录时返回 None"""
+        columns = self._cache['draws']
+        rows = columns.select_rows(prize_name=prize_name)
+        if not len(rows):
+            return None
+        if columns.raw_timestamps:
+            timestamps = [columns.record(int(row))['timestamp'] for row in rows]
+            return min(timestamps), max(timestamps)
+        times = columns.as_numpy()[1][rows]
+        return micros_to_iso(int(times.min())), micros_to_iso(int(times.max()))
+        
+    def compact(self):
+        """整理已删除的记录，返回是否成功
+        
+        JSON 文档在删除时已经整体重写，没有需要整理的内容。
+        """
+        return True
+        
+    def _schedule_compaction(self, tombstones):
+        """墓碑数量达到 COMPACT_THRESHOLD 时在后台线程中整理存储"""
+        if tombstones < COMPACT_THRESHOLD:
+            return
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        self._compaction = threading.Thread(target=self.compact, name='HistoryCompaction',
+                                            daemon=True)
+        self._compaction.start()
+        
+    def _make_record(self, prize_data, record_id=None):
+        """根据抽奖结果创建新的记录，record_id 为分配给它的编号"""
+        record = {} if record_id is None else {'id': record_id}
+        record.update({
             'prize': {
                 'name': prize_data['prize']['name'],
                 'weight': prize_data['prize']['weight'],
@@ -51,15 +351,22 @@ class History:
             },
             'timestamp': prize_data['timestamp'],
             'index': prize_data['index']
-        }
-        
-        history_data['draws'].append(record)
-        self._update_statistics(history_data)
-        return self.save(history_data)
+        })
+        # 抽奖随机数的序号，配合持久化的种子可以在任何时候重算这次抽奖（见 PrizeManager.replay_record）
+        if prize_data.get('sequence') is not None:
+            record['sequence'] = prize_data['sequence']
+        # 抽奖时的奖品版本标识，奖品修改后不再按当前奖品重算这次抽奖
+        if prize_data.get('catalog_version') is not None:
+            record['catalog_version'] = prize_data['catalog_version']
+        return record
         
     def clear(self):
         """清空历史记录"""
-        return self.save(self.default_history.copy())
+        return self.save(self._empty_history())
+        
+    def _empty_history(self):
+        """新的空历史记录（不与 default_history 共享列表）"""
+        return {key: type(value)() for key, value in self.default_history.items()}
         
     def _create_default_history(self):
         """创建默认历史记录文件"""
@@ -67,22 +374,155 @@ class History:
             os.makedirs(os.path.dirname(self.history_path), exist_ok=True)
             with open(self.history_path, 'w', encoding='utf-8') as f:
                 json.dump(self.default_history, f, ensure_ascii=False, indent=4)
-            return self.default_history.copy()
         except Exception as e:
             print(f"创建默认历史记录文件失败: {e}")
-            return self.default_history.copy()
+        self._cache = self._to_cache(self._empty_history())
+        self._cache_signature = file_signature(self.history_path)
+        return self._from_cache()
             
     def _update_statistics(self, history_data):
-        """更新统计信息"""
+        """重新计算全部统计信息和时间汇总"""
         stats = {}
+        rollups = {}
         
         for draw in history_data.get('draws', []):
-            prize_name = draw['prize']['name']
-            
-            if prize_name not in stats:
-                stats[prize_name] = {
-                    'count': 0
-                }
-            stats[prize_name]['count'] += 1
+            count_record(stats, draw)
+            rollup_record(rollups, draw)
+        
+        history_data['statistics'] = stats
+        history_data['rollups'] = rollups
         
-        history_data['statistics'] = stats 
\ No newline at end of file
+    def _ensure_statistics(self, history_data):
+        """旧格式或不一致的统计信息/时间汇总重新计算一次"""
+        stats = history_data.get('statistics')
+        rollups = history_data.get('rollups')
+        draws = history_data.get('draws', [])
+        if (not isinstance(stats, dict)
+                or any('last_seen' not in data for data in stats.values())
+                or sum(data.get('count', 0) for data in stats.values()) != len(draws)
+                or not isinstance(rollups, dict)
+                or rollup_total(rollups) != len(draws)):
+            self._update_statistics(history_data)
+
+def write_document(f, history_data):
+    """流式写出历史记录文档（与 json.dump(indent=4) 格式相同）
+    
+    draws 可以是任意可迭代的记录（如列式记录的视图），逐条序列化而不构造完整的字典列表。
+    """
+    f.write('{')
+    first = True
+    for key, value in history_data.items():
+        f.write('' if first else ',')
+        first = False
+        f.write(f'\n    {json.dumps(key, ensure_ascii=False)}: ')
+        if key != 'draws':
+            f.write(json.dumps(value, ensure_ascii=False, indent=4).replace('\n', '\n    '))
+            continue
+        empty = True
+        for record in value:
+            f.write(',\n        ' if not empty else '[\n        ')
+            empty = False
+            f.write(json.dumps(record, ensure_ascii=False, indent=4).replace('\n', '\n        '))
+        f.write('[]' if empty else '\n    ]')
+    f.write('\n}' if not first else '}')
+
+def filter_records(records, since=None, until=None, prize=None):
+    """逐条筛选记录：时间戳在 [since, until) 内（ISO 字符串）、奖品名称为 prize"""
+    for record in records:
+        timestamp = record['timestamp']
+        if since is not None and timestamp < since:
+            continue
+        if until is not None and timestamp >= until:
+            continue
+        if prize is not None and record['prize']['name'] != prize:
+            continue
+        yield record
+
+def file_signature(path):
+    """文件的 (mtime, 大小, inode)，文件不存在时返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def count_record(stats, record):
+    """把一条记录计入统计信息，O(1)"""
+    prize_name = record['prize']['name']
+    timestamp = record['timestamp']
+    data = stats.get(prize_name)
+    if data is None:
+        stats[prize_name] = {
+            'count': 1,
+            'first_seen': timestamp,
+            'last_seen': timestamp
+        }
+        return
+    data['count'] += 1
+    if timestamp < data['first_seen']:
+        data['first_seen'] = timestamp
+    if timestamp > data['last_seen']:
+        data['last_seen'] = timestamp
+
+def uncount_record(stats, record, prize_bounds=None):
+    """从统计信息中扣除一条记录
+    
+    扣除的记录正好是首次/最近一次出现时，通过 prize_bounds(奖品名称) 取得该奖品
+    剩余记录的 (最早, 最晚) 时间戳来修正边界；未提供时保留原值。
+    """
+    prize_name = record['prize']['name']
+    data = stats.get(prize_name)
+    if data is None:
+        return
+    data['count'] -= 1
+    if data['count'] <= 0:
+        del stats[prize_name]
+        return
+    timestamp = record['timestamp']
+    if prize_bounds and timestamp in (data['first_seen'], data['last_seen']):
+        bounds = prize_bounds(prize_name)
+        if bounds:
+            data['first_seen'], data['last_seen'] = bounds
+
+def with_id(record, record_id):
+    """返回带有编号的记录副本（编号放在最前）"""
+    return {'id': record_id, **{key: value for key, value in record.items() if key != 'id'}}
+
+def check_granularity(granularity):
+    """检查时间汇总粒度是否有效"""
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise ValueError(f"未知的汇总粒度: {granularity}")
+
+def rollup_record(rollups, record):
+    """把一条记录计入各粒度的时间汇总 {粒度: {时间桶: {奖品名称: 次数}}}，O(1)"""
+    prize_name = record['prize']['name']
+    timestamp = record['timestamp']
+    for granularity, width in ROLLUP_GRANULARITIES.items():
+        counts = rollups.setdefault(granularity, {}).setdefault(timestamp[:width], {})
+        counts[prize_name] = counts.get(prize_name, 0) + 1
+
+def unrollup_record(rollups, record):
+    """从各粒度的时间汇总中扣除一条记录"""
+    prize_name = record['prize']['name']
+    timestamp = record['timestamp']
+    for granularity, width in ROLLUP_GRANULARITIES.items():
+        buckets = rollups.get(granularity, {})
+        bucket = timestamp[:width]
+        counts = buckets.get(bucket)
+        if not counts or prize_name not in counts:
+            continue
+        counts[prize_name] -= 1
+        if counts[prize_name] <= 0:
+            del counts[prize_name]
+            if not counts:
+                del buckets[bucket]
+
+def rollup_total(rollups):
+    """时间汇总中的记录总数（按日汇总计算）"""
+    return sum(sum(counts.values()) for counts in rollups.get('daily', {}).values())
+
+def _to_iso(value):
+    """把 datetime 转为 ISO 字符串，其他值原样返回"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
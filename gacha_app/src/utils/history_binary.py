@@ -0,0 +1,605 @@
+import json
+import mmap
+import os
+import struct
+import threading
+
+import numpy as np
+
+from .history import (History, check_granularity, count_record, filter_records, rollup_record,
+                      uncount_record, unrollup_record, write_document, file_signature, synchronized,
+                      _to_iso)
+from .history_columns import PRIZE_KEYS, RECORD_KEYS, micros_to_iso, try_iso_to_micros
+
+# 文件头：魔数、版本、每条记录的字节数、保留、下一个记录编号，共 32 字节
+MAGIC = b'GACHAHB1'
+FORMAT_VERSION = 2
+HEADER = struct.Struct('<8sHHIq')
+HEADER_SIZE = 32
+NEXT_ID_OFFSET = 16
+
+# 定长记录：编号、纪元微秒时间戳、随机数序号（-1 表示没有）、奖品编号、奖品索引、标志位、
+# 奖品版本标识（0 表示没有，旧文件中为填充的0），共 40 字节
+RECORD = struct.Struct('<qqqIiII')
+RECORD_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('timestamp', '<i8'),
+    ('sequence', '<i8'),
+    ('prize', '<u4'),
+    ('index', '<i4'),
+    ('flags', '<u4'),
+    ('catalog_version', '<u4'),
+])
+RECORD_SIZE = RECORD_DTYPE.itemsize
+
+# 版本1的记录没有随机数序号，共 32 字节；打开时升级为当前版本
+V1_RECORD_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('timestamp', '<i8'),
+    ('prize', '<u4'),
+    ('index', '<i4'),
+    ('flags', '<u4'),
+    ('pad', '<u4'),
+])
+
+# 标志位
+FLAG_DELETED = 1  # 已删除，整理时去掉
+FLAG_NO_INDEX = 2  # index 为 None
+FLAG_RAW_TIMESTAMP = 4  # 时间戳无法转为微秒，原字符串保存在附表的 extras 中
+
+# 迭代时每次从映射中复制的记录数
+READ_CHUNK_SIZE = 4096
+
+MICROS_PER_HOUR = 3600 * 1000000
+
+class BinaryHistory(History):
+    """定长二进制历史记录
+
+    文件由 32 字节的文件头和 40 字节的定长记录组成，读取时用 mmap 映射，
+    不需要解析即可随机访问和切片，NumPy 可以直接查看各列（as_numpy）。
+    奖品名称/权重/图片保存在附表（.meta.json）中，记录只存奖品编号。
+    删除记录只是原地设置标志位，已删除的记录积累到一定数量后在后台整理。
+    """
+    def __init__(self, history_path):
+        super().__init__(history_path)
+        self.meta_path = history_path + '.meta.json'
+        self.prizes = []  # 奖品编号 -> (名称, 权重, 图片)
+        self.prize_ids = {}  # (名称, 权重, 图片) -> 奖品编号
+        self.extras = {}  # 行号 -> 定长记录以外的字段，绝大多数记录没有
+        self._mm = None
+        self._mm_signature = None
+        self._meta_signature = None
+        self._statistics = None
+        self._rollups = None
+        self._deleted = 0  # 已删除但尚未整理的记录数
+        self._compacting = threading.Lock()
+        self._upgrade_format()
+        self._load_meta()
+
+    # ---- 文件与映射 ----
+
+    def _load_meta(self):
+        """读取奖品附表（未变化时不重复读取）"""
+        signature = file_signature(self.meta_path)
+        if signature is None or signature == self._meta_signature:
+            return
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except Exception as e:
+            print(f"读取历史记录附表失败: {e}")
+            return
+        self.prizes = [tuple(prize) for prize in meta.get('prizes', [])]
+        self.prize_ids = {prize: prize_id for prize_id, prize in enumerate(self.prizes)}
+        if 'row_extras' in meta:
+            self.extras = {int(row): extra for row, extra in meta['row_extras'].items()}
+        else:
+            self.extras = self._extras_by_row(meta.get('extras', {}))
+        self._meta_signature = signature
+
+    def _extras_by_row(self, extras_by_id):
+        """旧版附表中按记录编号保存的附加字段 -> 按行号保存"""
+        if not extras_by_id:
+            return {}
+        ids = self._records()['id']
+        extras = {}
+        for record_id, extra in extras_by_id.items():
+            rows = np.flatnonzero(ids == int(record_id))
+            if len(rows):
+                extras[int(rows[0])] = extra
+        return extras
+
+    def _save_meta(self):
+        """写入奖品附表（先写临时文件再替换）"""
+        path = self.meta_path
+        tmp_path = path + '.tmp'
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'prizes': [list(prize) for prize in self.prizes],
+                'row_extras': {str(row): extra for row, extra in self.extras.items()}
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._meta_signature = file_signature(path)
+
+    def _upgrade_format(self):
+        """把版本1的文件升级为当前的记录格式（补上随机数序号列），记录顺序和行号不变"""
+        try:
+            with open(self.history_path, 'rb') as f:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    return
+                magic, version, record_size, _, next_id = HEADER.unpack(header)
+                if magic != MAGIC or record_size != V1_RECORD_DTYPE.itemsize:
+                    return
+                f.seek(HEADER_SIZE)
+                old = np.frombuffer(f.read(), dtype=V1_RECORD_DTYPE)
+        except FileNotFoundError:
+            return
+        rows = np.zeros(len(old), dtype=RECORD_DTYPE)
+        for name in V1_RECORD_DTYPE.names:
+            if name in RECORD_DTYPE.names:
+                rows[name] = old[name]
+        rows['sequence'] = -1
+        tmp_path = self.history_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self._header(next_id))
+            f.write(rows.tobytes())
+        os.replace(tmp_path, self.history_path)
+
+    def _records(self):
+        """记录区的零拷贝 NumPy 视图（只读），文件增长或被替换后重新映射"""
+        try:
+            st = os.stat(self.history_path)
+        except OSError:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        if st.st_size <= HEADER_SIZE:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        signature = (st.st_size, st.st_ino)
+        if self._mm is None or signature != self._mm_signature:
+            with open(self.history_path, 'rb') as f:
+                # 旧的映射在不再被引用后自动关闭
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mm_signature = signature
+            # 其他程序追加的记录可能引用了附表中的新奖品
+            self._load_meta()
+        count = (len(self._mm) - HEADER_SIZE) // RECORD_SIZE
+        return np.frombuffer(self._mm, dtype=RECORD_DTYPE, count=count, offset=HEADER_SIZE)
+
+    def _release_map(self):
+        """替换文件前释放映射（Windows 下被映射的文件不能替换）"""
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                # 仍有视图在使用，交给垃圾回收
+                pass
+        self._mm = None
+        self._mm_signature = None
+
+    def _read_next_id(self):
+        """文件头中的下一个记录编号"""
+        if not os.path.exists(self.history_path):
+            return 0
+        with open(self.history_path, 'rb') as f:
+            header = f.read(HEADER.size)
+        magic, version, record_size, _, next_id = HEADER.unpack(header)
+        if magic != MAGIC or record_size != RECORD_SIZE:
+            raise ValueError(f"不支持的历史记录文件格式: {self.history_path}")
+        return next_id
+
+    def as_numpy(self):
+        """全部记录的零拷贝结构化数组视图（含已删除的记录，见 flags 列）"""
+        with self.lock:
+            return self._records()
+
+    def __len__(self):
+        with self.lock:
+            return len(self._records())
+
+    def get_slice(self, start, stop):
+        """按文件中的位置取一段记录（跳过已删除的），只复制这一段"""
+        with self.lock:
+            records = self._records()
+            positions = range(len(records))[start:stop]
+            rows = records[start:stop].copy()
+        return [self._to_record(row, position) for row, position in zip(rows, positions)
+                if not row['flags'] & FLAG_DELETED]
+
+    # ---- 记录转换 ----
+
+    def _intern_prize(self, prize):
+        """获取奖品编号，新奖品加入附表"""
+        key = (prize.get('name'), prize.get('weight'), prize.get('image', ''))
+        prize_id = self.prize_ids.get(key)
+        if prize_id is None:
+            prize_id = len(self.prizes)
+            self.prizes.append(key)
+            self.prize_ids[key] = prize_id
+        return prize_id
+
+    def _pack(self, record, position):
+        """记录 -> 第 position 行的定长字节，附加字段记入 extras；返回 (字节, 附表是否有变化)"""
+        prize = record['prize']
+        prize_count = len(self.prizes)
+        prize_id = self._intern_prize(prize)
+        changed = len(self.prizes) != prize_count
+
+        flags = 0
+        timestamp = record['timestamp']
+        micros = try_iso_to_micros(timestamp)
+        if micros is None or micros_to_iso(micros) != timestamp:
+            flags |= FLAG_RAW_TIMESTAMP
+            micros = 0
+        index = record.get('index')
+        if index is None:
+            flags |= FLAG_NO_INDEX
+            index = 0
+        sequence = record.get('sequence')
+
+        extra = {key: value for key, value in record.items() if key not in RECORD_KEYS}
+        extra_prize = {key: value for key, value in prize.items() if key not in PRIZE_KEYS}
+        if extra_prize:
+            extra['prize'] = extra_prize
+        if flags & FLAG_RAW_TIMESTAMP:
+            extra['timestamp'] = timestamp
+        if extra:
+            self.extras[position] = extra
+            changed = True
+        return RECORD.pack(record['id'], micros, -1 if sequence is None else sequence,
+                           prize_id, index, flags, record.get('catalog_version') or 0), changed
+
+    def _to_record(self, row, position):
+        """结构化数组的第 position 行 -> 记录字典"""
+        record_id = int(row['id'])
+        flags = int(row['flags'])
+        name, weight, image = self.prizes[int(row['prize'])]
+        record = {
+            'id': record_id,
+            'prize': {
+                'name': name,
+                'weight': weight,
+                'image': image
+            },
+            'timestamp': micros_to_iso(int(row['timestamp'])),
+            'index': None if flags & FLAG_NO_INDEX else int(row['index'])
+        }
+        if row['sequence'] != -1:
+            record['sequence'] = int(row['sequence'])
+        if row['catalog_version']:
+            record['catalog_version'] = int(row['catalog_version'])
+        extra = self.extras.get(position)
+        if extra:
+            for key, value in extra.items():
+                if key == 'prize':
+                    record['prize'].update(value)
+                else:
+                    record[key] = value
+        return record
+
+    def _prize_ids_named(self, prize_name):
+        return [prize_id for prize_id, prize in enumerate(self.prizes) if prize[0] == prize_name]
+
+    # ---- 读取 ----
+
+    def load(self):
+        """加载历史记录（与 History.load 返回相同的结构）"""
+        return {
+            'draws': self.get_all_records(),
+            'statistics': self.get_statistics()
+        }
+
+    def get_all_records(self):
+        """获取所有抽奖记录"""
+        return list(self.iter_records())
+
+    @synchronized
+    def _select(self, since, until, prize, newest_first):
+        """在映射上筛选行号；时间条件无法按列比较时返回 None"""
+        records = self._records()
+        flags = records['flags']
+        mask = (flags & FLAG_DELETED) == 0
+        if since is not None or until is not None:
+            start = try_iso_to_micros(since) if since is not None else None
+            end = try_iso_to_micros(until) if until is not None else None
+            if ((since is not None and start is None) or (until is not None and end is None)
+                    or np.any(flags & FLAG_RAW_TIMESTAMP)):
+                return None
+            times = records['timestamp']
+            if start is not None:
+                mask &= times >= start
+            if end is not None:
+                mask &= times < end
+        if prize is not None:
+            mask &= np.isin(records['prize'], self._prize_ids_named(prize))
+        rows = np.flatnonzero(mask)
+        return rows[::-1] if newest_first else rows
+
+    def iter_records(self, since=None, until=None, prize=None, newest_first=False):
+        """按条件逐条产生记录，每次只从映射中复制一小块"""
+        since = _to_iso(since)
+        until = _to_iso(until)
+        rows = self._select(since, until, prize, newest_first)
+        if rows is None:
+            # 存在非标准格式的时间戳时逐条按字符串比较
+            records = self._iter_rows(self._select(None, None, prize, newest_first))
+            return filter_records(records, since, until)
+        return self._iter_rows(rows)
+
+    def _iter_rows(self, rows):
+        for start in range(0, len(rows), READ_CHUNK_SIZE):
+            positions = rows[start:start + READ_CHUNK_SIZE]
+            with self.lock:
+                chunk = self._records()[positions]
+            for row, position in zip(chunk, positions.tolist()):
+                yield self._to_record(row, position)
+
+    def page(self, offset, limit, since=None, until=None, prize=None, newest_first=True):
+        """获取一页记录：直接按行号切片，不需要逐条跳过"""
+        if limit <= 0:
+            return []
+        since = _to_iso(since)
+        until = _to_iso(until)
+        rows = self._select(since, until, prize, newest_first)
+        if rows is None:
+            return super().page(offset, limit, since, until, prize, newest_first)
+        return list(self._iter_rows(rows[offset:offset + limit]))
+
+    # ---- 统计 ----
+
+    @synchronized
+    def get_statistics(self):
+        """获取每个奖品的统计（副本）"""
+        self._ensure_counters()
+        return {prize_name: dict(data) for prize_name, data in self._statistics.items()}
+
+    @synchronized
+    def get_rollups(self, granularity='daily'):
+        """获取按时间桶汇总的次数 {时间桶: {奖品名称: 次数}}（副本）"""
+        check_granularity(granularity)
+        self._ensure_counters()
+        rollups = self._rollups.get(granularity, {})
+        return {bucket: dict(counts) for bucket, counts in rollups.items()}
+
+    def _ensure_counters(self):
+        """首次使用时在各列上用向量运算建立统计和时间汇总，之后增量维护"""
+        if self._statistics is not None:
+            return
+        records = self._records()
+        flags = records['flags']
+        self._deleted = int(np.count_nonzero(flags & FLAG_DELETED))
+        live = records[(flags & (FLAG_DELETED | FLAG_RAW_TIMESTAMP)) == 0]
+        stats = {}
+        rollups = {}
+
+        if len(live):
+            prize_column = live['prize'].astype(np.int64)
+            times = live['timestamp']
+            table_size = len(self.prizes)
+            counts = np.bincount(prize_column, minlength=table_size)
+            first = np.full(table_size, np.iinfo(np.int64).max)
+            last = np.full(table_size, np.iinfo(np.int64).min)
+            np.minimum.at(first, prize_column, times)
+            np.maximum.at(last, prize_column, times)
+            for prize_id in np.flatnonzero(counts):
+                name = self.prizes[prize_id][0]
+                first_seen = micros_to_iso(int(first[prize_id]))
+                last_seen = micros_to_iso(int(last[prize_id]))
+                data = stats.get(name)
+                if data is None:
+                    stats[name] = {'count': int(counts[prize_id]),
+                                   'first_seen': first_seen, 'last_seen': last_seen}
+                else:
+                    data['count'] += int(counts[prize_id])
+                    data['first_seen'] = min(data['first_seen'], first_seen)
+                    data['last_seen'] = max(data['last_seen'], last_seen)
+
+            # 按 (小时, 奖品编号) 分组计数，每天的计数由小时汇总相加
+            hours = times // MICROS_PER_HOUR
+            keys, key_counts = np.unique(hours * table_size + prize_column, return_counts=True)
+            for key, count in zip(keys.tolist(), key_counts.tolist()):
+                hour, prize_id = divmod(key, table_size)
+                bucket = micros_to_iso(hour * MICROS_PER_HOUR)
+                name = self.prizes[prize_id][0]
+                for granularity, width in (('hourly', 13), ('daily', 10)):
+                    bucket_counts = rollups.setdefault(granularity, {}).setdefault(bucket[:width], {})
+                    bucket_counts[name] = bucket_counts.get(name, 0) + count
+
+        # 时间戳不规范的少数记录逐条计入
+        raw = np.flatnonzero((flags & (FLAG_DELETED | FLAG_RAW_TIMESTAMP)) == FLAG_RAW_TIMESTAMP)
+        for position in raw.tolist():
+            record = self._to_record(records[position], position)
+            count_record(stats, record)
+            rollup_record(rollups, record)
+
+        self._statistics = stats
+        self._rollups = rollups
+
+    def _prize_bounds(self, prize_name):
+        """某个奖品剩余记录的 (最早, 最晚) 时间戳"""
+        records = self._records()
+        mask = ((records['flags'] & FLAG_DELETED) == 0) & np.isin(
+            records['prize'], self._prize_ids_named(prize_name))
+        if not np.any(mask):
+            return None
+        raw = np.flatnonzero(mask & ((records['flags'] & FLAG_RAW_TIMESTAMP) != 0))
+        timestamps = [self._to_record(records[position], position)['timestamp']
+                      for position in raw.tolist()]
+        normal = records['timestamp'][mask & ((records['flags'] & FLAG_RAW_TIMESTAMP) == 0)]
+        if len(normal):
+            timestamps += [micros_to_iso(int(normal.min())), micros_to_iso(int(normal.max()))]
+        return min(timestamps), max(timestamps)
+
+    # ---- 写入 ----
+
+    @synchronized
+    def add_records(self, prize_data_list):
+        """批量追加定长记录"""
+        if not prize_data_list:
+            return True
+        try:
+            next_id = self._read_next_id()
+            position = len(self._records())
+            records = []
+            for prize_data in prize_data_list:
+                records.append(self._make_record(prize_data, next_id))
+                next_id += 1
+            packed = []
+            meta_changed = False
+            for offset, record in enumerate(records):
+                data, changed = self._pack(record, position + offset)
+                packed.append(data)
+                meta_changed = meta_changed or changed
+            # 附表先于记录写入，记录引用的奖品编号总能在附表中找到
+            if meta_changed:
+                self._save_meta()
+            self._ensure_file()
+            with open(self.history_path, 'r+b') as f:
+                f.seek(0, os.SEEK_END)
+                f.write(b''.join(packed))
+                f.seek(NEXT_ID_OFFSET)
+                f.write(struct.pack('<q', next_id))
+        except Exception as e:
+            print(f"保存历史记录失败: {e}")
+            return False
+        if self._statistics is not None:
+            for record in records:
+                count_record(self._statistics, record)
+                rollup_record(self._rollups, record)
+        return True
+
+    def _ensure_file(self):
+        """文件不存在时写入文件头"""
+        if not os.path.exists(self.history_path):
+            os.makedirs(os.path.dirname(self.history_path) or '.', exist_ok=True)
+            with open(self.history_path, 'wb') as f:
+                f.write(self._header(0))
+
+    def _header(self, next_id):
+        return HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_SIZE, 0, next_id).ljust(HEADER_SIZE, b'\0')
+
+    @synchronized
+    def delete(self, record_id):
+        """按编号删除一条记录：原地设置删除标志，统计信息随之增量扣除"""
+        self._ensure_counters()
+        records = self._records()
+        # 导入的记录保持原来的顺序，编号不一定递增，按列比较查找
+        positions = np.flatnonzero((records['id'] == record_id)
+                                   & ((records['flags'] & FLAG_DELETED) == 0))
+        if not len(positions):
+            return False
+        position = int(positions[0])
+        row = records[position].copy()
+        del records
+        try:
+            with open(self.history_path, 'r+b') as f:
+                f.seek(HEADER_SIZE + position * RECORD_SIZE + RECORD_DTYPE.fields['flags'][1])
+                f.write(struct.pack('<I', int(row['flags']) | FLAG_DELETED))
+        except OSError as e:
+            print(f"删除历史记录失败: {e}")
+            return False
+        record = self._to_record(row, position)
+        uncount_record(self._statistics, record, self._prize_bounds)
+        unrollup_record(self._rollups, record)
+        self._deleted += 1
+        self._schedule_compaction(self._deleted)
+        return True
+
+    def compact(self):
+        """整理：去掉已删除的记录，重写文件和附表"""
+        if not self._compacting.acquire(blocking=False):
+            return False
+        try:
+            with self.lock:
+                records = self._records()
+                positions = np.flatnonzero((records['flags'] & FLAG_DELETED) == 0)
+                live = records[positions]
+                del records
+                # 附加字段改为按整理后的行号保存
+                extras = {}
+                for old, extra in self.extras.items():
+                    new = int(np.searchsorted(positions, old))
+                    if new < len(positions) and positions[new] == old:
+                        extras[new] = extra
+                return self._rewrite(live, self._read_next_id(), extras)
+        finally:
+            self._compacting.release()
+
+    def _rewrite(self, rows, next_id, extras):
+        """用给定的结构化数组和按行号保存的附加字段重写文件和附表"""
+        tmp_path = self.history_path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.history_path) or '.', exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(self._header(next_id))
+                f.write(rows.tobytes())
+            self.extras = extras
+            self._save_meta()
+            self._release_map()
+            os.replace(tmp_path, self.history_path)
+            self._deleted = 0
+            return True
+        except Exception as e:
+            print(f"保存历史记录失败: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+    @synchronized
+    def save(self, history_data):
+        """用给定的记录替换全部数据（迁移、导入和清空），编号不会重复使用
+        
+        记录保持原来的顺序；缺少编号或编号重复的记录分配新的编号。
+        """
+        try:
+            next_id = max(self._read_next_id(), history_data.get('next_id', 0))
+        except ValueError as e:
+            print(f"读取历史记录失败: {e}")
+            next_id = history_data.get('next_id', 0)
+        self.prizes = []
+        self.prize_ids = {}
+        self.extras = {}
+        draws = history_data.get('draws', [])
+        # 先让已有编号占位，重新分配的编号不会与后面的记录冲突
+        for record in draws:
+            if record.get('id') is not None:
+                next_id = max(next_id, record['id'] + 1)
+        packed = []
+        seen = set()
+        for position, record in enumerate(draws):
+            if record.get('id') is None or record['id'] in seen:
+                record = dict(record, id=next_id)
+                next_id += 1
+            seen.add(record['id'])
+            packed.append(self._pack(record, position)[0])
+        rows = np.frombuffer(b''.join(packed), dtype=RECORD_DTYPE)
+        extras = self.extras
+        self._statistics = None
+        self._rollups = None
+        return self._rewrite(rows, next_id, extras)
+
+    def import_json(self, json_path):
+        """从 JSON 历史记录文档导入（替换现有数据）"""
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                history_data = json.load(f)
+        except Exception as e:
+            print(f"读取历史记录失败: {e}")
+            return False
+        return self.save(history_data)
+
+    def export_json(self, json_path):
+        """导出为与 history.json 相同格式的文档，记录逐条写出"""
+        try:
+            with open(json_path, 'w', encoding='utf-8') as f:
+                write_document(f, {
+                    'draws': self.iter_records(),
+                    'statistics': self.get_statistics(),
+                    'rollups': {granularity: self.get_rollups(granularity)
+                                for granularity in ('hourly', 'daily')},
+                    'next_id': self._read_next_id()
+                })
+            return True
+        except Exception as e:
+            print(f"导出历史记录失败: {e}")
+            return False
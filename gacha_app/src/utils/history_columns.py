@@ -0,0 +1,239 @@
+from array import array
+from datetime import datetime, timedelta
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+# 记录中直接存为列的字段，其余字段保存在稀疏的 extras 中
+RECORD_KEYS = ('id', 'prize', 'timestamp', 'index', 'sequence', 'catalog_version')
+PRIZE_KEYS = ('name', 'weight', 'image')
+# extras 中记录原记录缺少的字段（如没有 index 的旧记录），还原时不生成这些字段
+ABSENT_KEY = '_absent'
+
+def iso_to_micros(timestamp):
+    """ISO 时间字符串 -> 纪元微秒"""
+    return (datetime.fromisoformat(timestamp) - EPOCH) // ONE_MICROSECOND
+
+def try_iso_to_micros(timestamp):
+    """无法解析或带时区的时间戳返回 None"""
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        return None
+    return (parsed - EPOCH) // ONE_MICROSECOND
+
+def micros_to_iso(micros):
+    """纪元微秒 -> ISO 时间字符串（与 datetime.isoformat 格式一致）"""
+    return (EPOCH + timedelta(microseconds=micros)).isoformat()
+
+class HistoryColumns:
+    """列式存储的抽奖记录
+
+    每条记录只占用几个定长数组元素：记录编号、奖品编号、纪元微秒时间戳、奖品索引、随机数序号和奖品版本标识；
+    奖品的名称/权重/图片只在奖品表中保存一次。字典形式的记录在访问时才生成。
+    """
+    def __init__(self, records=None):
+        self.prize_table = []  # 奖品编号 -> (名称, 权重, 图片)
+        self.prize_ids = {}  # (名称, 权重, 图片) -> 奖品编号
+        self.id_column = array('q')  # -1 表示旧记录没有编号
+        self.prize_column = array('I')
+        self.time_column = array('q')
+        self.index_column = array('i')
+        self.sequence_column = array('q')  # -1 表示没有随机数序号
+        self.catalog_column = array('I')  # 奖品版本标识，0 表示没有
+        self.extras = {}  # 行号 -> 列以外的字段，绝大多数记录没有
+        self.raw_timestamps = 0  # 无法转为微秒、原样保存在 extras 中的时间戳个数
+        if records:
+            self.extend(records)
+
+    def __len__(self):
+        return len(self.time_column)
+
+    def intern_prize(self, prize):
+        """获取奖品编号，新奖品加入奖品表"""
+        key = (prize.get('name'), prize.get('weight'), prize.get('image', ''))
+        prize_id = self.prize_ids.get(key)
+        if prize_id is None:
+            prize_id = len(self.prize_table)
+            self.prize_table.append(key)
+            self.prize_ids[key] = prize_id
+        return prize_id
+
+    def append(self, record):
+        """追加一条记录"""
+        prize = record['prize']
+        record_id = record.get('id')
+        self.id_column.append(-1 if record_id is None else record_id)
+        self.prize_column.append(self.intern_prize(prize))
+        timestamp = record['timestamp']
+        micros = try_iso_to_micros(timestamp)
+        # 往返后与原字符串不一致的时间戳（带时区、非标准格式）原样保存
+        raw = micros is None or micros_to_iso(micros) != timestamp
+        self.time_column.append(0 if micros is None else micros)
+        index = record.get('index')
+        self.index_column.append(-1 if index is None else index)
+        sequence = record.get('sequence')
+        self.sequence_column.append(-1 if sequence is None else sequence)
+        self.catalog_column.append(record.get('catalog_version') or 0)
+
+        extra = {key: value for key, value in record.items() if key not in RECORD_KEYS}
+        absent = [key for key in ('index',) if key not in record]
+        absent += ['prize.' + key for key in ('weight', 'image') if key not in prize]
+        if absent:
+            extra[ABSENT_KEY] = absent
+        if raw:
+            extra['timestamp'] = timestamp
+            self.raw_timestamps += 1
+        extra_prize = {key: value for key, value in prize.items() if key not in PRIZE_KEYS}
+        if extra_prize:
+            extra['prize'] = extra_prize
+        if extra:
+            self.extras[len(self) - 1] = extra
+
+    def extend(self, records):
+        """批量追加记录"""
+        for record in records:
+            self.append(record)
+
+    def record(self, row):
+        """生成第 row 条记录的字典"""
+        if row < 0:
+            row += len(self)
+        name, weight, image = self.prize_table[self.prize_column[row]]
+        index = self.index_column[row]
+        record_id = self.id_column[row]
+        record = {} if record_id == -1 else {'id': record_id}
+        record.update({
+            'prize': {
+                'name': name,
+                'weight': weight,
+                'image': image
+            },
+            'timestamp': micros_to_iso(self.time_column[row]),
+            'index': None if index == -1 else index
+        })
+        sequence = self.sequence_column[row]
+        if sequence != -1:
+            record['sequence'] = sequence
+        catalog_version = self.catalog_column[row]
+        if catalog_version:
+            record['catalog_version'] = catalog_version
+        extra = self.extras.get(row)
+        if extra:
+            for key, value in extra.items():
+                if key == 'prize':
+                    record['prize'].update(value)
+                elif key == ABSENT_KEY:
+                    for absent in value:
+                        if absent.startswith('prize.'):
+                            del record['prize'][absent[6:]]
+                        else:
+                            del record[absent]
+                else:
+                    record[key] = value
+        return record
+
+    def assign_ids(self, next_id):
+        """给没有编号的旧记录按顺序分配编号，返回下一个可用编号"""
+        for row, record_id in enumerate(self.id_column):
+            if record_id == -1:
+                self.id_column[row] = next_id
+                next_id += 1
+        return next_id
+
+    def max_id(self):
+        """最大的记录编号，没有记录时为 -1"""
+        return max(self.id_column) if len(self) else -1
+
+    def find_row(self, record_id):
+        """记录编号所在的行号，不存在时返回 None"""
+        rows = np.flatnonzero(np.frombuffer(self.id_column, dtype=np.int64) == record_id)
+        return int(rows[0]) if len(rows) else None
+
+    def remove_row(self, row):
+        """删除一行，后面的行号前移"""
+        for column in (self.id_column, self.prize_column, self.time_column, self.index_column,
+                       self.sequence_column, self.catalog_column):
+            del column[row]
+        extra = self.extras.pop(row, None)
+        if extra and 'timestamp' in extra:
+            self.raw_timestamps -= 1
+        self.extras = {(r - 1 if r > row else r): value for r, value in self.extras.items()}
+
+    @property
+    def records(self):
+        """记录的惰性字典视图"""
+        return RecordsView(self)
+
+    def as_numpy(self):
+        """零拷贝的 NumPy 列视图 (奖品编号, 时间戳微秒, 奖品索引)"""
+        return (np.frombuffer(self.prize_column, dtype=np.uint32),
+                np.frombuffer(self.time_column, dtype=np.int64),
+                np.frombuffer(self.index_column, dtype=np.int32))
+
+    def count_by_prize(self):
+        """用 bincount 统计每个奖品名称的次数"""
+        counts = {}
+        if not len(self):
+            return counts
+        prize_counts = np.bincount(self.as_numpy()[0], minlength=len(self.prize_table))
+        for prize_id, count in enumerate(prize_counts):
+            if count:
+                name = self.prize_table[prize_id][0]
+                counts[name] = counts.get(name, 0) + int(count)
+        return counts
+
+    def select_rows(self, start_micros=None, end_micros=None, prize_name=None):
+        """满足条件的行号（升序）：时间在 [start, end) 内、奖品名称为 prize_name
+
+        时间条件要求所有时间戳都已转为微秒（raw_timestamps 为 0）。
+        """
+        prize_ids, times, _ = self.as_numpy()
+        mask = np.ones(len(times), dtype=bool)
+        if start_micros is not None:
+            mask &= times >= start_micros
+        if end_micros is not None:
+            mask &= times < end_micros
+        if prize_name is not None:
+            ids = [prize_id for prize_id, key in enumerate(self.prize_table) if key[0] == prize_name]
+            mask &= np.isin(prize_ids, ids)
+        return np.flatnonzero(mask)
+
+    def memory_size(self):
+        """列数据占用的字节数（不含奖品表）"""
+        return (self.id_column.itemsize * len(self.id_column)
+                + self.prize_column.itemsize * len(self.prize_column)
+                + self.time_column.itemsize * len(self.time_column)
+                + self.index_column.itemsize * len(self.index_column)
+                + self.sequence_column.itemsize * len(self.sequence_column)
+                + self.catalog_column.itemsize * len(self.catalog_column))
+
+class RecordsView:
+    """HistoryColumns 的只读列表视图，按需生成字典"""
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self.columns.record(row) for row in range(*item.indices(len(self)))]
+        if item < -len(self) or item >= len(self):
+            raise IndexError("记录索引超出范围")
+        return self.columns.record(item)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.columns.record(row)
+
+    def __reversed__(self):
+        for row in range(len(self) - 1, -1, -1):
+            yield self.columns.record(row)
+
+    def __bool__(self):
+        return len(self) > 0
@@ -0,0 +1,155 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from itertools import islice
+
+# 每批从存储中读取并写出的记录数
+EXPORT_CHUNK_SIZE = 5000
+
+# CSV 的列：表头 -> 从记录取值的函数
+CSV_COLUMNS = (
+    ('id', lambda record: record.get('id')),
+    ('timestamp', lambda record: record['timestamp']),
+    ('prize_name', lambda record: record['prize']['name']),
+    ('prize_weight', lambda record: record['prize'].get('weight')),
+    ('prize_image', lambda record: record['prize'].get('image', '')),
+    ('index', lambda record: record.get('index')),
+    ('sequence', lambda record: record.get('sequence')),
+    ('catalog_version', lambda record: record.get('catalog_version')),
+)
+
+class ExportCancelled(Exception):
+    """导出被用户取消"""
+
+class CsvWriter:
+    """把记录写为 CSV 行"""
+    def __init__(self, f):
+        self.writer = csv.writer(f)
+        self.writer.writerow([name for name, _ in CSV_COLUMNS])
+
+    def write(self, records):
+        # None 写为空字段
+        self.writer.writerows([get(record) for _, get in CSV_COLUMNS] for record in records)
+
+class JsonlWriter:
+    """把记录写为每行一个 JSON 对象"""
+    def __init__(self, f):
+        self.f = f
+        self.encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+    def write(self, records):
+        self.f.writelines(self.encoder.encode(record) + '\n' for record in records)
+
+# 导出格式 -> 写入器
+EXPORT_FORMATS = {
+    'csv': CsvWriter,
+    'jsonl': JsonlWriter,
+}
+
+def export_history(history, output_path, fmt='csv', chunk_size=EXPORT_CHUNK_SIZE,
+                   progress=None, cancel=None, **filters):
+    """把历史记录流式导出到文件，返回导出的记录数
+
+    记录按时间顺序从 history.iter_records(**filters) 逐批读取并写出，内存占用与总记录数无关。
+    每写完一批调用 progress(已导出条数, 总条数)；cancel() 返回 True 时中止导出并抛出
+    ExportCancelled。先写入临时文件，完成后再替换目标文件，中途失败不会留下半个文件。
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"未知的导出格式: {fmt}")
+    total = history.count() if not filters else None
+    records = history.iter_records(**filters)
+
+    tmp_path = output_path + '.tmp'
+    exported = 0
+    try:
+        # CSV 使用 utf-8-sig，Excel 打开时中文不会乱码
+        encoding = 'utf-8-sig' if fmt == 'csv' else 'utf-8'
+        with open(tmp_path, 'w', encoding=encoding, newline='') as f:
+            writer = EXPORT_FORMATS[fmt](f)
+            while True:
+                if cancel and cancel():
+                    raise ExportCancelled()
+                chunk = list(islice(records, chunk_size))
+                if not chunk:
+                    break
+                writer.write(chunk)
+                exported += len(chunk)
+                if progress:
+                    progress(exported, total)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return exported
+
+def main(argv=None):
+    """命令行导出：python -m gacha_app.src.utils.history_export 输出文件 [选项]"""
+    from .config_store import ConfigStore
+    from .history_store import open_history_path, DEFAULT_HISTORY_STORAGE, HISTORY_STORAGES
+
+    default_config_dir = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'config')
+
+    parser = argparse.ArgumentParser(description="导出扭蛋机抽奖历史记录")
+    parser.add_argument('output', help="输出文件路径")
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS),
+                        help="导出格式（默认按输出文件后缀判断，无法判断时为 csv）")
+    parser.add_argument('--config-dir', default=default_config_dir, help="配置目录")
+    parser.add_argument('--storage', choices=sorted(HISTORY_STORAGES),
+                        help="历史记录存储方式（默认读取 config.json 中的 history_storage）")
+    parser.add_argument('--history', help="直接指定历史记录文件或目录（不读取配置目录）")
+    parser.add_argument('--since', help="起始时间（ISO 格式，包含）")
+    parser.add_argument('--until', help="结束时间（ISO 格式，不包含）")
+    parser.add_argument('--prize', help="只导出指定奖品")
+    parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help="每批写出的记录数")
+    args = parser.parse_args(argv)
+
+    fmt = args.format
+    if fmt is None:
+        suffix = os.path.splitext(args.output)[1].lstrip('.').lower()
+        fmt = suffix if suffix in EXPORT_FORMATS else 'csv'
+
+    history_path = args.history
+    if history_path is None:
+        storage = args.storage
+        if storage is None:
+            # 只读取配置，配置文件不存在时不会创建
+            storage = ConfigStore(os.path.join(args.config_dir, 'config.json')).get(
+                'history_storage', DEFAULT_HISTORY_STORAGE)
+        if storage not in HISTORY_STORAGES:
+            print(f"未知的历史记录存储方式: {storage}", file=sys.stderr)
+            return 1
+        history_path = os.path.join(args.config_dir, HISTORY_STORAGES[storage][1])
+    # 只读取已有的历史记录：不从 history.json 迁移，也不创建新的存储
+    if not os.path.exists(history_path):
+        print(f"没有找到历史记录: {history_path}", file=sys.stderr)
+        return 1
+    try:
+        history = open_history_path(history_path)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    filters = {key: value for key, value in
+               (('since', args.since), ('until', args.until), ('prize', args.prize))
+               if value is not None}
+
+    def report(done, total):
+        if total:
+            print(f"\r已导出 {done}/{total} 条 ({done * 100 // total}%)", end='', file=sys.stderr)
+        else:
+            print(f"\r已导出 {done} 条", end='', file=sys.stderr)
+
+    try:
+        exported = export_history(history, args.output, fmt, args.chunk_size, report, **filters)
+    except (OSError, ValueError) as e:
+        print(f"\n导出失败: {e}", file=sys.stderr)
+        return 1
+    print(f"\n已导出 {exported} 条记录到 {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
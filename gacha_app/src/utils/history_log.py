@@ -0,0 +1,392 @@
+import json
+import os
+import threading
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+
+from .history import (History, check_granularity, count_record, file_signature, filter_records,
+                      rollup_record, uncount_record, unrollup_record, with_id, synchronized,
+                      _to_iso)
+
+# 倒序读取日志时每次读取的字节数
+REVERSE_BLOCK_SIZE = 64 * 1024
+
+class LogHistory(History):
+    """追加式 JSONL 历史记录
+
+    每次抽奖只在文件末尾追加一行，不再读取和重写整个文件。
+    删除记录时追加一行墓碑 {"deleted": 编号}，墓碑积累到一定数量后在后台整理日志。
+    """
+    def __init__(self, history_path):
+        super().__init__(history_path)
+        self.encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        self._statistics = None  # 运行中的统计计数，首次使用时扫描一次日志
+        self._rollups = None  # 运行中的时间汇总，与统计计数一起更新
+        self._stats_inode = None  # 统计计数对应的日志文件 inode
+        self._stats_offset = 0  # 已计入统计的字节数
+        self._tombstones = set()  # 已删除、墓碑仍在日志中的记录编号
+        self._index_ids = array('q')  # 记录编号，与下面的行偏移一一对应
+        self._index_offsets = array('q')  # 记录所在行的起始偏移（按文件顺序）
+        self._next_id = 0  # 下一个可用的记录编号
+        self._legacy_records = False  # 日志中是否有没有编号的旧记录
+        self._compacting = threading.Lock()  # 同一时间只进行一次整理
+
+    def load(self):
+        """加载历史记录（与 History.load 返回相同的结构）"""
+        return {
+            'draws': list(self.iter_records()),
+            'statistics': self.get_statistics()
+        }
+
+    def get_all_records(self):
+        """获取所有抽奖记录"""
+        return list(self.iter_records())
+
+    def iter_records(self, since=None, until=None, prize=None, newest_first=False):
+        """逐行读取抽奖记录，不一次性载入整个文件
+
+        newest_first 为 True 时从文件末尾倒着按块读取，取最近的记录不需要读完整个文件。
+        """
+        with self.lock:
+            self._refresh_counters()
+            tombstones = set(self._tombstones)
+        return filter_records(self._iter_live(newest_first, tombstones),
+                              _to_iso(since), _to_iso(until), prize)
+
+    def _iter_live(self, newest_first, tombstones):
+        """产生未被删除的记录（跳过墓碑和编号标记行）"""
+        if newest_first:
+            lines = self._iter_reversed()
+        else:
+            lines = (obj for obj, _, _ in self._iter_from(0))
+        for obj in lines:
+            if 'prize' in obj and obj.get('id') not in tombstones:
+                yield obj
+
+    def _iter_reversed(self):
+        """从文件末尾开始倒序产生记录（末尾未写完的半行跳过）"""
+        if not os.path.exists(self.history_path):
+            return
+        with open(self.history_path, 'rb') as f:
+            position = f.seek(0, os.SEEK_END)
+            tail = None  # 尚未找到最后一个换行符；之后为下一块开头不完整的行
+            while position > 0:
+                size = min(REVERSE_BLOCK_SIZE, position)
+                position -= size
+                f.seek(position)
+                data = f.read(size)
+                if tail is None:
+                    # 最后一个换行符之后是其他进程正在写入的半行，跳过
+                    cut = data.rfind(b'\n')
+                    if cut < 0:
+                        continue
+                    data, tail = data[:cut + 1], b''
+                lines = (data + tail).split(b'\n')
+                # 第一段可能是不完整的行，留到读取前一块时拼接
+                tail = lines.pop(0)
+                for line in reversed(lines):
+                    record = self._parse_line(line)
+                    if record is not None:
+                        yield record
+            if tail:
+                record = self._parse_line(tail)
+                if record is not None:
+                    yield record
+
+    def _parse_line(self, line):
+        """解析一行记录，空行和损坏的行返回 None"""
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            return json.loads(line.decode('utf-8'))
+        except ValueError:
+            # 写入中断留下的损坏记录直接跳过
+            print(f"跳过损坏的历史记录: {line[:50]}")
+            return None
+
+    def _iter_from(self, offset, end=None):
+        """从字节偏移 offset 开始读取完整的行（到 end 为止），产生 (对象, 行起始偏移, 行结束偏移)"""
+        if not os.path.exists(self.history_path):
+            return
+        with open(self.history_path, 'rb') as f:
+            f.seek(offset)
+            for raw in f:
+                if end is not None and offset >= end:
+                    return
+                if not raw.endswith(b'\n'):
+                    # 其他进程正在写入的半行，留到下次再读
+                    return
+                start = offset
+                offset += len(raw)
+                obj = self._parse_line(raw)
+                if obj is not None:
+                    yield obj, start, offset
+
+    @synchronized
+    def get_statistics(self):
+        """获取每个奖品的统计（副本）"""
+        self._refresh_counters()
+        return {prize_name: dict(data) for prize_name, data in self._statistics.items()}
+
+    @synchronized
+    def get_rollups(self, granularity='daily'):
+        """获取按时间桶汇总的次数 {时间桶: {奖品名称: 次数}}（副本）"""
+        check_granularity(granularity)
+        self._refresh_counters()
+        rollups = self._rollups.get(granularity, {})
+        return {bucket: dict(counts) for bucket, counts in rollups.items()}
+
+    def _refresh_counters(self):
+        """把日志中尚未处理的行计入统计、时间汇总、墓碑和编号索引
+
+        日志只增长时只读取新追加的部分（包括其他进程追加的记录和墓碑）；
+        文件被替换或截断时重新扫描。
+        """
+        signature = file_signature(self.history_path)
+        inode = signature[2] if signature else None
+        size = signature[1] if signature else 0
+
+        if (self._statistics is None or inode != self._stats_inode
+                or size < self._stats_offset):
+            self._statistics = {}
+            self._rollups = {}
+            self._tombstones = set()
+            self._index_ids = array('q')
+            self._index_offsets = array('q')
+            self._legacy_records = False
+            self._stats_inode = inode
+            self._stats_offset = 0
+
+        if size > self._stats_offset:
+            tombstones = []
+            for obj, start, end in self._iter_from(self._stats_offset):
+                if 'deleted' in obj:
+                    tombstones.append(obj['deleted'])
+                elif 'next_id' in obj:
+                    self._next_id = max(self._next_id, obj['next_id'])
+                else:
+                    record_id = obj.get('id')
+                    if record_id is None:
+                        self._legacy_records = True
+                    else:
+                        self._index_ids.append(record_id)
+                        self._index_offsets.append(start)
+                        self._next_id = max(self._next_id, record_id + 1)
+                    count_record(self._statistics, obj)
+                    rollup_record(self._rollups, obj)
+                self._stats_offset = end
+            self._apply_tombstones(tombstones)
+
+    def _apply_tombstones(self, record_ids):
+        """处理一批墓碑：从统计和时间汇总中扣除被删除的记录
+
+        删除的记录正好是某奖品首次/最近一次出现时，该奖品的边界在最后只重新计算一次，
+        大批墓碑（如清空其他进程占用的分片）不会反复扫描日志。
+        """
+        stale = set()
+        for record_id in record_ids:
+            if record_id in self._tombstones:
+                continue
+            self._tombstones.add(record_id)
+            record = self._read_record(record_id)
+            if record is None:
+                continue
+            prize_name = record['prize']['name']
+            data = self._statistics.get(prize_name)
+            if data and record['timestamp'] in (data['first_seen'], data['last_seen']):
+                stale.add(prize_name)
+            uncount_record(self._statistics, record)
+            unrollup_record(self._rollups, record)
+        for prize_name in stale:
+            data = self._statistics.get(prize_name)
+            bounds = self._prize_bounds(prize_name) if data else None
+            if bounds:
+                data['first_seen'], data['last_seen'] = bounds
+
+    def _find_offset(self, record_id):
+        """记录编号所在行的起始偏移，不存在时返回 None"""
+        if not self._index_ids:
+            return None
+        rows = np.flatnonzero(np.frombuffer(self._index_ids, dtype=np.int64) == record_id)
+        return self._index_offsets[int(rows[0])] if len(rows) else None
+
+    def _read_record(self, record_id):
+        """按编号读取一条记录"""
+        offset = self._find_offset(record_id)
+        if offset is None:
+            return None
+        with open(self.history_path, 'rb') as f:
+            f.seek(offset)
+            return self._parse_line(f.readline())
+
+    def _prize_bounds(self, prize_name):
+        """某个奖品剩余记录的 (最早, 最晚) 时间戳：从日志两端各找第一条"""
+        def first(newest_first):
+            for record in self._iter_live(newest_first, self._tombstones):
+                if record['prize']['name'] == prize_name:
+                    return record['timestamp']
+            return None
+        oldest = first(False)
+        return (oldest, first(True)) if oldest is not None else None
+
+    @synchronized
+    def add_records(self, prize_data_list):
+        """批量追加抽奖记录，每条一行"""
+        if not prize_data_list:
+            return True
+        self._refresh_counters()
+        if self._legacy_records:
+            # 先给旧记录补上编号，新记录的编号才能接在后面
+            self.compact()
+        # 统计信息在下次读取时从上次的位置增量补上
+        lines = []
+        for prize_data in prize_data_list:
+            lines.append(self.encoder.encode(self._make_record(prize_data, self._next_id)) + '\n')
+            self._next_id += 1
+        return self._append_lines(lines)
+
+    @synchronized
+    def delete(self, record_id):
+        """按编号删除一条记录：追加一行墓碑，统计信息随之增量扣除"""
+        self._refresh_counters()
+        if self._legacy_records:
+            self.compact()
+        if record_id in self._tombstones or self._find_offset(record_id) is None:
+            return False
+        if not self._append_lines([self.encoder.encode({'deleted': record_id}) + '\n']):
+            return False
+        self._refresh_counters()
+        self._schedule_compaction(len(self._tombstones))
+        return True
+
+    def compact(self):
+        """整理日志：去掉已删除的记录和墓碑，给旧记录补上编号
+
+        大部分工作在锁外完成，期间追加的新行最后在锁内拼接到整理后的日志末尾。
+        已有整理在进行时直接返回 False。
+        """
+        if not self._compacting.acquire(blocking=False):
+            return False
+        try:
+            return self._compact_snapshot()
+        finally:
+            self._compacting.release()
+
+    def _compact_snapshot(self):
+        """确定要整理的范围 [0, end)"""
+        with self.lock:
+            self._refresh_counters()
+            if self._stats_inode is None:
+                return True
+            if self._legacy_records:
+                # 补编号需要独占编号分配，整个过程在锁内完成
+                return self._compact(self._stats_inode, self._stats_offset)
+            inode, end = self._stats_inode, self._stats_offset
+        return self._compact(inode, end)
+
+    def _compact(self, inode, end):
+        """把 [0, end) 中仍有效的行写入新日志，再拼接之后追加的部分并替换原日志"""
+        with self.lock:
+            dropped = set(self._tombstones)
+            next_id = self._next_id
+        tmp_path = self.history_path + '.compact'
+        ids, offsets = array('q'), array('q')
+        try:
+            with open(tmp_path, 'wb') as dst:
+                # 记下下一个编号，删除最新的记录后编号也不会被重复使用
+                dst.write((self.encoder.encode({'next_id': next_id}) + '\n').encode('utf-8'))
+                for obj, _, _ in self._iter_from(0, end):
+                    if 'deleted' in obj:
+                        if obj['deleted'] in dropped:
+                            continue
+                    elif 'next_id' in obj:
+                        continue
+                    else:
+                        record_id = obj.get('id')
+                        if record_id in dropped:
+                            continue
+                        if record_id is None:
+                            record_id = next_id
+                            next_id += 1
+                            obj = with_id(obj, record_id)
+                        ids.append(record_id)
+                        offsets.append(dst.tell())
+                    dst.write((self.encoder.encode(obj) + '\n').encode('utf-8'))
+
+                with self.lock:
+                    self._refresh_counters()
+                    if self._stats_inode != inode or self._stats_offset < end:
+                        # 整理期间日志被替换（如清空），放弃这次整理
+                        raise InterruptedError("日志已被替换")
+                    # 拼接整理期间追加的行
+                    base = dst.tell()
+                    with open(self.history_path, 'rb') as src:
+                        src.seek(end)
+                        dst.write(src.read(self._stats_offset - end))
+                    tail = bisect_left(self._index_offsets, end)
+                    ids.extend(self._index_ids[tail:])
+                    offsets.extend(offset - end + base for offset in self._index_offsets[tail:])
+                    size = base + self._stats_offset - end
+                    dst.flush()
+                    os.fsync(dst.fileno())
+
+                    os.replace(tmp_path, self.history_path)
+                    self._tombstones -= dropped
+                    self._index_ids, self._index_offsets = ids, offsets
+                    self._next_id = max(self._next_id, next_id)
+                    self._legacy_records = False
+                    self._stats_inode = file_signature(self.history_path)[2]
+                    self._stats_offset = size
+            return True
+        except InterruptedError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        except Exception as e:
+            print(f"整理历史记录失败: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+    @synchronized
+    def save(self, history_data):
+        """用给定的记录重写整个日志（仅用于迁移和清空）"""
+        self._refresh_counters()
+        next_id = max(self._next_id, history_data.get('next_id', 0))
+        try:
+            os.makedirs(os.path.dirname(self.history_path), exist_ok=True)
+            tmp_path = self.history_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for record in history_data.get('draws', []):
+                    if record.get('id') is None:
+                        record = with_id(record, next_id)
+                    next_id = max(next_id, record['id'] + 1)
+                    f.write(self.encoder.encode(record))
+                    f.write('\n')
+                f.write(self.encoder.encode({'next_id': next_id}))
+                f.write('\n')
+            os.replace(tmp_path, self.history_path)
+            return True
+        except Exception as e:
+            print(f"保存历史记录失败: {e}")
+            return False
+        finally:
+            self._statistics = None
+
+    def clear(self):
+        """清空历史记录"""
+        return self.save({'draws': []})
+
+    def _append_lines(self, lines):
+        """在日志末尾追加若干行"""
+        try:
+            os.makedirs(os.path.dirname(self.history_path), exist_ok=True)
+            with open(self.history_path, 'a', encoding='utf-8') as f:
+                f.writelines(lines)
+            return True
+        except Exception as e:
+            print(f"保存历史记录失败: {e}")
+            return False
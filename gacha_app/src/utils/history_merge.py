@@ -0,0 +1,138 @@
+import argparse
+import heapq
+import os
+import sys
+
+from .history import count_record, rollup_record, write_document
+
+def record_source(record, machine):
+    """记录的来源 (机器编号, 原记录编号)；已合并过的记录保留最初的来源"""
+    source = record.get('source')
+    if source:
+        return source['machine'], source['id']
+    return machine, record.get('id')
+
+def record_timestamp(record):
+    return record['timestamp']
+
+def merge_sorted(streams, key=record_timestamp, newest_first=False):
+    """多路归并各自按时间排好序的记录流（newest_first 时各流须从新到旧）"""
+    return heapq.merge(*streams, key=key, reverse=newest_first)
+
+def merge_records(sources, stats=None, rollups=None):
+    """按时间戳多路归并多台机器的抽奖记录
+
+    sources 为 [(机器编号, 按时间顺序的记录迭代器), ...]，每次只从每个来源取一条记录，
+    内存占用与来源个数成正比而与记录总数无关。合并后的记录重新编号，
+    原来的 (机器编号, 记录编号) 保存在 source 字段中，并据此去掉重复的记录
+    （同一台机器的记录出现在多个来源中，或重复合并已合并过的文件）。
+    传入 stats/rollups 字典时，统计信息和时间汇总在同一遍中随之累计。
+    """
+    streams = [_keyed(machine, records) for machine, records in sources]
+    # 时间戳相同时按来源顺序输出；重复的记录时间戳必然相同，只需记住当前时间戳的来源
+    current_timestamp = None
+    seen = set()
+    next_id = 0
+    for timestamp, record, machine in merge_sorted(streams, key=lambda item: item[0]):
+        if timestamp != current_timestamp:
+            current_timestamp = timestamp
+            seen.clear()
+        machine, source_id = record_source(record, machine)
+        if source_id is not None:
+            key = (machine, source_id)
+            if key in seen:
+                continue
+            seen.add(key)
+        merged = {key: value for key, value in record.items() if key not in ('id', 'source')}
+        merged = dict(id=next_id, **merged, source={'machine': machine, 'id': source_id})
+        next_id += 1
+        if stats is not None:
+            count_record(stats, merged)
+        if rollups is not None:
+            rollup_record(rollups, merged)
+        yield merged
+
+def _keyed(machine, records):
+    """给记录加上归并用的键：(时间戳, 记录, 机器编号)"""
+    for record in records:
+        yield record['timestamp'], record, machine
+
+def merge_histories(histories, output_path):
+    """把多个历史记录合并为一个 history.json 格式的文档，返回合并后的记录数
+
+    histories 为 [(机器编号, 历史记录对象), ...]，记录通过 iter_records 逐条读取，
+    合并结果逐条写出；先写入临时文件，完成后再替换目标文件。
+    """
+    stats = {}
+    rollups = {}
+    merged_count = 0
+
+    def counted(records):
+        nonlocal merged_count
+        for record in records:
+            merged_count += 1
+            yield record
+
+    sources = [(machine, history.iter_records()) for machine, history in histories]
+    tmp_path = output_path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            # draws 在前，写到 statistics/rollups 时它们已在同一遍中累计完毕
+            write_document(f, {
+                'draws': counted(merge_records(sources, stats, rollups)),
+                'statistics': stats,
+                'rollups': rollups
+            })
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return merged_count
+
+def machine_name(path):
+    """默认的机器编号：配置目录（config）所在的目录名，如 kiosk1/config/history.json -> kiosk1"""
+    directory = os.path.dirname(os.path.abspath(path))
+    if os.path.basename(directory) == 'config':
+        directory = os.path.dirname(directory)
+    return os.path.basename(directory)
+
+def main(argv=None):
+    """命令行合并：python -m gacha_app.src.utils.history_merge 输出文件 [机器编号=]历史记录 ..."""
+    from .history_store import open_history_path
+
+    parser = argparse.ArgumentParser(description="按时间合并多台扭蛋机的抽奖历史记录")
+    parser.add_argument('output', help="输出的 history.json 路径")
+    parser.add_argument('sources', nargs='+', metavar='[机器编号=]路径',
+                        help="各台机器的历史记录文件（json/jsonl/db/bin）或分段目录；"
+                             "默认机器编号为 config 目录所在的目录名")
+    args = parser.parse_args(argv)
+
+    histories = []
+    for source in args.sources:
+        machine, sep, path = source.partition('=')
+        if not sep:
+            machine, path = machine_name(source), source
+        if not os.path.exists(path):
+            print(f"历史记录不存在: {path}", file=sys.stderr)
+            return 1
+        try:
+            histories.append((machine, open_history_path(path)))
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+
+    machines = [machine for machine, _ in histories]
+    if len(set(machines)) != len(machines):
+        print("提示: 多个来源使用了相同的机器编号，其中重复的记录只保留一条", file=sys.stderr)
+
+    try:
+        merged = merge_histories(histories, args.output)
+    except (OSError, ValueError) as e:
+        print(f"合并失败: {e}", file=sys.stderr)
+        return 1
+    print(f"已合并 {len(histories)} 个来源的 {merged} 条记录到 {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
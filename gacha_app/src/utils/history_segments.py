@@ -0,0 +1,536 @@
+import os
+import json
+import gzip
+import lzma
+import shutil
+from datetime import datetime, timedelta
+
+from .history import (History, check_granularity, count_record, filter_records, rollup_record,
+                      uncount_record, unrollup_record, with_id, synchronized, _to_iso)
+
+# 压缩方式 -> (文件后缀, open 函数)
+COMPRESSORS = {
+    'gz': ('.gz', gzip.open),
+    'xz': ('.xz', lzma.open),
+}
+
+SEGMENT_SUFFIX = '.jsonl'
+AGGREGATES_FILE = 'aggregates.json'
+TOMBSTONES_FILE = 'tombstones.log'  # 已删除但尚未整理的记录 {"deleted": 编号, "day": 日期}
+META_FILE = 'meta.json'  # 折叠或清空后仍需保留的下一个记录编号
+
+class SegmentedHistory(History):
+    """按天分段的历史记录
+
+    记录按时间戳所在的日期写入 YYYY-MM-DD.jsonl 分段；过去日期的分段会被
+    压缩封存，超过保留天数的分段折叠为每天每个奖品的计数（aggregates.json）。
+    按时间范围查询只读取与范围有交集的分段。删除记录时追加墓碑，积累到一定数量后
+    在后台重写相关日期的分段。
+    """
+    def __init__(self, history_path, compression='gz', retention_days=None):
+        super().__init__(history_path)
+        if compression not in COMPRESSORS:
+            print(f"未知的压缩方式: {compression}，使用 gz")
+            compression = 'gz'
+        self.compression = compression
+        self.retention_days = retention_days  # None 表示永久保留原始记录
+        self.encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        self._statistics = None
+        self._rollups = None
+        self._tombstones = None  # 已删除的记录编号 -> 所在日期，首次使用时读取
+        self._day_ids = {}  # 日期 -> [最小编号, 最大编号]，与统计计数一起建立
+        self._next_id = None  # 下一个可用的记录编号，首次分配时确定
+        self._existed = os.path.isdir(history_path) and bool(os.listdir(history_path))
+        self._active_day = None
+
+        os.makedirs(history_path, exist_ok=True)
+        self.maintain()
+
+    # ---- 分段文件 ----
+
+    def _raw_path(self, day):
+        return os.path.join(self.history_path, day + SEGMENT_SUFFIX)
+
+    def _sealed_path(self, day):
+        return self._raw_path(day) + COMPRESSORS[self.compression][0]
+
+    def list_segments(self):
+        """列出所有分段 {日期: [文件路径, ...]}，已封存的在前"""
+        segments = {}
+        for filename in os.listdir(self.history_path):
+            if SEGMENT_SUFFIX not in filename:
+                continue
+            day, rest = filename.split(SEGMENT_SUFFIX, 1)
+            if rest and rest not in [suffix for suffix, _ in COMPRESSORS.values()]:
+                continue
+            segments.setdefault(day, []).append(os.path.join(self.history_path, filename))
+        for paths in segments.values():
+            paths.sort(key=lambda path: path.endswith(SEGMENT_SUFFIX))
+        return segments
+
+    def _open_segment(self, path):
+        """按后缀打开分段文件"""
+        for suffix, opener in COMPRESSORS.values():
+            if path.endswith(suffix):
+                return opener(path, 'rt', encoding='utf-8')
+        return open(path, 'r', encoding='utf-8')
+
+    def _iter_segment(self, paths):
+        """读取一天的分段中的全部记录"""
+        for path in paths:
+            try:
+                with self._open_segment(path) as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            print(f"跳过损坏的历史记录: {line[:50]}")
+            except (OSError, EOFError) as e:
+                print(f"读取历史分段失败: {e}")
+
+    def _days_between(self, start=None, end=None):
+        """与 [start, end) 有交集的分段日期（升序）"""
+        start_day = start[:10] if start else None
+        end_day = end[:10] if end else None
+        days = sorted(self.list_segments())
+        return [day for day in days
+                if (start_day is None or day >= start_day)
+                and (end_day is None or day <= end_day)]
+
+    # ---- 维护：封存与保留 ----
+
+    @synchronized
+    def maintain(self, today=None):
+        """封存过去日期的分段，并按保留天数折叠旧记录"""
+        today = today or datetime.now().strftime('%Y-%m-%d')
+        self._active_day = today
+        segments = self.list_segments()
+
+        for day, paths in sorted(segments.items()):
+            raw_path = self._raw_path(day)
+            if day < today and raw_path in paths:
+                self._seal(day)
+
+        if self.retention_days is not None:
+            cutoff = (datetime.strptime(today, '%Y-%m-%d')
+                      - timedelta(days=self.retention_days)).strftime('%Y-%m-%d')
+            for day in sorted(self.list_segments()):
+                if day < cutoff:
+                    self._fold(day)
+
+    def _seal(self, day):
+        """压缩封存一天的原始分段（追加为新的压缩成员）"""
+        raw_path = self._raw_path(day)
+        opener = COMPRESSORS[self.compression][1]
+        try:
+            with open(raw_path, 'rb') as src, opener(self._sealed_path(day), 'ab') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(raw_path)
+        except OSError as e:
+            print(f"封存历史分段失败: {e}")
+
+    def _fold(self, day):
+        """把一天的原始记录折叠为每个奖品的计数，并删除该天的分段"""
+        paths = self.list_segments().get(day, [])
+        tombstones = self._load_tombstones()
+        counts = {}
+        max_id = -1
+        for record in self._iter_live(paths, tombstones):
+            prize_name = record['prize']['name']
+            counts[prize_name] = counts.get(prize_name, 0) + 1
+            max_id = max(max_id, record.get('id', -1))
+
+        # 折叠后编号信息随分段一起消失，先记下下一个编号
+        meta = self._load_meta()
+        if max_id + 1 > meta.get('next_id', 0):
+            meta['next_id'] = max_id + 1
+            self._save_meta(meta)
+
+        aggregates = self.load_aggregates()
+        day_counts = aggregates.setdefault(day, {})
+        for prize_name, count in counts.items():
+            day_counts[prize_name] = day_counts.get(prize_name, 0) + count
+        self._save_aggregates(aggregates)
+
+        for path in paths:
+            os.remove(path)
+        # 这一天的墓碑随分段一起失效
+        deleted = [record_id for record_id, tomb_day in tombstones.items() if tomb_day == day]
+        for record_id in deleted:
+            del tombstones[record_id]
+        if deleted:
+            self._save_tombstones()
+        self._day_ids.pop(day, None)
+
+    def load_aggregates(self):
+        """读取折叠后的每日计数 {日期: {奖品名称: 次数}}"""
+        path = os.path.join(self.history_path, AGGREGATES_FILE)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"读取历史汇总失败: {e}")
+            return {}
+
+    def _save_aggregates(self, aggregates):
+        path = os.path.join(self.history_path, AGGREGATES_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(aggregates, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    # ---- 读取 ----
+
+    def load(self):
+        """加载历史记录（与 History.load 返回相同的结构）"""
+        return {
+            'draws': self.get_all_records(),
+            'statistics': self.get_statistics()
+        }
+
+    def get_all_records(self):
+        """获取所有原始记录（不含已折叠为计数的部分）"""
+        return list(self.iter_records())
+
+    def iter_records(self, since=None, until=None, prize=None, newest_first=False):
+        """按日期顺序逐条读取原始记录，只读取与 [since, until) 有交集的分段
+
+        newest_first 为 True 时从最新的分段开始，每次只载入一天的记录。
+        每天的分段在锁内列出并读完，避免 maintain() 同时封存或删除文件。
+        """
+        since = _to_iso(since)
+        until = _to_iso(until)
+        with self.lock:
+            days = self._days_between(since, until)
+        if newest_first:
+            days.reverse()
+        for day in days:
+            with self.lock:
+                tombstones = self._load_tombstones()
+                paths = self.list_segments().get(day, [])
+                records = list(self._iter_live(paths, tombstones))
+            if newest_first:
+                records.reverse()
+            yield from filter_records(records, since, until, prize)
+
+    def _iter_live(self, paths, tombstones):
+        """读取一天的分段中未被删除的记录"""
+        for record in self._iter_segment(paths):
+            if record.get('id') not in tombstones:
+                yield record
+
+    def count_by_prize_between(self, start=None, end=None):
+        """统计 [start, end) 内每个奖品的次数，已折叠的日期直接使用每日计数
+
+        已折叠的日期没有时间戳，只要与范围有交集就计入整天；end 恰好是某天
+        零点时不计入那一天。
+        """
+        start = _to_iso(start)
+        end = _to_iso(end)
+        end_day = None
+        if end is not None:
+            end_time = datetime.fromisoformat(end)
+            end_day = end_time.strftime('%Y-%m-%d')
+            if end_time.time() != datetime.min.time():
+                # end 落在当天之内，这一天的计数也在范围内
+                end_day = (end_time + timedelta(days=1)).strftime('%Y-%m-%d')
+        counts = {}
+        for day, day_counts in self.load_aggregates().items():
+            if (start is None or day >= start[:10]) and (end_day is None or day < end_day):
+                for prize_name, count in day_counts.items():
+                    counts[prize_name] = counts.get(prize_name, 0) + count
+        for record in self.get_records_between(start, end):
+            prize_name = record['prize']['name']
+            counts[prize_name] = counts.get(prize_name, 0) + 1
+        return counts
+
+    @synchronized
+    def get_statistics(self):
+        """获取每个奖品的统计（含已折叠的计数），之后随新增记录增量更新"""
+        self._ensure_counters()
+        return {prize_name: dict(data) for prize_name, data in self._statistics.items()}
+
+    @synchronized
+    def get_rollups(self, granularity='daily'):
+        """获取按时间桶汇总的次数 {时间桶: {奖品名称: 次数}}（副本）
+
+        已折叠的日期只有按日汇总，没有按小时汇总。
+        """
+        check_granularity(granularity)
+        self._ensure_counters()
+        rollups = self._rollups.get(granularity, {})
+        return {bucket: dict(counts) for bucket, counts in rollups.items()}
+
+    def _ensure_counters(self):
+        """首次使用时从每日计数和原始分段建立统计和时间汇总"""
+        if self._statistics is not None:
+            return
+        stats = {}
+        rollups = {}
+        for day, day_counts in sorted(self.load_aggregates().items()):
+            daily = rollups.setdefault('daily', {}).setdefault(day, {})
+            for prize_name, count in day_counts.items():
+                data = stats.setdefault(prize_name, {
+                    'count': 0, 'first_seen': day, 'last_seen': day})
+                data['count'] += count
+                data['last_seen'] = max(data['last_seen'], day)
+                daily[prize_name] = daily.get(prize_name, 0) + count
+        self._day_ids = {}
+        for record in self.iter_records():
+            count_record(stats, record)
+            rollup_record(rollups, record)
+            self._track_id(record)
+        self._statistics = stats
+        self._rollups = rollups
+
+    def _track_id(self, record):
+        """记下每天的编号范围，删除时据此找到记录所在的分段"""
+        record_id = record.get('id')
+        if record_id is None:
+            return
+        bounds = self._day_ids.get(record['timestamp'][:10])
+        if bounds is None:
+            self._day_ids[record['timestamp'][:10]] = [record_id, record_id]
+        else:
+            bounds[0] = min(bounds[0], record_id)
+            bounds[1] = max(bounds[1], record_id)
+
+    # ---- 编号与删除 ----
+
+    def _load_tombstones(self):
+        """读取墓碑 {编号: 日期}"""
+        if self._tombstones is None:
+            tombstones = {}
+            path = os.path.join(self.history_path, TOMBSTONES_FILE)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        tombstones[entry['deleted']] = entry['day']
+            self._tombstones = tombstones
+        return self._tombstones
+
+    def _load_meta(self):
+        path = os.path.join(self.history_path, META_FILE)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"读取历史元数据失败: {e}")
+            return {}
+
+    def _save_meta(self, meta):
+        path = os.path.join(self.history_path, META_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def _allocate_id(self):
+        """分配一个新的记录编号
+
+        首次分配时取元数据、墓碑和最新一天分段中的最大编号，之后在内存中递增。
+        """
+        if self._next_id is None:
+            next_id = self._load_meta().get('next_id', 0)
+            next_id = max([next_id] + [record_id + 1 for record_id in self._load_tombstones()])
+            segments = self.list_segments()
+            if segments:
+                for record in self._iter_segment(segments[max(segments)]):
+                    if record.get('id') is not None:
+                        next_id = max(next_id, record['id'] + 1)
+            self._next_id = next_id
+        record_id = self._next_id
+        self._next_id += 1
+        return record_id
+
+    @synchronized
+    def delete(self, record_id):
+        """按编号删除一条记录：追加墓碑，统计信息随之增量扣除
+
+        已折叠为每日计数的记录无法删除。
+        """
+        self._ensure_counters()
+        tombstones = self._load_tombstones()
+        if record_id in tombstones:
+            return False
+        segments = self.list_segments()
+        for day, (low, high) in self._day_ids.items():
+            if low <= record_id <= high and day in segments:
+                record = next((record for record in self._iter_segment(segments[day])
+                               if record.get('id') == record_id), None)
+                if record is not None:
+                    break
+        else:
+            return False
+
+        try:
+            path = os.path.join(self.history_path, TOMBSTONES_FILE)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(self.encoder.encode({'deleted': record_id, 'day': day}))
+                f.write('\n')
+        except OSError as e:
+            print(f"删除历史记录失败: {e}")
+            return False
+        tombstones[record_id] = day
+        uncount_record(self._statistics, record, self._prize_bounds)
+        unrollup_record(self._rollups, record)
+        self._schedule_compaction(len(tombstones))
+        return True
+
+    def _prize_bounds(self, prize_name):
+        """某个奖品剩余记录的 (最早, 最晚) 时间戳（已折叠的日期以日期计）"""
+        folded = [day for day, day_counts in self.load_aggregates().items()
+                  if day_counts.get(prize_name)]
+        oldest = next(self.iter_records(prize=prize_name), None)
+        newest = next(self.iter_records(prize=prize_name, newest_first=True), None)
+        first = ([oldest['timestamp']] if oldest else []) + folded
+        last = ([newest['timestamp']] if newest else []) + folded
+        return (min(first), max(last)) if first else None
+
+    def compact(self):
+        """后台整理：重写有墓碑的日期的分段，去掉已删除的记录"""
+        with self.lock:
+            tombstones = self._load_tombstones()
+            if not tombstones:
+                return True
+            days = sorted(set(tombstones.values()))
+            # 被删除的可能是最新的记录，先记下下一个编号以免之后重复使用
+            meta = self._load_meta()
+            if max(tombstones) + 1 > meta.get('next_id', 0):
+                meta['next_id'] = max(tombstones) + 1
+                self._save_meta(meta)
+        for day in days:
+            # 每天单独加锁，整理期间其他日期照常写入
+            with self.lock:
+                tombstones = self._load_tombstones()
+                deleted = {record_id for record_id, tomb_day in tombstones.items() if tomb_day == day}
+                if not deleted:
+                    continue
+                if not self._rewrite_day(day, deleted):
+                    return False
+                for record_id in deleted:
+                    del tombstones[record_id]
+        with self.lock:
+            return self._save_tombstones()
+
+    def _rewrite_day(self, day, deleted):
+        """重写一天的分段（保持原来的压缩方式），去掉 deleted 中的记录"""
+        for path in self.list_segments().get(day, []):
+            tmp_path = path + '.tmp'
+            try:
+                with self._open_segment(path) as src:
+                    lines = [line for line in src
+                             if line.strip() and json.loads(line).get('id') not in deleted]
+                opener = open
+                for suffix, compressor in COMPRESSORS.values():
+                    if path.endswith(suffix):
+                        opener = compressor
+                with opener(tmp_path, 'wt', encoding='utf-8') as dst:
+                    dst.writelines(lines)
+                os.replace(tmp_path, path)
+            except (OSError, EOFError, ValueError) as e:
+                print(f"整理历史分段失败: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return False
+        return True
+
+    def _save_tombstones(self):
+        """重写墓碑文件（只保留尚未整理的墓碑）"""
+        path = os.path.join(self.history_path, TOMBSTONES_FILE)
+        tombstones = self._load_tombstones()
+        try:
+            if not tombstones:
+                if os.path.exists(path):
+                    os.remove(path)
+                return True
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for record_id, day in tombstones.items():
+                    f.write(self.encoder.encode({'deleted': record_id, 'day': day}))
+                    f.write('\n')
+            os.replace(tmp_path, path)
+            return True
+        except OSError as e:
+            print(f"保存墓碑失败: {e}")
+            return False
+
+    # ---- 写入 ----
+
+    @synchronized
+    def add_records(self, prize_data_list):
+        """按时间戳所在日期追加到对应分段"""
+        if not prize_data_list:
+            return True
+        records = [self._make_record(prize_data, self._allocate_id())
+                   for prize_data in prize_data_list]
+        if not self._write_records(records):
+            return False
+        if self._statistics is not None:
+            for record in records:
+                count_record(self._statistics, record)
+                rollup_record(self._rollups, record)
+                self._track_id(record)
+
+        # 日期变化后封存前一天的分段
+        today = datetime.now().strftime('%Y-%m-%d')
+        if today != self._active_day:
+            self.maintain(today)
+        return True
+
+    def _write_records(self, records):
+        """把记录追加到各自日期的原始分段"""
+        by_day = {}
+        for record in records:
+            by_day.setdefault(record['timestamp'][:10], []).append(record)
+        try:
+            for day, day_records in by_day.items():
+                with open(self._raw_path(day), 'a', encoding='utf-8') as f:
+                    for record in day_records:
+                        f.write(self.encoder.encode(record))
+                        f.write('\n')
+            return True
+        except Exception as e:
+            print(f"保存历史记录失败: {e}")
+            return False
+
+    @synchronized
+    def save(self, history_data):
+        """用给定的记录替换全部数据（仅用于迁移和清空），编号不会重复使用"""
+        records = []
+        for record in history_data.get('draws', []):
+            if record.get('id') is None:
+                record = with_id(record, self._allocate_id())
+            elif self._next_id is not None:
+                self._next_id = max(self._next_id, record['id'] + 1)
+            records.append(record)
+        next_id = self._allocate_id()
+        try:
+            for filename in os.listdir(self.history_path):
+                os.remove(os.path.join(self.history_path, filename))
+        except OSError as e:
+            print(f"清空历史分段失败: {e}")
+            return False
+        self._statistics = None
+        self._rollups = None
+        self._tombstones = None
+        self._next_id = max([next_id] + [record['id'] + 1 for record in records])
+        self._save_meta({'next_id': self._next_id})
+        ok = self._write_records(records)
+        self.maintain()
+        return ok
+
+    def _storage_exists(self):
+        """分段目录在打开前是否已有数据"""
+        return self._existed
@@ -0,0 +1,312 @@
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+from .history import History, check_granularity, with_id, synchronized
+from .history_log import LogHistory
+from .history_merge import merge_sorted
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# 全局记录编号 = 分片内编号 * SHARD_STRIDE + 分片号，也是分片数量的上限
+SHARD_STRIDE = 1024
+
+SHARD_PATTERN = re.compile(r'^shard-(\d+)\.jsonl$')
+
+# 已从旧 history.json 迁移过的标记文件
+MIGRATED_MARKER = 'migrated'
+
+# 锁文件中的字节：OWNER 由占用分片的写入进程一直持有，WRITE 在每次写文件时短暂持有
+OWNER_BYTE = 0
+WRITE_BYTE = 1
+
+class ShardLock:
+    """分片的锁文件（fcntl 记录锁，Windows 下为 msvcrt 字节锁）
+
+    两种锁都不可用时不加锁，只创建新的分片，保证每个分片只有一个写入进程。
+    """
+    supported = fcntl is not None or msvcrt is not None
+
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+        self.fd = None
+
+    def _open(self, exclusive=False):
+        if self.fd is None:
+            flags = os.O_RDWR | os.O_CREAT | (os.O_EXCL if exclusive else 0)
+            self.fd = os.open(self.lock_path, flags, 0o644)
+        return self.fd
+
+    def _lock(self, byte, blocking):
+        fd = self._open()
+        if fcntl is not None:
+            fcntl.lockf(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB), 1, byte)
+        elif msvcrt is not None:
+            os.lseek(fd, byte, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+
+    def _unlock(self, byte):
+        if fcntl is not None:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, byte)
+        elif msvcrt is not None:
+            os.lseek(self.fd, byte, os.SEEK_SET)
+            msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+
+    def claim(self):
+        """尝试占用分片，成功后一直持有到进程退出（或 release），返回是否成功"""
+        try:
+            if not self.supported:
+                # 没有文件锁时只能占用自己新建的分片
+                self._open(exclusive=True)
+                return True
+            self._lock(OWNER_BYTE, blocking=False)
+            return True
+        except OSError:
+            self.close()
+            return False
+
+    def release(self):
+        """放弃对分片的占用"""
+        if self.supported and self.fd is not None:
+            self._unlock(OWNER_BYTE)
+
+    @contextmanager
+    def writing(self):
+        """写分片文件期间持有写锁（与其他进程追加墓碑、整理互斥）"""
+        if not self.supported:
+            yield
+            return
+        self._lock(WRITE_BYTE, blocking=True)
+        try:
+            yield
+        finally:
+            self._unlock(WRITE_BYTE)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+class ShardLog(LogHistory):
+    """一个分片：追加式日志，所有写文件的操作都在分片的写锁下进行
+
+    先取 self.lock 再取文件锁，进程内外的加锁顺序一致。
+    """
+    def __init__(self, history_path, lock_path):
+        super().__init__(history_path)
+        self.file_lock = ShardLock(lock_path)
+
+    def _append_lines(self, lines):
+        with self.file_lock.writing():
+            return super()._append_lines(lines)
+
+    def compact(self):
+        # 整理会替换日志文件，整个过程都不能有其他进程追加
+        with self.lock, self.file_lock.writing():
+            return super().compact()
+
+    def save(self, history_data):
+        with self.lock, self.file_lock.writing():
+            return super().save(history_data)
+
+    def tombstone_all(self):
+        """给分片中现有的全部记录追加墓碑（用于清空其他进程仍在写入的分片）
+
+        不替换文件，占用分片的进程之后追加的记录不受影响。
+        """
+        with self.lock:
+            self._refresh_counters()
+            lines = [self.encoder.encode({'deleted': record['id']}) + '\n'
+                     for record in self._iter_live(False, self._tombstones)
+                     if record.get('id') is not None]
+            if not lines:
+                return True
+            if not self._append_lines(lines):
+                return False
+            self._refresh_counters()
+            self._schedule_compaction(len(self._tombstones))
+            return True
+
+class ShardedHistory(History):
+    """多进程并发写入的分片历史记录
+
+    目录下每个写入进程占用一个分片 shard-NNNN.jsonl（用文件锁声明占用，进程退出后可被复用），
+    抽奖记录只追加到自己的分片，多个进程可以同时全速写入而不会丢失记录。
+    读取时按时间戳归并所有分片；记录编号为 分片内编号 * SHARD_STRIDE + 分片号，
+    删除记录时在对应分片中追加墓碑。
+    """
+    def __init__(self, history_path):
+        super().__init__(history_path)
+        self._shards = {}  # 分片号 -> ShardLog
+        self._own_shard = None  # 本进程占用的分片号
+        self._claiming = threading.Lock()
+
+    # ---- 分片 ----
+
+    def _shard_path(self, number):
+        return os.path.join(self.history_path, f'shard-{number:04d}.jsonl')
+
+    def _shard(self, number):
+        shard = self._shards.get(number)
+        if shard is None:
+            path = self._shard_path(number)
+            shard = self._shards[number] = ShardLog(path, path[:-len('.jsonl')] + '.lock')
+        return shard
+
+    @synchronized
+    def _all_shards(self):
+        """目录中现有的所有分片（包括其他进程新建的）"""
+        if os.path.isdir(self.history_path):
+            for filename in os.listdir(self.history_path):
+                match = SHARD_PATTERN.match(filename)
+                if match:
+                    self._shard(int(match.group(1)))
+        return sorted(self._shards.items())
+
+    def _writer(self):
+        """本进程写入的分片，首次写入时占用一个空闲分片"""
+        with self._claiming:
+            if self._own_shard is None:
+                os.makedirs(self.history_path, exist_ok=True)
+                for number in range(SHARD_STRIDE):
+                    shard = self._shard(number)
+                    if shard.file_lock.claim():
+                        self._own_shard = number
+                        break
+                else:
+                    raise RuntimeError("没有空闲的历史记录分片")
+            return self._shards[self._own_shard]
+
+    def _global_records(self, number, records):
+        """把分片内编号换成全局编号"""
+        for record in records:
+            yield with_id(record, record['id'] * SHARD_STRIDE + number)
+
+    # ---- 读取 ----
+
+    def load(self):
+        """加载历史记录（与 History.load 返回相同的结构）"""
+        return {
+            'draws': list(self.iter_records()),
+            'statistics': self.get_statistics()
+        }
+
+    def get_all_records(self):
+        """获取所有抽奖记录"""
+        return list(self.iter_records())
+
+    def iter_records(self, since=None, until=None, prize=None, newest_first=False):
+        """按时间戳归并各分片的记录"""
+        streams = [self._global_records(number, shard.iter_records(since, until, prize, newest_first))
+                   for number, shard in self._all_shards()]
+        return merge_sorted(streams, newest_first=newest_first)
+
+    @synchronized
+    def get_statistics(self):
+        """合并各分片的统计"""
+        stats = {}
+        for _, shard in self._all_shards():
+            for prize_name, data in shard.get_statistics().items():
+                total = stats.get(prize_name)
+                if total is None:
+                    stats[prize_name] = dict(data)
+                    continue
+                total['count'] += data['count']
+                total['first_seen'] = min(total['first_seen'], data['first_seen'])
+                total['last_seen'] = max(total['last_seen'], data['last_seen'])
+        return stats
+
+    @synchronized
+    def get_rollups(self, granularity='daily'):
+        """合并各分片的时间汇总"""
+        check_granularity(granularity)
+        rollups = {}
+        for _, shard in self._all_shards():
+            for bucket, counts in shard.get_rollups(granularity).items():
+                bucket_counts = rollups.setdefault(bucket, {})
+                for prize_name, count in counts.items():
+                    bucket_counts[prize_name] = bucket_counts.get(prize_name, 0) + count
+        return rollups
+
+    def _storage_exists(self):
+        return any(True for _ in self._all_shards())
+
+    def migrate_from_json(self, json_path):
+        """一次性从旧的 history.json 导入记录到本进程的分片
+
+        多个进程同时启动时只有最先创建迁移标记的进程导入，且不清空其他分片。
+        """
+        if self._storage_exists() or not os.path.exists(json_path):
+            return False
+        try:
+            os.makedirs(self.history_path, exist_ok=True)
+            os.close(os.open(os.path.join(self.history_path, MIGRATED_MARKER),
+                             os.O_WRONLY | os.O_CREAT | os.O_EXCL))
+        except FileExistsError:
+            return False
+        except OSError as e:
+            print(f"读取旧历史记录失败: {e}")
+            return False
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                history_data = json.load(f)
+            return self._writer().save(history_data)
+        except Exception as e:
+            print(f"读取旧历史记录失败: {e}")
+            return False
+
+    # ---- 写入 ----
+
+    def add_records(self, prize_data_list):
+        """追加到本进程的分片"""
+        try:
+            shard = self._writer()
+        except (OSError, RuntimeError) as e:
+            print(f"保存历史记录失败: {e}")
+            return False
+        return shard.add_records(prize_data_list)
+
+    def delete(self, record_id):
+        """在记录所在的分片中追加墓碑"""
+        local_id, number = divmod(record_id, SHARD_STRIDE)
+        if not os.path.exists(self._shard_path(number)):
+            return False
+        return self._shard(number).delete(local_id)
+
+    def compact(self):
+        """依次整理各分片"""
+        return all([shard.compact() for _, shard in self._all_shards()])
+
+    @synchronized
+    def save(self, history_data):
+        """用给定的记录替换全部数据（迁移和清空）：记录写入本进程的分片，其他分片清空
+
+        其他分片只有在能取得占用锁（没有活着的写入进程）时才整体清空；
+        仍被其他进程占用的分片改为给现有记录追加墓碑，对方正在写入的记录不会丢失。
+        """
+        try:
+            own = self._writer()
+        except (OSError, RuntimeError) as e:
+            print(f"保存历史记录失败: {e}")
+            return False
+        ok = True
+        for number, shard in self._all_shards():
+            if number == self._own_shard:
+                continue
+            if shard.file_lock.claim():
+                try:
+                    ok = shard.clear() and ok
+                finally:
+                    shard.file_lock.release()
+            else:
+                ok = shard.tombstone_all() and ok
+        return own.save(history_data) and ok
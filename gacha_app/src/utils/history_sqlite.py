@@ -0,0 +1,313 @@
+import os
+import sqlite3
+
+from .history import History, ROLLUP_GRANULARITIES, check_granularity, _to_iso
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS draws (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    prize_name TEXT NOT NULL,
+    prize_weight INTEGER,
+    prize_image TEXT,
+    prize_index INTEGER,
+    sequence INTEGER,
+    catalog_version INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_draws_timestamp ON draws(timestamp);
+CREATE INDEX IF NOT EXISTS idx_draws_prize ON draws(prize_name, timestamp);
+
+-- 每个奖品的运行统计，由触发器随插入/删除增量维护
+CREATE TABLE IF NOT EXISTS prize_stats (
+    prize_name TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    first_seen TEXT,
+    last_seen TEXT
+);
+CREATE TRIGGER IF NOT EXISTS trg_draws_insert AFTER INSERT ON draws BEGIN
+    INSERT INTO prize_stats (prize_name, count, first_seen, last_seen)
+    VALUES (NEW.prize_name, 1, NEW.timestamp, NEW.timestamp)
+    ON CONFLICT(prize_name) DO UPDATE SET
+        count = count + 1,
+        first_seen = MIN(first_seen, NEW.timestamp),
+        last_seen = MAX(last_seen, NEW.timestamp);
+END;
+
+-- 每小时/每天每个奖品的次数，时间桶为时间戳的前缀，由触发器增量维护
+CREATE TABLE IF NOT EXISTS prize_rollups (
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    prize_name TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (granularity, bucket, prize_name)
+);
+CREATE TRIGGER IF NOT EXISTS trg_rollups_insert AFTER INSERT ON draws BEGIN
+    INSERT INTO prize_rollups (granularity, bucket, prize_name, count)
+    VALUES ('hourly', substr(NEW.timestamp, 1, 13), NEW.prize_name, 1)
+    ON CONFLICT(granularity, bucket, prize_name) DO UPDATE SET count = count + 1;
+    INSERT INTO prize_rollups (granularity, bucket, prize_name, count)
+    VALUES ('daily', substr(NEW.timestamp, 1, 10), NEW.prize_name, 1)
+    ON CONFLICT(granularity, bucket, prize_name) DO UPDATE SET count = count + 1;
+END;
+"""
+
+DELETE_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS trg_draws_delete AFTER DELETE ON draws BEGIN
+    UPDATE prize_stats SET
+        count = count - 1,
+        first_seen = (SELECT MIN(timestamp) FROM draws WHERE prize_name = OLD.prize_name),
+        last_seen = (SELECT MAX(timestamp) FROM draws WHERE prize_name = OLD.prize_name)
+    WHERE prize_name = OLD.prize_name;
+    DELETE FROM prize_stats WHERE prize_name = OLD.prize_name AND count <= 0;
+END;
+"""
+
+ROLLUP_DELETE_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS trg_rollups_delete AFTER DELETE ON draws BEGIN
+    UPDATE prize_rollups SET count = count - 1
+    WHERE prize_name = OLD.prize_name AND (
+        (granularity = 'hourly' AND bucket = substr(OLD.timestamp, 1, 13))
+        OR (granularity = 'daily' AND bucket = substr(OLD.timestamp, 1, 10)));
+    DELETE FROM prize_rollups WHERE prize_name = OLD.prize_name AND count <= 0;
+END;
+"""
+
+RECORD_COLUMNS = "id, timestamp, prize_name, prize_weight, prize_image, prize_index, sequence, catalog_version"
+
+# 流式读取时每批的行数
+READ_BATCH_SIZE = 1000
+
+class SqliteHistory(History):
+    """基于 SQLite 的历史记录
+
+    使用 WAL 模式，按时间和奖品建立索引，统计和查询直接走索引而不加载全部记录。
+    """
+    def __init__(self, history_path):
+        super().__init__(history_path)
+        self._existed = os.path.exists(history_path)
+
+        os.makedirs(os.path.dirname(history_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(history_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._ensure_record_columns()
+        self.conn.executescript(DELETE_TRIGGER)
+        self.conn.executescript(ROLLUP_DELETE_TRIGGER)
+        self._ensure_statistics()
+        self.conn.commit()
+
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self.conn.close()
+
+    def load(self):
+        """加载历史记录（与 History.load 返回相同的结构）"""
+        return {
+            'draws': self.get_all_records(),
+            'statistics': self.get_statistics()
+        }
+
+    def get_all_records(self):
+        """获取所有抽奖记录"""
+        return list(self.iter_records())
+
+    def iter_records(self, since=None, until=None, prize=None, newest_first=False):
+        """按条件逐条读取抽奖记录，每次只取一批（按 (timestamp, id) 键集分页）"""
+        where, params = self._filter_clause(since, until, prize)
+        order = "DESC" if newest_first else "ASC"
+        after = "<" if newest_first else ">"
+        last = None
+        while True:
+            clauses = list(where)
+            batch_params = list(params)
+            if last is not None:
+                clauses.append(f"(timestamp, id) {after} (?, ?)")
+                batch_params.extend(last)
+            sql = f"SELECT {RECORD_COLUMNS} FROM draws"
+            if clauses:
+                sql += " WHERE " + " AND ".join(clauses)
+            sql += f" ORDER BY timestamp {order}, id {order} LIMIT ?"
+            with self.lock:
+                rows = self.conn.execute(sql, batch_params + [READ_BATCH_SIZE]).fetchall()
+            for row in rows:
+                yield self._row_to_record(row)
+            if len(rows) < READ_BATCH_SIZE:
+                return
+            last = (rows[-1][1], rows[-1][0])
+            
+    def page(self, offset, limit, since=None, until=None, prize=None, newest_first=True):
+        """获取一页记录，由数据库按索引排序和分页"""
+        if limit <= 0:
+            return []
+        where, params = self._filter_clause(since, until, prize)
+        order = "DESC" if newest_first else "ASC"
+        sql = f"SELECT {RECORD_COLUMNS} FROM draws"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY timestamp {order}, id {order} LIMIT ? OFFSET ?"
+        with self.lock:
+            rows = self.conn.execute(sql, params + [limit, offset]).fetchall()
+        return [self._row_to_record(row) for row in rows]
+        
+    def _filter_clause(self, since, until, prize):
+        """筛选条件 -> (WHERE 子句列表, 参数列表)"""
+        where, params = [], []
+        if since is not None:
+            where.append("timestamp >= ?")
+            params.append(_to_iso(since))
+        if until is not None:
+            where.append("timestamp < ?")
+            params.append(_to_iso(until))
+        if prize is not None:
+            where.append("prize_name = ?")
+            params.append(prize)
+        return where, params
+        
+    def get_statistics(self):
+        """读取触发器维护的统计表，O(奖品数)"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT prize_name, count, first_seen, last_seen FROM prize_stats").fetchall()
+        return {
+            name: {'count': count, 'first_seen': first_seen, 'last_seen': last_seen}
+            for name, count, first_seen, last_seen in rows
+        }
+
+    def get_rollups(self, granularity='daily'):
+        """读取触发器维护的时间汇总表 {时间桶: {奖品名称: 次数}}"""
+        check_granularity(granularity)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT bucket, prize_name, count FROM prize_rollups WHERE granularity = ? "
+                "ORDER BY bucket", (granularity,)).fetchall()
+        rollups = {}
+        for bucket, prize_name, count in rows:
+            rollups.setdefault(bucket, {})[prize_name] = count
+        return rollups
+        
+    def count(self):
+        """获取抽奖总次数"""
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(SUM(count), 0) FROM prize_stats").fetchone()[0]
+
+    def count_by_prize(self):
+        """获取每个奖品的抽中次数 {奖品名称: 次数}"""
+        with self.lock:
+            rows = self.conn.execute("SELECT prize_name, count FROM prize_stats").fetchall()
+        return dict(rows)
+
+    def count_prize_between(self, prize_name, start=None, end=None):
+        """统计某个奖品在时间范围内的抽中次数"""
+        start = _to_iso(start)
+        end = _to_iso(end)
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM draws WHERE prize_name = ? "
+                "AND (? IS NULL OR timestamp >= ?) AND (? IS NULL OR timestamp < ?)",
+                (prize_name, start, start, end, end)).fetchone()[0]
+
+    def add_records(self, prize_data_list):
+        """批量添加抽奖记录，一个事务提交"""
+        if not prize_data_list:
+            return True
+        rows = [self._record_to_row(self._make_record(prize_data))
+                for prize_data in prize_data_list]
+        try:
+            with self.lock, self.conn:
+                self.conn.executemany(
+                    "INSERT INTO draws (timestamp, prize_name, prize_weight, prize_image, prize_index, "
+                    "sequence, catalog_version) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            return True
+        except Exception as e:
+            print(f"保存历史记录失败: {e}")
+            return False
+
+    def delete(self, record_id):
+        """按编号删除一条记录，统计表和汇总表由触发器增量扣除"""
+        try:
+            with self.lock, self.conn:
+                cursor = self.conn.execute("DELETE FROM draws WHERE id = ?", (record_id,))
+            return cursor.rowcount > 0
+        except Exception as e:
+            print(f"删除历史记录失败: {e}")
+            return False
+        
+    def save(self, history_data):
+        """用给定的记录替换全部数据（仅用于迁移和清空）
+        
+        记录的编号原样保留；AUTOINCREMENT 保证之后分配的编号不会与删除过的重复。
+        """
+        rows = [(record.get('id'),) + self._record_to_row(record)
+                for record in history_data.get('draws', [])]
+        try:
+            with self.lock, self.conn:
+                # 整表删除时暂时去掉删除触发器，直接清空统计表和汇总表
+                self.conn.execute("DROP TRIGGER IF EXISTS trg_draws_delete")
+                self.conn.execute("DROP TRIGGER IF EXISTS trg_rollups_delete")
+                self.conn.execute("DELETE FROM draws")
+                self.conn.execute("DELETE FROM prize_stats")
+                self.conn.execute("DELETE FROM prize_rollups")
+                self.conn.execute(DELETE_TRIGGER)
+                self.conn.execute(ROLLUP_DELETE_TRIGGER)
+                self.conn.executemany(
+                    "INSERT INTO draws (id, timestamp, prize_name, prize_weight, prize_image, prize_index, "
+                    "sequence, catalog_version) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            return True
+        except Exception as e:
+            print(f"保存历史记录失败: {e}")
+            return False
+
+    def _ensure_record_columns(self):
+        """旧数据库的记录表没有 sequence / catalog_version 列时补上"""
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(draws)")]
+        for column in ('sequence', 'catalog_version'):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE draws ADD COLUMN {column} INTEGER")
+
+    def _ensure_statistics(self):
+        """旧数据库没有统计表/汇总表数据时，按现有记录补建一次"""
+        has_stats = self.conn.execute("SELECT 1 FROM prize_stats LIMIT 1").fetchone()
+        has_rollups = self.conn.execute("SELECT 1 FROM prize_rollups LIMIT 1").fetchone()
+        has_draws = self.conn.execute("SELECT 1 FROM draws LIMIT 1").fetchone()
+        if has_draws and not has_stats:
+            self.conn.execute(
+                "INSERT INTO prize_stats (prize_name, count, first_seen, last_seen) "
+                "SELECT prize_name, COUNT(*), MIN(timestamp), MAX(timestamp) FROM draws GROUP BY prize_name")
+        if has_draws and not has_rollups:
+            for granularity, width in ROLLUP_GRANULARITIES.items():
+                self.conn.execute(
+                    "INSERT INTO prize_rollups (granularity, bucket, prize_name, count) "
+                    "SELECT ?, substr(timestamp, 1, ?), prize_name, COUNT(*) FROM draws "
+                    "GROUP BY substr(timestamp, 1, ?), prize_name",
+                    (granularity, width, width))
+
+    def _storage_exists(self):
+        """数据库在打开前是否已经存在"""
+        return self._existed
+
+    def _record_to_row(self, record):
+        """记录 -> 数据库行"""
+        prize = record['prize']
+        return (record['timestamp'], prize['name'], prize.get('weight'),
+                prize.get('image', ''), record.get('index'), record.get('sequence'),
+                record.get('catalog_version'))
+
+    def _row_to_record(self, row):
+        """数据库行 -> 记录（与 JSON 存储的记录结构一致）"""
+        record = {
+            'id': row[0],
+            'prize': {
+                'name': row[2],
+                'weight': row[3],
+                'image': row[4]
+            },
+            'timestamp': row[1],
+            'index': row[5]
+        }
+        if row[6] is not None:
+            record['sequence'] = row[6]
+        if row[7] is not None:
+            record['catalog_version'] = row[7]
+        return record
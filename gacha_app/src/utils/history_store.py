@@ -0,0 +1,61 @@
+import inspect
+import os
+
+from .history import History
+from .history_log import LogHistory
+from .history_sqlite import SqliteHistory
+from .history_segments import SegmentedHistory
+from .history_binary import BinaryHistory
+from .history_shards import ShardedHistory, SHARD_PATTERN
+
+# 历史记录存储方式 -> (类, 文件名)
+HISTORY_STORAGES = {
+    'json': (History, 'history.json'),
+    'jsonl': (LogHistory, 'history.jsonl'),
+    'sqlite': (SqliteHistory, 'history.db'),
+    'segments': (SegmentedHistory, 'history'),
+    'binary': (BinaryHistory, 'history.bin'),
+    'shards': (ShardedHistory, 'history_shards'),
+}
+
+DEFAULT_HISTORY_STORAGE = 'json'
+
+def supported_options(history_class, options):
+    """从 options 中挑出 history_class 构造函数接受的参数，其余的提示后忽略"""
+    if not options:
+        return {}
+    accepted = inspect.signature(history_class.__init__).parameters
+    unknown = [key for key in options if key not in accepted or key in ('self', 'history_path')]
+    if unknown:
+        print(f"{history_class.__name__} 不支持以下历史记录参数，已忽略: {', '.join(unknown)}")
+    return {key: value for key, value in options.items() if key not in unknown}
+
+def open_history(config_dir, storage=DEFAULT_HISTORY_STORAGE, options=None):
+    """按存储方式创建历史记录对象
+    
+    options 为传给存储类的额外参数（如分段存储的 compression、retention_days），
+    该存储方式不支持的参数会被忽略并给出提示。
+    使用新的存储方式时，会自动从旧的 history.json 做一次迁移。
+    """
+    if storage not in HISTORY_STORAGES:
+        print(f"未知的历史记录存储方式: {storage}，使用 {DEFAULT_HISTORY_STORAGE}")
+        storage = DEFAULT_HISTORY_STORAGE
+        
+    history_class, filename = HISTORY_STORAGES[storage]
+    history = history_class(os.path.join(config_dir, filename),
+                            **supported_options(history_class, options))
+    
+    history.migrate_from_json(os.path.join(config_dir, 'history.json'))
+    return history
+
+def open_history_path(path):
+    """按文件后缀打开一个已有的历史记录（目录为分片或分段存储），不做迁移"""
+    if os.path.isdir(path):
+        if any(SHARD_PATTERN.match(filename) for filename in os.listdir(path)):
+            return ShardedHistory(path)
+        return SegmentedHistory(path)
+    suffix = os.path.splitext(path)[1]
+    for history_class, filename in HISTORY_STORAGES.values():
+        if os.path.splitext(filename)[1] == suffix and suffix:
+            return history_class(path)
+    raise ValueError(f"无法识别的历史记录文件: {path}")
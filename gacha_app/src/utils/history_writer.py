@@ -0,0 +1,174 @@
+import queue
+import threading
+import time
+
+# 队列中的控制消息
+_STOP = object()
+
+class HistoryWriter:
+    """后台历史记录写入线程
+
+    抽奖结果先放入队列，由后台线程按数量或时间分组后一次写入 History，
+    界面线程不会因为磁盘写入而卡住。退出前调用 close() 把队列中的记录写完
+    （程序入口用 atexit 注册一次）。
+    一次提交的多条记录（如十连抽）作为整体入队，总是在同一次写入中提交；
+    写入失败的记录保留在后台线程中，每隔 retry_interval 秒重试，失败信息见 get_metrics()。
+    """
+    def __init__(self, history, batch_size=50, flush_interval=1.0, retry_interval=2.0):
+        self.history = history
+        self.batch_size = batch_size  # 攒够多少条立即写入
+        self.flush_interval = flush_interval  # 最早的一条最多等待多少秒
+        self.retry_interval = retry_interval  # 写入失败后多少秒重试
+
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.closed = False
+
+        # 统计指标
+        self.pending = 0  # 已提交但尚未写入的记录数
+        self.committed_records = 0
+        self.commit_count = 0
+        self.failed_commits = 0
+        self.last_error = None  # 最近一次写入失败的原因，写入成功后清除
+        self.last_commit_ms = 0.0
+        self.last_commit_time = None
+
+        self.thread = threading.Thread(target=self._run, name='HistoryWriter', daemon=True)
+        self.thread.start()
+
+    def submit(self, prize_data):
+        """提交一条抽奖结果"""
+        self.submit_many([prize_data])
+
+    def submit_many(self, prize_data_list):
+        """提交一批抽奖结果（如十连抽）"""
+        if not prize_data_list:
+            return
+        batch = list(prize_data_list)
+        with self.lock:
+            # 与 close() 在同一把锁下判断和入队，关闭后提交的记录不会排在停止消息之后
+            closed = self.closed
+            if not closed:
+                self.pending += len(batch)
+                self.queue.put(batch)
+        if closed:
+            # 已关闭时直接同步写入，保证记录不丢失
+            self.history.add_records(batch)
+
+    def flush(self, timeout=None):
+        """等待队列中已有的记录全部写入，返回是否在超时前全部写入成功"""
+        if self.closed or not self.thread.is_alive():
+            return self.backlog() == 0
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout) and self.backlog() == 0
+
+    def close(self, timeout=5.0):
+        """写完剩余记录并停止后台线程
+        
+        后台线程在 timeout 秒内没有结束时（如正在进行很慢的写入），
+        队列中剩下的记录由调用线程直接同步写入，不会随守护线程一起丢失。
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.queue.put(_STOP)
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            self._write_remaining()
+
+    def _write_remaining(self):
+        """取出队列中尚未被后台线程取走的记录，同步写入"""
+        batch = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, list):
+                batch.extend(item)
+            elif isinstance(item, threading.Event):
+                item.set()
+        if batch and not self._commit(batch):
+            print(f"关闭时仍有 {len(batch)} 条历史记录未能写入")
+        # 停止消息也被取出了，放回去让后台线程写完手上的记录后退出
+        self.queue.put(_STOP)
+
+    def backlog(self):
+        """尚未写入的记录数"""
+        with self.lock:
+            return self.pending
+
+    def get_metrics(self):
+        """获取写入指标"""
+        with self.lock:
+            return {
+                'backlog': self.pending,
+                'committed_records': self.committed_records,
+                'commit_count': self.commit_count,
+                'failed_commits': self.failed_commits,
+                'last_error': self.last_error,
+                'last_commit_ms': self.last_commit_ms,
+                'last_commit_time': self.last_commit_time,
+            }
+
+    def _run(self):
+        """后台线程：分组收集记录并写入"""
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                if not self._commit(batch):
+                    print(f"停止时仍有 {len(batch)} 条历史记录未能写入")
+                return
+            if isinstance(item, threading.Event):
+                if self._commit(batch):
+                    batch, deadline = [], None
+                else:
+                    deadline = time.monotonic() + self.retry_interval
+                item.set()
+                continue
+            if item is not None:
+                batch.extend(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                if self._commit(batch):
+                    batch, deadline = [], None
+                else:
+                    # 写入失败的记录留在批次中，稍后与新记录一起重试
+                    deadline = time.monotonic() + self.retry_interval
+
+    def _commit(self, batch):
+        """把一组记录写入 History，返回是否成功（失败时记录仍计入 backlog）"""
+        if not batch:
+            return True
+        start = time.perf_counter()
+        error = None
+        try:
+            ok = self.history.add_records(batch)
+        except Exception as e:
+            print(f"后台写入历史记录失败: {e}")
+            ok, error = False, str(e)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        with self.lock:
+            self.last_commit_ms = elapsed_ms
+            self.last_commit_time = time.time()
+            if ok:
+                self.pending -= len(batch)
+                self.committed_records += len(batch)
+                self.commit_count += 1
+                self.last_error = None
+            else:
+                self.failed_commits += 1
+                self.last_error = error or "写入历史记录失败"
+        return bool(ok)
@@ -5,6 +5,7 @@
 直接运行此文件即可启动扭蛋机应用
 """
 
+import atexit
 import tkinter as tk
 import os
 import sys
@@ -18,7 +19,8 @@ from gacha_app.src.ui.main_window import MainWindow
 from gacha_app.src.core.gacha_engine import GachaEngine
 from gacha_app.src.core.prize_manager import PrizeManager
 from gacha_app.src.utils.config import Config
-from gacha_app.src.utils.history import History
+from gacha_app.src.utils.config_store import ConfigStore
+from gacha_app.src.utils.history_store import open_history, DEFAULT_HISTORY_STORAGE
 
 def main():
     # 设置配置文件路径
@@ -26,14 +28,18 @@ def main():
     os.makedirs(config_dir, exist_ok=True)
     
     config_path = os.path.join(config_dir, 'config.json')
-    history_path = os.path.join(config_dir, 'history.json')
     
-    # 初始化配置和历史记录
-    config = Config(config_path)
-    history = History(history_path)
+    # 初始化配置和历史记录（config.json 只解析一次，各处共用）
+    store = ConfigStore(config_path)
+    atexit.register(store.flush)
+    config = Config(config_path, store)
+    app_config = config.load()
+    history = open_history(config_dir,
+                           app_config.get('history_storage', DEFAULT_HISTORY_STORAGE),
+                           app_config.get('history_options'))
     
     # 初始化奖品管理器
-    prize_manager = PrizeManager(config_path)
+    prize_manager = PrizeManager(config_path, store=store)
     
     # 初始化抽奖引擎
     gacha_engine = GachaEngine(prize_manager)
@@ -41,6 +47,8 @@ def main():
     # 创建主窗口
     root = tk.Tk()
     app = MainWindow(root, gacha_engine, prize_manager, config, history)
+    # 异常退出时也把队列中的历史记录写完（先注册的后执行，配置在历史记录之后写入）
+    atexit.register(app.history_writer.close)
     
     # 启动应用
     root.mainloop()
@@ -6,7 +6,8 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     install_requires=[
-        'Pillow>=9.0.0'
+        'Pillow>=9.0.0',
+        'numpy>=1.17.0'
     ],
     entry_points={
         'console_scripts': [
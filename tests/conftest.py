@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# 测试直接从仓库根目录导入 gacha_app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_draw(name, timestamp, index=0, weight=1, **extra):
+    """构造一条 add_records 接受的抽奖结果"""
+    prize = {'name': name, 'weight': weight, 'image': ''}
+    prize.update(extra)
+    return {'prize': prize, 'index': index, 'timestamp': timestamp}
+
+@pytest.fixture
+def draws():
+    """跨三天、三个奖品的抽奖结果（按时间顺序）"""
+    names = ['一等奖', '二等奖', '三等奖']
+    return [make_draw(names[i % 3], f'2024-01-0{1 + i // 4}T{10 + i % 4:02d}:00:00', i % 3)
+            for i in range(12)]
@@ -0,0 +1,86 @@
+import json
+import threading
+
+import pytest
+
+from gacha_app.src.core.prize_manager import PrizeManager
+from gacha_app.src.core.rng import CounterRNG
+
+THREADS = 8
+DRAWS = 2000
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'prizes': [
+        {'name': f'p{i}', 'weight': i + 1, 'image': ''} for i in range(20)
+    ]}), encoding='utf-8')
+    return str(path)
+
+def run_threads(target):
+    threads = [threading.Thread(target=target, args=(n,)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def test_counter_rng_hands_out_each_sequence_once():
+    rng = CounterRNG(3)
+    values = [[] for _ in range(THREADS)]
+    run_threads(lambda n: values[n].extend(rng.random() for _ in range(DRAWS)))
+    assert rng.counter == THREADS * DRAWS
+    assert sorted(v for chunk in values for v in chunk) == \
+        sorted(rng.random_at(i) for i in range(THREADS * DRAWS))
+
+def test_concurrent_draws_use_unique_sequences(config_path):
+    manager = PrizeManager(config_path)
+    start = manager.rng.counter
+    results = [[] for _ in range(THREADS)]
+
+    def draw(n):
+        for i in range(DRAWS // 10):
+            results[n].append(manager.draw())
+            results[n].extend(manager.draw_many(9))
+    run_threads(draw)
+
+    results = [result for chunk in results for result in chunk]
+    sequences = sorted(result['sequence'] for result in results)
+    assert sequences == list(range(start, start + THREADS * DRAWS))
+    assert all(manager.replay_record(result) == (result['index'], True) for result in results)
+
+    # 预留的序号在所有已发出的序号之后，重启后不会重复
+    manager.store.flush()
+    restarted = PrizeManager(config_path)
+    assert restarted.draw()['sequence'] >= sequences[-1] + 1
+
+def test_draws_during_edits_use_consistent_snapshots(config_path):
+    manager = PrizeManager(config_path)
+    snapshots = {manager.snapshot().revision: manager.snapshot()}
+    results = [[] for _ in range(4)]
+    stopped = threading.Event()
+
+    def draw(n):
+        while not stopped.is_set():
+            results[n].append(manager.draw())
+
+    threads = [threading.Thread(target=draw, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for i in range(200):
+        if i % 2:
+            manager.remove_prize(len(manager.catalog) - 1)
+        else:
+            manager.add_prize(f'q{i}', 5, '')
+        snapshots[manager.snapshot().revision] = manager.snapshot()
+        manager.update_prize(i % 10, f'r{i}', i % 7 + 1, '')
+        snapshots[manager.snapshot().revision] = manager.snapshot()
+    stopped.set()
+    for thread in threads:
+        thread.join()
+
+    # 每个结果的奖品都与抽奖时所用快照中该索引的奖品一致
+    results = [result for chunk in results for result in chunk]
+    assert results
+    for result in results:
+        catalog = snapshots[result['catalog_version']].catalog
+        assert catalog[result['index']] == result['prize']
@@ -0,0 +1,114 @@
+import json
+import os
+import time
+
+import pytest
+
+from gacha_app.src.utils import config_store
+from gacha_app.src.utils.config import Config
+from gacha_app.src.utils.config_store import ConfigStore
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'max_prizes': 100, 'theme': 'light',
+                                'settings': {'sound_enabled': True}}), encoding='utf-8')
+    return str(path)
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_parsed_once_and_shared(config_path, monkeypatch):
+    parses = []
+    load = json.load
+    monkeypatch.setattr(config_store.json, 'load', lambda f: parses.append(1) or load(f))
+    store = ConfigStore(config_path)
+    config = Config(config_path, store).load()
+    assert config['theme'] == 'light'
+    assert store.get('max_prizes') == 100 and store.load() is store.load()
+    assert len(parses) == 1
+
+def test_debounced_save(config_path):
+    store = ConfigStore(config_path, save_delay=0.2)
+    saves = []
+    store.add_save_listener(saves.append)
+    store.set('theme', 'dark')
+    store.set('max_prizes', 200)
+    store.set('theme', 'blue')
+    # 延迟期间不写文件
+    assert read(config_path)['theme'] == 'light' and store.is_dirty()
+    wait_for(lambda: saves)
+    time.sleep(0.3)
+    assert saves == [config_path]
+    assert read(config_path) == {'max_prizes': 200, 'theme': 'blue',
+                                 'settings': {'sound_enabled': True}}
+    assert not store.is_dirty()
+
+def test_update_marks_only_changed_keys(config_path):
+    store = ConfigStore(config_path, save_delay=60)
+    store.update({'max_prizes': 100, 'theme': 'light'})
+    assert not store.is_dirty()
+    store.update({'max_prizes': 100, 'theme': 'dark'})
+    assert store._dirty == {'theme'}
+    assert store.flush()
+
+def test_flush_replaces_atomically(config_path, monkeypatch):
+    store = ConfigStore(config_path, save_delay=60)
+    store.set('theme', 'dark')
+
+    def fail(src, dst):
+        raise OSError("磁盘已满")
+    monkeypatch.setattr(config_store.os, 'replace', fail)
+    assert not store.flush()
+    # 写入失败时原文件不变，修改仍等待写入
+    assert read(config_path)['theme'] == 'light'
+    assert store.is_dirty()
+
+    monkeypatch.undo()
+    assert store.flush()
+    assert read(config_path)['theme'] == 'dark'
+    assert os.listdir(os.path.dirname(config_path)) == ['config.json']
+
+def test_flush_merges_dirty_keys_into_external_edit(config_path):
+    store = ConfigStore(config_path, save_delay=60)
+    store.load()
+    store.set('theme', 'dark')
+    store.pop('max_prizes')
+
+    # 其他程序修改了文件：改了没有被本程序修改的配置项，也改了本程序修改的配置项
+    external = read(config_path)
+    external['settings'] = {'sound_enabled': False}
+    external['theme'] = 'green'
+    external['language'] = 'en'
+    time.sleep(0.01)
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(external, f)
+    assert store.changed_on_disk()
+
+    assert store.flush()
+    assert read(config_path) == {'theme': 'dark', 'settings': {'sound_enabled': False},
+                                 'language': 'en'}
+    assert store.get('language') == 'en'
+
+def test_clean_flush_does_not_write(config_path):
+    store = ConfigStore(config_path)
+    saves = []
+    store.add_save_listener(saves.append)
+    store.load()
+    assert store.flush()
+    assert saves == []
+
+def test_missing_file(tmp_path):
+    path = str(tmp_path / 'sub' / 'config.json')
+    store = ConfigStore(path, save_delay=60)
+    assert store.load() == {} and not store.exists()
+    store.set('theme', 'dark')
+    assert store.flush()
+    assert read(path) == {'theme': 'dark'}
@@ -0,0 +1,140 @@
+import os
+
+import pytest
+
+from gacha_app.src.utils.history import History
+from gacha_app.src.utils.history_store import HISTORY_STORAGES, open_history
+
+from conftest import make_draw
+
+STORAGES = sorted(HISTORY_STORAGES)
+
+@pytest.fixture(params=STORAGES)
+def history(request, tmp_path):
+    history = open_history(str(tmp_path), request.param)
+    yield history
+    if hasattr(history, 'close'):
+        history.close()
+
+def key(record):
+    return record['id'], record['prize']['name'], record['timestamp']
+
+def content(record):
+    """记录内容（分片存储迁移后按分片重新编号，不比较编号）"""
+    return record['prize']['name'], record['timestamp'], record['index']
+
+def assert_counts_consistent(history):
+    """统计、按奖品计数和按日汇总都与实际记录一致"""
+    records = history.get_all_records()
+    by_prize = {}
+    by_day = {}
+    for record in records:
+        name = record['prize']['name']
+        by_prize[name] = by_prize.get(name, 0) + 1
+        day = by_day.setdefault(record['timestamp'][:10], {})
+        day[name] = day.get(name, 0) + 1
+    stats = history.get_statistics()
+    assert {name: data['count'] for name, data in stats.items() if data['count']} == by_prize
+    assert {name: count for name, count in history.count_by_prize().items() if count} == by_prize
+    daily = {bucket: {name: count for name, count in counts.items() if count}
+             for bucket, counts in history.get_rollups('daily').items()}
+    assert {bucket: counts for bucket, counts in daily.items() if counts} == by_day
+    hourly_total = sum(sum(counts.values()) for counts in history.get_rollups('hourly').values())
+    assert hourly_total == len(records)
+    for name, data in stats.items():
+        if data['count']:
+            timestamps = [r['timestamp'] for r in records if r['prize']['name'] == name]
+            assert data['first_seen'] == min(timestamps)
+            assert data['last_seen'] == max(timestamps)
+
+def test_add_and_read(history, draws):
+    assert history.add_records(draws[:10])
+    assert history.add_record(draws[10])
+    assert history.add_records(draws[11:])
+    records = history.get_all_records()
+    assert [r['timestamp'] for r in records] == [d['timestamp'] for d in draws]
+    assert len({r['id'] for r in records}) == len(draws)
+    assert history.count() == len(draws)
+    assert_counts_consistent(history)
+
+def test_replay_fields_round_trip(history, draws):
+    draw = dict(draws[0], sequence=7, catalog_version=12345)
+    history.add_records([draw, draws[1]])
+    first, second = history.get_all_records()
+    assert first['sequence'] == 7 and first['catalog_version'] == 12345
+    assert 'sequence' not in second and 'catalog_version' not in second
+
+def test_page(history, draws):
+    history.add_records(draws)
+    newest = list(reversed(history.get_all_records()))
+    assert list(map(key, history.page(0, 5))) == list(map(key, newest[:5]))
+    assert list(map(key, history.page(5, 5))) == list(map(key, newest[5:10]))
+    assert list(map(key, history.page(10, 5))) == list(map(key, newest[10:]))
+    assert history.page(0, 3, newest_first=False) == history.get_all_records()[:3]
+    assert history.page(20, 5) == []
+
+def test_filter(history, draws):
+    history.add_records(draws)
+    records = history.get_all_records()
+    since, until = '2024-01-01T12:00:00', '2024-01-03T11:00:00'
+    expected = [r for r in records if since <= r['timestamp'] < until]
+    assert list(map(key, history.iter_records(since=since, until=until))) == \
+        list(map(key, expected))
+    expected = [r for r in records if r['prize']['name'] == '二等奖']
+    assert list(map(key, history.iter_records(prize='二等奖'))) == list(map(key, expected))
+    assert list(map(key, history.page(0, 2, prize='二等奖'))) == \
+        list(map(key, expected[::-1][:2]))
+    assert list(history.iter_records(prize='不存在')) == []
+    counts = history.count_by_prize_between(since, until)
+    assert sum(counts.values()) == len([r for r in records if since <= r['timestamp'] < until])
+
+def test_delete_and_compact(history, draws):
+    history.add_records(draws)
+    records = [dict(record) for record in history.get_all_records()]
+    deleted = [records[0]['id'], records[5]['id'], records[-1]['id']]
+    for record_id in deleted:
+        assert history.delete(record_id)
+    assert not history.delete(deleted[0])
+    remaining = [key(r) for r in records if r['id'] not in deleted]
+    assert list(map(key, history.get_all_records())) == remaining
+    assert_counts_consistent(history)
+
+    assert history.compact()
+    assert list(map(key, history.get_all_records())) == remaining
+    assert_counts_consistent(history)
+
+    # 编号不会重复使用
+    history.add_records([make_draw('一等奖', '2024-01-04T10:00:00')])
+    new_id = history.get_all_records()[-1]['id']
+    assert new_id not in {r['id'] for r in records}
+
+def test_reopen(history, draws, tmp_path):
+    history.add_records(draws)
+    history.delete(history.get_all_records()[3]['id'])
+    expected = list(map(key, history.get_all_records()))
+    storage = next(name for name, (cls, _) in HISTORY_STORAGES.items() if type(history) is cls)
+    if hasattr(history, 'close'):
+        history.close()
+    reopened = open_history(str(tmp_path), storage)
+    assert list(map(key, reopened.get_all_records())) == expected
+    assert_counts_consistent(reopened)
+
+@pytest.mark.parametrize('storage', [name for name in STORAGES if name != 'json'])
+def test_migrate_from_json(tmp_path, draws, storage):
+    legacy = History(str(tmp_path / 'history.json'))
+    legacy.add_records(draws)
+    legacy.delete(legacy.get_all_records()[2]['id'])
+    expected = list(map(content, legacy.get_all_records()))
+
+    history = open_history(str(tmp_path), storage)
+    records = history.get_all_records()
+    assert list(map(content, records)) == expected
+    assert len({record['id'] for record in records}) == len(records)
+    assert_counts_consistent(history)
+    # 只迁移一次：再次打开时不会重复导入
+    history.add_records([make_draw('三等奖', '2024-01-05T10:00:00')])
+    if hasattr(history, 'close'):
+        history.close()
+    reopened = open_history(str(tmp_path), storage)
+    assert len(reopened.get_all_records()) == len(expected) + 1
+    assert os.path.exists(tmp_path / 'history.json')
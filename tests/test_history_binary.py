@@ -0,0 +1,59 @@
+import json
+
+from gacha_app.src.utils.history_binary import BinaryHistory
+
+def write_json(path, draws, next_id=0):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'draws': draws, 'next_id': next_id}, f, ensure_ascii=False)
+
+def test_json_round_trip(tmp_path):
+    """JSON 导入后再导出，记录顺序、附加字段和序号都不变"""
+    draws = [
+        {'id': 5, 'prize': {'name': '一等奖', 'weight': 10, 'image': 'a.png', 'rare': True},
+         'timestamp': '2024-01-02T10:00:00', 'index': 0, 'sequence': 17, 'catalog_version': 4000000000},
+        {'id': 2, 'prize': {'name': '二等奖', 'weight': 2.5, 'image': ''},
+         'timestamp': '2024-01-01T10:00:00.123456', 'index': 1},
+        {'id': 9, 'prize': {'name': '三等奖', 'weight': 60, 'image': '', 'note': '限定'},
+         'timestamp': '2024-01-03T10:00:00', 'index': 2, 'sequence': 0},
+    ]
+    json_path = str(tmp_path / 'history.json')
+    write_json(json_path, draws, next_id=12)
+
+    history = BinaryHistory(str(tmp_path / 'history.bin'))
+    assert history.import_json(json_path)
+    assert history.get_all_records() == draws
+
+    export_path = str(tmp_path / 'export.json')
+    assert history.export_json(export_path)
+    with open(export_path, encoding='utf-8') as f:
+        exported = json.load(f)
+    assert exported['draws'] == draws
+    assert exported['next_id'] == 12
+
+    reopened = BinaryHistory(str(tmp_path / 'history.bin'))
+    assert reopened.get_all_records() == draws
+
+def test_import_renumbers_duplicate_and_missing_ids(tmp_path):
+    draws = [
+        {'id': 3, 'prize': {'name': 'A', 'weight': 1, 'image': '', 'tag': 'x'},
+         'timestamp': '2024-01-01T10:00:00', 'index': 0},
+        {'id': 3, 'prize': {'name': 'B', 'weight': 1, 'image': '', 'tag': 'y'},
+         'timestamp': '2024-01-01T11:00:00', 'index': 1},
+        {'prize': {'name': 'C', 'weight': 1, 'image': ''},
+         'timestamp': '2024-01-01T12:00:00', 'index': 2},
+    ]
+    json_path = str(tmp_path / 'history.json')
+    write_json(json_path, draws)
+
+    history = BinaryHistory(str(tmp_path / 'history.bin'))
+    assert history.import_json(json_path)
+    records = history.get_all_records()
+    assert [r['prize'] for r in records] == [d['prize'] for d in draws]
+    ids = [r['id'] for r in records]
+    assert ids[0] == 3 and len(set(ids)) == 3
+
+    # 按编号删除只删除那一条，附加字段仍跟随各自的记录
+    assert history.delete(ids[1])
+    assert [r['prize'].get('tag') for r in history.get_all_records()] == ['x', None]
+    assert history.compact()
+    assert [r['prize'].get('tag') for r in history.get_all_records()] == ['x', None]
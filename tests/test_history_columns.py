@@ -0,0 +1,64 @@
+import json
+
+from gacha_app.src.utils import history as history_module
+from gacha_app.src.utils.history import History
+from gacha_app.src.utils.history_columns import HistoryColumns
+
+RECORDS = [
+    {'id': 0, 'prize': {'name': '一等奖', 'weight': 10, 'image': 'a.png'},
+     'timestamp': '2024-01-01T10:00:00', 'index': 0},
+    {'id': 1, 'prize': {'name': '二等奖', 'weight': 30, 'image': ''},
+     'timestamp': '2024-01-01T10:00:00.250000', 'index': 1, 'sequence': 42, 'catalog_version': 7},
+    {'prize': {'name': '三等奖', 'weight': 60, 'image': ''}, 'timestamp': '2024-01-01T11:00:00'},
+    {'id': 3, 'prize': {'name': '三等奖', 'weight': 60, 'image': ''},
+     'timestamp': '2024-01-01T12:00:00', 'index': None},
+    {'id': 4, 'prize': {'name': '旧奖品'}, 'timestamp': '2024-01-02T09:00:00+08:00', 'index': 2},
+    {'id': 5, 'prize': {'name': '一等奖', 'weight': 10, 'image': 'a.png', 'color': '#fff'},
+     'timestamp': '2024-01-02T10:00:00', 'index': 0, 'note': '补录'},
+]
+
+def test_records_round_trip():
+    columns = HistoryColumns(RECORDS)
+    assert list(columns.records) == RECORDS
+    assert columns.raw_timestamps == 1
+
+def test_remove_row_keeps_extras_aligned():
+    columns = HistoryColumns(RECORDS)
+    columns.remove_row(1)
+    assert list(columns.records) == RECORDS[:1] + RECORDS[2:]
+    columns.remove_row(3)
+    assert list(columns.records) == RECORDS[:1] + RECORDS[2:4] + RECORDS[5:]
+    assert columns.raw_timestamps == 0
+
+def test_json_history_keeps_record_shape(tmp_path):
+    path = tmp_path / 'history.json'
+    path.write_text(json.dumps({'draws': RECORDS, 'statistics': {}}), encoding='utf-8')
+    history = History(str(path))
+    history.add_records([{'prize': {'name': '一等奖', 'weight': 10, 'image': ''},
+                          'timestamp': '2024-01-03T10:00:00', 'index': 0}])
+    with open(path, encoding='utf-8') as f:
+        draws = json.load(f)['draws']
+    assert [{key: value for key, value in record.items() if key != 'id'} for record in draws[:-1]] == \
+        [{key: value for key, value in record.items() if key != 'id'} for record in RECORDS]
+    assert 'index' not in draws[2]
+
+def test_iteration_survives_deletes(tmp_path, draws, monkeypatch):
+    monkeypatch.setattr(history_module, 'ITER_CHUNK_SIZE', 2)
+    history = History(str(tmp_path / 'history.json'))
+    history.add_records(draws)
+    records = [dict(record) for record in history.get_all_records()]
+
+    for newest_first in (False, True):
+        expected = records[::-1] if newest_first else list(records)
+        iterator = history.iter_records(newest_first=newest_first)
+        seen = [next(iterator), next(iterator)]
+        # 迭代期间删除还没有读到的记录和已经读到的记录，剩下的行号前移
+        deleted = {expected[0]['id'], expected[4]['id'], expected[7]['id']}
+        for record_id in deleted:
+            history.delete(record_id)
+        history.add_records([draws[0]])
+        seen += list(iterator)
+        assert [r['id'] for r in seen] == \
+            [r['id'] for r in expected[:2]] + [r['id'] for r in expected[2:] if r['id'] not in deleted]
+        records = [r for r in records if r['id'] not in deleted]
+        records.append(dict(history.get_all_records()[-1]))
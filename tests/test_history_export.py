@@ -0,0 +1,99 @@
+import csv
+import json
+import os
+
+import pytest
+
+from gacha_app.src.utils.history import History
+from gacha_app.src.utils.history_export import ExportCancelled, export_history, main
+from gacha_app.src.utils.history_log import LogHistory
+
+@pytest.fixture
+def history(tmp_path, draws):
+    history = LogHistory(str(tmp_path / 'history.jsonl'))
+    history.add_records(draws)
+    return history
+
+def read_csv(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        return list(csv.DictReader(f))
+
+def test_csv_export(history, tmp_path):
+    output = str(tmp_path / 'out.csv')
+    progress = []
+    exported = export_history(history, output, 'csv', chunk_size=5,
+                              progress=lambda done, total: progress.append((done, total)))
+    records = history.get_all_records()
+    assert exported == len(records)
+    assert progress == [(5, 12), (10, 12), (12, 12)]
+    rows = read_csv(output)
+    assert [row['id'] for row in rows] == [str(record['id']) for record in records]
+    assert [(row['timestamp'], row['prize_name'], row['index']) for row in rows] == \
+        [(r['timestamp'], r['prize']['name'], str(r['index'])) for r in records]
+    assert all(row['sequence'] == '' for row in rows)
+
+def test_jsonl_export_with_filters(history, tmp_path):
+    output = str(tmp_path / 'out.jsonl')
+    since, until = '2024-01-01T12:00:00', '2024-01-03T11:00:00'
+    exported = export_history(history, output, 'jsonl', chunk_size=2,
+                              since=since, until=until, prize='二等奖')
+    expected = [r for r in history.get_all_records()
+                if since <= r['timestamp'] < until and r['prize']['name'] == '二等奖']
+    with open(output, encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == expected
+    assert exported == len(expected)
+
+def test_export_reads_lazily(history, tmp_path):
+    """每批只从迭代器中取出 chunk_size 条"""
+    taken = []
+    records = history.iter_records
+
+    def iter_records(**filters):
+        for record in records(**filters):
+            taken.append(record['id'])
+            yield record
+    history.iter_records = iter_records
+    progress = []
+    export_history(history, str(tmp_path / 'out.csv'), chunk_size=4,
+                   progress=lambda done, total: progress.append(len(taken)))
+    assert progress == [4, 8, 12]
+
+def test_cancel_leaves_no_file(history, tmp_path):
+    output = str(tmp_path / 'out.csv')
+    with pytest.raises(ExportCancelled):
+        export_history(history, output, chunk_size=5, cancel=lambda: True)
+    assert os.listdir(tmp_path) == ['history.jsonl']
+
+def test_unknown_format(history, tmp_path):
+    with pytest.raises(ValueError):
+        export_history(history, str(tmp_path / 'out.xml'), 'xml')
+
+def test_cli_exports_configured_storage(tmp_path, draws):
+    config_dir = tmp_path / 'config'
+    config_dir.mkdir()
+    (config_dir / 'config.json').write_text(json.dumps({'history_storage': 'jsonl'}), encoding='utf-8')
+    LogHistory(str(config_dir / 'history.jsonl')).add_records(draws)
+    output = str(tmp_path / 'out.csv')
+    assert main([output, '--config-dir', str(config_dir), '--prize', '一等奖']) == 0
+    assert len(read_csv(output)) == 4
+
+def test_cli_does_not_migrate_or_create(tmp_path, draws):
+    config_dir = tmp_path / 'config'
+    config_dir.mkdir()
+    History(str(config_dir / 'history.json')).add_records(draws)
+    before = sorted(os.listdir(config_dir))
+    output = str(tmp_path / 'out.jsonl')
+    # 配置的存储方式还没有数据：不从 history.json 迁移，也不创建数据库
+    assert main([output, '--config-dir', str(config_dir), '--storage', 'sqlite']) == 1
+    assert sorted(os.listdir(config_dir)) == before
+    assert main([output, '--config-dir', str(config_dir)]) == 0
+    assert sorted(os.listdir(config_dir)) == before
+    with open(output, encoding='utf-8') as f:
+        assert len(f.readlines()) == len(draws)
+
+def test_cli_history_path(tmp_path, draws):
+    path = tmp_path / 'kiosk.jsonl'
+    LogHistory(str(path)).add_records(draws)
+    output = str(tmp_path / 'out.csv')
+    assert main([output, '--history', str(path), '--since', '2024-01-03']) == 0
+    assert len(read_csv(output)) == 4
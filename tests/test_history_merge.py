@@ -0,0 +1,49 @@
+import json
+
+from gacha_app.src.utils.history import History
+from gacha_app.src.utils.history_merge import merge_histories, merge_records
+
+def record(record_id, name, timestamp):
+    return {'id': record_id, 'prize': {'name': name, 'weight': 1, 'image': ''},
+            'timestamp': timestamp, 'index': 0}
+
+def test_merge_orders_by_timestamp_and_renumbers():
+    a = [record(0, 'A', '2024-01-01T10:00:00'), record(1, 'B', '2024-01-01T12:00:00')]
+    b = [record(0, 'C', '2024-01-01T11:00:00'), record(1, 'D', '2024-01-01T13:00:00')]
+    stats = {}
+    merged = list(merge_records([('a', a), ('b', b)], stats))
+    assert [r['prize']['name'] for r in merged] == ['A', 'C', 'B', 'D']
+    assert [r['id'] for r in merged] == [0, 1, 2, 3]
+    assert [r['source'] for r in merged] == [
+        {'machine': 'a', 'id': 0}, {'machine': 'b', 'id': 0},
+        {'machine': 'a', 'id': 1}, {'machine': 'b', 'id': 1}]
+    assert {name: data['count'] for name, data in stats.items()} == \
+        {'A': 1, 'B': 1, 'C': 1, 'D': 1}
+
+def test_merge_drops_duplicates():
+    """同一台机器的记录出现在多个来源中只保留一条；时间戳相同的不同记录都保留"""
+    a = [record(0, 'A', '2024-01-01T10:00:00'), record(1, 'B', '2024-01-01T10:00:00')]
+    copy_of_a = [record(1, 'B', '2024-01-01T10:00:00')]
+    b = [record(1, 'B', '2024-01-01T10:00:00')]
+    merged = list(merge_records([('a', a), ('a', copy_of_a), ('b', b)]))
+    assert [(r['source']['machine'], r['source']['id']) for r in merged] == \
+        [('a', 0), ('a', 1), ('b', 1)]
+
+def test_merging_a_merged_file_again_is_idempotent(tmp_path, draws):
+    first = History(str(tmp_path / 'a.json'))
+    first.add_records(draws[:6])
+    second = History(str(tmp_path / 'b.json'))
+    second.add_records(draws[6:])
+    merged_path = str(tmp_path / 'merged.json')
+    assert merge_histories([('a', first), ('b', second)], merged_path) == len(draws)
+
+    # 已合并的文件与其中一台机器的原文件再次合并，不会产生重复记录
+    merged = History(merged_path)
+    again_path = str(tmp_path / 'again.json')
+    assert merge_histories([('merged', merged), ('a', first)], again_path) == len(draws)
+    with open(again_path, encoding='utf-8') as f:
+        document = json.load(f)
+    assert [r['timestamp'] for r in document['draws']] == [d['timestamp'] for d in draws]
+    assert sum(data['count'] for data in document['statistics'].values()) == len(draws)
+    assert sum(sum(counts.values()) for counts in document['rollups']['daily'].values()) == \
+        len(draws)
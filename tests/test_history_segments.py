@@ -0,0 +1,88 @@
+import json
+import os
+
+import pytest
+
+from gacha_app.src.utils.history_segments import AGGREGATES_FILE, COMPRESSORS, SegmentedHistory
+
+from conftest import make_draw
+
+def key(record):
+    return record['id'], record['prize']['name'], record['timestamp']
+
+def test_maintain_seals_past_days_only(tmp_path, draws):
+    history = SegmentedHistory(str(tmp_path / 'history'))
+    history.add_records(draws)
+    history.maintain(today='2024-01-03')
+    segments = history.list_segments()
+    assert segments['2024-01-01'][0].endswith('.jsonl.gz')
+    assert segments['2024-01-02'][0].endswith('.jsonl.gz')
+    assert segments['2024-01-03'] == [history._raw_path('2024-01-03')]
+
+@pytest.mark.parametrize('compression', sorted(COMPRESSORS))
+def test_sealing_compresses_and_keeps_records(tmp_path, draws, compression):
+    history = SegmentedHistory(str(tmp_path / 'history'), compression=compression)
+    history.add_records(draws)
+    expected = list(map(key, history.get_all_records()))
+    history.maintain(today='2024-01-04')
+
+    suffix = COMPRESSORS[compression][0]
+    for day, paths in history.list_segments().items():
+        assert [os.path.basename(path) for path in paths] == [day + '.jsonl' + suffix]
+        with COMPRESSORS[compression][1](paths[0], 'rt', encoding='utf-8') as f:
+            assert all(json.loads(line)['timestamp'].startswith(day) for line in f)
+    assert list(map(key, history.get_all_records())) == expected
+
+    # 已封存的日期又写入记录时，再次封存追加到同一个压缩文件
+    history.add_records([make_draw('三等奖', '2024-01-01T23:00:00')])
+    history.maintain(today='2024-01-04')
+    assert len(history.list_segments()['2024-01-01']) == 1
+    assert [r['timestamp'] for r in history.iter_records(until='2024-01-02')][-1] == \
+        '2024-01-01T23:00:00'
+
+def test_range_query_across_sealed_segments(tmp_path, draws):
+    history = SegmentedHistory(str(tmp_path / 'history'), compression='xz')
+    history.add_records(draws)
+    records = history.get_all_records()
+    history.maintain(today='2024-01-03')
+
+    since, until = '2024-01-01T12:00:00', '2024-01-03T11:00:00'
+    expected = [r for r in records if since <= r['timestamp'] < until]
+    assert list(map(key, history.iter_records(since=since, until=until))) == \
+        list(map(key, expected))
+    assert list(map(key, history.iter_records(since=since, until=until, newest_first=True))) == \
+        list(map(key, reversed(expected)))
+    assert list(map(key, history.iter_records(since='2024-01-02', until='2024-01-03'))) == \
+        [key(r) for r in records if r['timestamp'].startswith('2024-01-02')]
+
+def test_retention_folds_old_days_into_aggregates(tmp_path, draws):
+    history = SegmentedHistory(str(tmp_path / 'history'), retention_days=1)
+    history.add_records(draws)
+    records = history.get_all_records()
+    stats = history.get_statistics()
+    history.maintain(today='2024-01-03')
+
+    # 2024-01-01 早于保留期，只剩每个奖品的计数
+    assert '2024-01-01' not in history.list_segments()
+    day_one = {}
+    for record in records:
+        if record['timestamp'].startswith('2024-01-01'):
+            name = record['prize']['name']
+            day_one[name] = day_one.get(name, 0) + 1
+    with open(tmp_path / 'history' / AGGREGATES_FILE, encoding='utf-8') as f:
+        assert json.load(f) == {'2024-01-01': day_one}
+    assert list(map(key, history.get_all_records())) == \
+        [key(r) for r in records if not r['timestamp'].startswith('2024-01-01')]
+
+    # 统计和按日汇总仍包含折叠的计数，重新打开后也一样
+    assert history.get_statistics() == stats
+    reopened = SegmentedHistory(str(tmp_path / 'history'), retention_days=1)
+    assert {name: data['count'] for name, data in reopened.get_statistics().items()} == \
+        {name: data['count'] for name, data in stats.items()}
+    assert reopened.get_rollups('daily')['2024-01-01'] == day_one
+    assert sum(reopened.count_by_prize_between('2024-01-01', '2024-01-02').values()) == \
+        sum(day_one.values())
+
+    # 折叠后编号不会重复使用
+    reopened.add_records([make_draw('一等奖', '2024-01-03T20:00:00')])
+    assert reopened.get_all_records()[-1]['id'] not in {r['id'] for r in records}
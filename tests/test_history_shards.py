@@ -0,0 +1,41 @@
+import multiprocessing
+import os
+
+from gacha_app.src.utils.history_shards import SHARD_PATTERN, ShardedHistory
+
+from conftest import make_draw
+
+WRITERS = 3
+BATCHES = 5
+BATCH_SIZE = 10
+
+def write_draws(path, writer, barrier):
+    history = ShardedHistory(path)
+    for batch in range(BATCHES):
+        history.add_records([make_draw(f'机器{writer}', f'2024-01-01T{10 + batch:02d}:{writer:02d}:{i:02d}')
+                             for i in range(BATCH_SIZE)])
+        if batch == 0:
+            # 所有进程都占用了分片后再继续写入
+            barrier.wait(30)
+
+def test_concurrent_writer_processes(tmp_path):
+    path = str(tmp_path / 'history_shards')
+    barrier = multiprocessing.Barrier(WRITERS)
+    processes = [multiprocessing.Process(target=write_draws, args=(path, writer, barrier))
+                 for writer in range(WRITERS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    # 每个写入进程占用自己的分片，读取时按时间合并
+    assert len([f for f in os.listdir(path) if SHARD_PATTERN.match(f)]) == WRITERS
+    history = ShardedHistory(path)
+    records = history.get_all_records()
+    assert len(records) == WRITERS * BATCHES * BATCH_SIZE
+    assert len({record['id'] for record in records}) == len(records)
+    timestamps = [record['timestamp'] for record in records]
+    assert timestamps == sorted(timestamps)
+    assert {name: data['count'] for name, data in history.get_statistics().items()} == \
+        {f'机器{writer}': BATCHES * BATCH_SIZE for writer in range(WRITERS)}
@@ -0,0 +1,111 @@
+import threading
+import time
+
+from gacha_app.src.utils.history_writer import HistoryWriter
+
+from conftest import make_draw
+
+class RecordingHistory:
+    """记录每次 add_records 的批次；前 failures 次写入失败"""
+    def __init__(self, failures=0, block=None):
+        self.batches = []
+        self.failures = failures
+        self.block = block  # 第一次写入前等待的事件
+        self.lock = threading.Lock()
+
+    def add_records(self, batch):
+        if self.block is not None:
+            block, self.block = self.block, None
+            block.wait(5)
+        with self.lock:
+            if self.failures:
+                self.failures -= 1
+                raise OSError("磁盘已满")
+            self.batches.append([draw['timestamp'] for draw in batch])
+        return True
+
+    def records(self):
+        with self.lock:
+            return [timestamp for batch in self.batches for timestamp in batch]
+
+def draws(count, start=0):
+    return [make_draw('一等奖', f'2024-01-01T10:00:{start + i:02d}') for i in range(count)]
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_groups_records_into_batches():
+    history = RecordingHistory()
+    writer = HistoryWriter(history, batch_size=5, flush_interval=60)
+    for draw in draws(12):
+        writer.submit(draw)
+    wait_for(lambda: len(history.batches) == 2)
+    assert writer.backlog() == 2
+    assert writer.flush(timeout=5)
+    assert [len(batch) for batch in history.batches] == [5, 5, 2]
+    assert history.records() == [draw['timestamp'] for draw in draws(12)]
+    writer.close()
+
+def test_multi_draw_is_committed_together():
+    history = RecordingHistory()
+    writer = HistoryWriter(history, batch_size=5, flush_interval=60)
+    writer.submit_many(draws(10))
+    assert writer.flush(timeout=5)
+    assert [len(batch) for batch in history.batches] == [10]
+    writer.close()
+
+def test_flush_interval_commits_without_flush():
+    history = RecordingHistory()
+    writer = HistoryWriter(history, batch_size=100, flush_interval=0.05)
+    writer.submit(draws(1)[0])
+    wait_for(lambda: writer.get_metrics()['commit_count'] == 1)
+    writer.close()
+
+def test_failed_commits_are_retried():
+    history = RecordingHistory(failures=2)
+    writer = HistoryWriter(history, batch_size=1, retry_interval=0.05)
+    writer.submit_many(draws(3))
+    wait_for(lambda: writer.get_metrics()['commit_count'] == 1)
+    metrics = writer.get_metrics()
+    assert metrics['failed_commits'] == 2
+    assert metrics['last_error'] is None and metrics['backlog'] == 0
+    assert history.records() == [draw['timestamp'] for draw in draws(3)]
+    writer.close()
+
+def test_failed_commit_is_reported():
+    history = RecordingHistory(failures=1000)
+    writer = HistoryWriter(history, batch_size=1, retry_interval=60)
+    writer.submit(draws(1)[0])
+    assert not writer.flush(timeout=5)
+    metrics = writer.get_metrics()
+    assert metrics['backlog'] == 1 and '磁盘已满' in metrics['last_error']
+    history.failures = 0
+    writer.close()
+    assert len(history.records()) == 1
+
+def test_close_drains_queue():
+    history = RecordingHistory()
+    writer = HistoryWriter(history, batch_size=100, flush_interval=60)
+    writer.submit_many(draws(3))
+    writer.close()
+    assert history.records() == [draw['timestamp'] for draw in draws(3)]
+    # 关闭后提交的记录直接同步写入
+    writer.submit(draws(1, start=3)[0])
+    assert len(history.records()) == 4
+
+def test_close_writes_remaining_when_writer_is_stuck():
+    release = threading.Event()
+    history = RecordingHistory(block=release)
+    writer = HistoryWriter(history, batch_size=1, flush_interval=60)
+    first, second = draws(2)
+    writer.submit(first)
+    wait_for(lambda: history.block is None)  # 后台线程卡在第一次写入中
+    writer.submit(second)
+    writer.close(timeout=0.1)
+    assert history.records() == [second['timestamp']]
+    release.set()
+    writer.thread.join(5)
+    assert sorted(history.records()) == [first['timestamp'], second['timestamp']]
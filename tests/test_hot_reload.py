@@ -0,0 +1,117 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from gacha_app.src.core.prize_manager import PrizeManager
+from gacha_app.src.utils import file_watcher
+from gacha_app.src.utils.config_store import ConfigStore
+from gacha_app.src.utils.file_watcher import FileWatcher
+
+POLL = 0.05
+
+@pytest.fixture(params=['inotify', 'polling'])
+def mode(request, monkeypatch):
+    if request.param == 'polling':
+        monkeypatch.setattr(file_watcher, '_load_inotify', lambda: None)
+    elif file_watcher._load_inotify() is None:
+        pytest.skip("inotify 不可用")
+    return request.param
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'prizes': [
+        {'name': 'A', 'weight': 10, 'image': ''},
+        {'name': 'B', 'weight': 30, 'image': ''},
+    ]}), encoding='utf-8')
+    return str(path)
+
+def replace_json(path, document):
+    """像编辑器一样写临时文件后原子替换"""
+    time.sleep(0.01)  # 确保 mtime 变化
+    with open(path + '.new', 'w', encoding='utf-8') as f:
+        json.dump(document, f)
+    os.replace(path + '.new', path)
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_watcher_reports_replaced_file(config_path, mode):
+    changes = []
+    watcher = FileWatcher([config_path], changes.append, POLL)
+    watcher.start()
+    try:
+        assert (watcher.inotify_fd is not None) == (mode == 'inotify')
+        replace_json(config_path, {'prizes': []})
+        wait_for(lambda: changes)
+        assert changes == [[os.path.abspath(config_path)]]
+    finally:
+        watcher.stop()
+
+def test_watcher_ignores_known_writes(config_path, mode):
+    changes = []
+    watcher = FileWatcher([config_path], changes.append, POLL)
+    watcher.start()
+    try:
+        replace_json(config_path, {'prizes': []})
+        watcher.ignore(config_path)
+        time.sleep(POLL * 6)
+        assert changes == []
+    finally:
+        watcher.stop()
+
+def test_external_edit_is_reloaded_while_drawing(config_path, mode):
+    manager = PrizeManager(config_path, store=ConfigStore(config_path, save_delay=0.05))
+    version = manager.version
+    manager.start_watching(POLL)
+    errors = []
+    stopped = threading.Event()
+
+    def draw():
+        while not stopped.is_set():
+            try:
+                result = manager.draw()
+                assert result['prize']['name'] in ('A', 'B', 'C')
+            except Exception as e:
+                errors.append(e)
+                return
+    thread = threading.Thread(target=draw)
+    thread.start()
+    try:
+        document = read(config_path)
+        document['prizes'].append({'name': 'C', 'weight': 60, 'image': ''})
+        replace_json(config_path, document)
+        wait_for(lambda: manager.version != version)
+        assert [prize['name'] for prize in manager.get_all_prizes()] == ['A', 'B', 'C']
+    finally:
+        stopped.set()
+        thread.join()
+        manager.stop_watching()
+    assert errors == []
+
+def test_own_saves_do_not_trigger_reload(config_path, mode):
+    manager = PrizeManager(config_path, store=ConfigStore(config_path, save_delay=0.05))
+    reloads = []
+    reload_prizes = manager.reload_prizes
+    manager.reload_prizes = lambda: reloads.append(1) or reload_prizes()
+    manager.start_watching(POLL)
+    try:
+        manager.add_prize('C', 60, '')
+        manager.save_prizes()
+        manager.draw()  # 预留随机数序号也会写 config.json
+        manager.store.flush()
+        time.sleep(POLL * 6)
+        assert reloads == []
+        assert read(config_path)['prizes'][-1]['name'] == 'C'
+    finally:
+        manager.stop_watching()
@@ -0,0 +1,66 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from gacha_app.src.core.prize_catalog import BLOCK_SAMPLER_THRESHOLD
+from gacha_app.src.core.prize_manager import PrizeManager, INLINE_PRIZE_LIMIT
+from gacha_app.src.core.sampler import BlockSampler
+
+COUNT = BLOCK_SAMPLER_THRESHOLD + 5000
+
+def block_mass(sampler):
+    """分块采样器中每个奖品实际占有的概率（按块和桶逐个累加，不依赖采样）"""
+    mass = np.zeros(sampler.size)
+    for start, block, p in zip(sampler.starts, sampler.blocks, sampler.block_prob):
+        alias = block.sampler
+        for i in range(alias.size):
+            mass[start + i] += p * alias.prob[i] / alias.size
+            mass[start + alias.alias[i]] += p * (1 - alias.prob[i]) / alias.size
+    return mass
+
+def exact(catalog):
+    weights = np.maximum(np.asarray(catalog.weights(), dtype=np.float64), 0)
+    return weights / weights.sum()
+
+@pytest.fixture(scope='module')
+def manager(tmp_path_factory):
+    config_path = str(tmp_path_factory.mktemp('large') / 'config.json')
+    manager = PrizeManager(config_path, rng=random.Random(1))
+    manager.set_prizes({'name': f'奖品{i}', 'weight': 1 + i % 7, 'image': ''}
+                       for i in range(COUNT))
+    assert manager.save_prizes()
+    manager.store.flush()
+    return manager
+
+def test_large_catalog_is_stored_in_catalog_file(manager):
+    assert COUNT > INLINE_PRIZE_LIMIT
+    with open(manager.config_path, encoding='utf-8') as f:
+        config = json.load(f)
+    assert 'prizes' not in config
+    assert config['prize_catalog'] == manager.catalog_file
+
+    reloaded = PrizeManager(manager.config_path)
+    assert len(reloaded.catalog) == COUNT
+    assert reloaded.catalog == manager.catalog
+    assert reloaded.get_prize_index(f'奖品{COUNT - 1}') == COUNT - 1
+
+def test_large_catalog_edits_update_blocks_in_place(manager):
+    assert isinstance(manager.get_sampler(), BlockSampler)
+    manager.update_prize(5, '奖品5', 1000, '')
+    manager.remove_prize(10)
+    manager.remove_prize(COUNT - 2)
+    manager.add_prize('新奖品', 50, '')
+    sampler = manager.get_sampler()
+    catalog = manager.catalog
+    assert isinstance(sampler, BlockSampler)
+    assert len(sampler) == len(catalog) == COUNT - 1
+    assert block_mass(sampler) == pytest.approx(exact(catalog), abs=1e-15)
+    assert manager.get_prize_index('奖品11') == 10
+    assert manager.get_prize_index('新奖品') == COUNT - 2
+
+    # 向量化采样与逐个采样一致
+    u = np.random.default_rng(2).random(5000)
+    expected = [sampler.index_for(x) for x in u.tolist()]
+    assert sampler.sample_array(5000, np.random.default_rng(2)).tolist() == expected
@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from gacha_app.src.core.prize import Prize
+from gacha_app.src.core.prize_catalog import PrizeCatalog
+
+PRIZES = [
+    {'name': '一等奖', 'weight': 10, 'image': 'a.png'},
+    {'name': '二等奖', 'weight': 2.5, 'image': '', 'tier': 'SR'},
+    {'name': '三等奖', 'weight': 60, 'image': '', 'color': '#fff'},
+]
+
+def test_prize_reads_like_a_dict():
+    prize = Prize.from_dict(PRIZES[2])
+    assert prize['name'] == '三等奖' and prize.get('color') == '#fff'
+    assert prize.get('tier') is None and 'tier' not in prize and 'image' in prize
+    assert dict(prize) == PRIZES[2] and prize == PRIZES[2]
+    assert len(prize) == 4 and sorted(prize) == sorted(PRIZES[2])
+    with pytest.raises(KeyError):
+        prize['missing']
+    assert not hasattr(prize, '__dict__')
+
+def test_catalog_round_trip(tmp_path):
+    catalog = PrizeCatalog(PRIZES)
+    assert catalog.to_dicts() == PRIZES
+    assert [prize['name'] for prize in catalog] == [prize['name'] for prize in PRIZES]
+    assert catalog[-1] == PRIZES[-1] and catalog.prizes[1] == PRIZES[1]
+    assert list(catalog.weights()) == [10, 2.5, 60]
+    assert catalog.total_weight == 72.5
+    assert catalog[1].tier == 'SR' and catalog[0].tier is None and catalog.is_tiered()
+
+    path = str(tmp_path / 'prizes.jsonl')
+    catalog.save(path)
+    assert PrizeCatalog.load(path) == catalog
+
+def test_catalog_edits():
+    catalog = PrizeCatalog(PRIZES)
+    catalog.append({'name': '四等奖', 'weight': 100, 'image': ''})
+    catalog.update(0, {'name': '特等奖', 'weight': 1, 'image': 'b.png'})
+    catalog.remove(1)
+    assert [prize['name'] for prize in catalog] == ['特等奖', '三等奖', '四等奖']
+    assert catalog.total_weight == 161
+    assert catalog.index_of('四等奖') == 2 and catalog.index_of('一等奖') == -1
+    assert catalog.to_dicts()[1] == PRIZES[2]
+
+def test_columns_use_less_memory_than_dicts():
+    prizes = [{'name': f'p{i}', 'weight': i % 100 + 1, 'image': ''} for i in range(10000)]
+    catalog = PrizeCatalog(prizes)
+    assert catalog.to_dicts() == prizes
+    assert catalog.memory_size() < 10000 * 64
+
+def random_prize(rnd):
+    prize = {'name': f'p{rnd.randint(0, 20)}', 'weight': rnd.choice([0, 1, 2, 3, 0.5]),
+             'image': rnd.choice(['', 'a.png'])}
+    if rnd.random() < 0.3:
+        prize['tier'] = rnd.choice(['SSR', 'SR', 'R'])
+    if rnd.random() < 0.2:
+        prize['note'] = rnd.randint(0, 3)
+    return Prize.from_dict(prize).to_dict()
+
+def test_copies_share_columns_without_seeing_each_others_edits():
+    """副本与原目录共用各列：任意一个版本被复制修改后，其他版本的内容都不变"""
+    rnd = random.Random(5)
+    catalog = PrizeCatalog([random_prize(rnd) for _ in range(5)])
+    versions = [(catalog, catalog.to_dicts())]
+    for _ in range(500):
+        base, expected = versions[-1] if rnd.random() < 0.7 else rnd.choice(versions)
+        catalog = base.copy()
+        expected = list(expected)
+        action = rnd.random()
+        if action < 0.5 or not expected:
+            prize = random_prize(rnd)
+            catalog.append(prize)
+            expected.append(prize)
+        elif action < 0.8:
+            index = rnd.randrange(len(expected))
+            expected[index] = random_prize(rnd)
+            catalog.update(index, expected[index])
+        else:
+            index = rnd.randrange(len(expected))
+            catalog.remove(index)
+            del expected[index]
+        versions.append((catalog, expected))
+
+    for catalog, expected in versions:
+        assert catalog.to_dicts() == expected
+        assert len(catalog.weights()) == len(expected)
+        assert catalog.total_weight == sum(max(prize['weight'], 0) for prize in expected)
+        names = [prize['name'] for prize in expected]
+        for name in set(names) | {'p99'}:
+            assert catalog.index_of(name) == (names.index(name) if name in names else -1)
+        assert catalog == PrizeCatalog(expected)
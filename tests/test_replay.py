@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from gacha_app.src.core.gacha_engine import GachaEngine
+from gacha_app.src.core.prize_manager import PrizeManager, RNG_RESERVE_BLOCK
+from gacha_app.src.core.rng import CounterRNG
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'prizes': [
+        {'name': 'A', 'weight': 10, 'image': ''},
+        {'name': 'B', 'weight': 30, 'image': ''},
+        {'name': 'C', 'weight': 60, 'image': ''},
+    ]}), encoding='utf-8')
+    return str(path)
+
+def test_counter_rng_jump_and_spawn():
+    rng = CounterRNG(42)
+    values = [rng.random() for _ in range(10)]
+    assert [CounterRNG(42).random_at(i) for i in range(10)] == values
+    other = CounterRNG(42, counter=5)
+    assert other.random() == values[5]
+    assert rng.spawn(1).random_at(0) != CounterRNG(42).random_at(0)
+
+def test_counter_rng_draws_are_reproducible(config_path):
+    first = PrizeManager(config_path, rng=CounterRNG(42))
+    second = PrizeManager(config_path, rng=CounterRNG(42))
+    assert [first.draw()['index'] for _ in range(100)] == \
+        [second.draw()['index'] for _ in range(100)]
+
+def test_replay_draw_matches_recorded_draws(config_path):
+    manager = PrizeManager(config_path, rng=CounterRNG(42))
+    results = [manager.draw() for _ in range(50)] + manager.draw_many(10)
+    assert [manager.replay_draw(result['sequence']) for result in results] == \
+        [result['index'] for result in results]
+    assert all(manager.replay_record(result)[1] for result in results)
+
+def test_replay_rejects_changed_catalog(config_path):
+    manager = PrizeManager(config_path, rng=CounterRNG(42))
+    result = manager.draw()
+    assert result['catalog_version'] == manager.snapshot().revision
+    manager.update_prize(0, 'A', 500, '')
+    assert manager.replay_record(result) is None
+    assert manager.replay_draw(result['sequence'], result['catalog_version']) is None
+
+def test_replay_after_restart(config_path):
+    """种子和奖品版本保存在 config.json 中，重新启动后仍能重算以前的抽奖，且序号不重复"""
+    manager = PrizeManager(config_path)
+    results = manager.draw_many(10) + [manager.draw() for _ in range(5)]
+    manager.store.flush()
+
+    restarted = PrizeManager(config_path)
+    assert [restarted.replay_record(result) for result in results] == \
+        [(result['index'], True) for result in results]
+    used = {result['sequence'] for result in results}
+    assert restarted.draw()['sequence'] not in used
+
+def test_reservation_is_written_before_it_runs_out(config_path):
+    manager = PrizeManager(config_path)
+    manager.draw()  # 第一次抽奖立即写入预留
+    assert not manager.store.is_dirty()
+    draws = 1
+    while not manager.store.is_dirty():
+        manager.draw()
+        draws += 1
+    # 用掉一半时预留下一段，只记为待写入，不在抽奖中同步写文件
+    assert draws <= RNG_RESERVE_BLOCK // 2 + 2
+    manager.store.flush()
+    with open(config_path, encoding='utf-8') as f:
+        reserved = json.load(f)['rng']['reserved']
+    assert reserved >= manager.rng.counter + RNG_RESERVE_BLOCK // 2
+
+def test_simulation_does_not_consume_sequences(config_path):
+    manager = PrizeManager(config_path)
+    counter = manager.rng.counter
+    results = GachaEngine(manager).simulate_draws(1000)
+    assert len(results) == 1000
+    assert manager.rng.counter == counter
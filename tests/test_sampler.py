@@ -0,0 +1,172 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from gacha_app.src.core.prize import Prize
+from gacha_app.src.core.prize_catalog import PrizeCatalog, CatalogSnapshot, build_sampler
+from gacha_app.src.core.prize_manager import PrizeManager
+from gacha_app.src.core.sampler import AliasSampler, TieredSampler
+
+def alias_mass(sampler):
+    """别名表中每个索引实际占有的概率（按桶逐个累加，不依赖采样）"""
+    mass = [0.0] * sampler.size
+    for i in range(sampler.size):
+        mass[i] += sampler.prob[i] / sampler.size
+        mass[sampler.alias[i]] += (1.0 - sampler.prob[i]) / sampler.size
+    return mass
+
+def tiered_mass(sampler):
+    """两级采样器中每个奖品的实际概率 = 层级概率 × 层内别名表概率"""
+    mass = [0.0] * sampler.size
+    for tier, p in zip(sampler.tiers, sampler.tier_prob):
+        for member, m in zip(tier.members.tolist(), alias_mass(tier.sampler)):
+            mass[member] += p * m
+    return mass
+
+@pytest.mark.parametrize('weights', [
+    [1, 1, 1, 1],
+    [10, 30, 60],
+    [0.5, 2.25, 0, 7],
+    [1, 1000000],
+    [3, -2, 5],
+])
+def test_alias_matches_exact_probabilities(weights):
+    sampler = AliasSampler(weights)
+    positive = [max(w, 0) for w in weights]
+    total = sum(positive)
+    assert alias_mass(sampler) == pytest.approx([w / total for w in positive], abs=1e-12)
+
+def test_alias_zero_weights_is_uniform():
+    assert alias_mass(AliasSampler([0, 0, 0, 0])) == pytest.approx([0.25] * 4)
+
+def test_alias_samples_follow_weights():
+    sampler = AliasSampler([10, 30, 60])
+    rng = random.Random(1)
+    counts = [0, 0, 0]
+    for _ in range(100000):
+        counts[sampler.sample(rng)] += 1
+    assert [count / 100000 for count in counts] == pytest.approx([0.1, 0.3, 0.6], abs=0.01)
+
+def test_draw_agrees_with_reference(tmp_path):
+    """别名表抽奖与线性扫描的参考实现分布一致"""
+    config_path = tmp_path / 'config.json'
+    config_path.write_text(json.dumps({'prizes': [
+        {'name': 'A', 'weight': 5, 'image': ''},
+        {'name': 'B', 'weight': 15, 'image': ''},
+        {'name': 'C', 'weight': 80, 'image': ''},
+    ]}), encoding='utf-8')
+    manager = PrizeManager(str(config_path), rng=random.Random(2))
+    draws = [0, 0, 0]
+    reference = [0, 0, 0]
+    for _ in range(50000):
+        draws[manager.draw()['index']] += 1
+        reference[manager.draw_reference()['index']] += 1
+    expected = [0.05, 0.15, 0.8]
+    assert [count / 50000 for count in draws] == pytest.approx(expected, abs=0.01)
+    assert [count / 50000 for count in reference] == pytest.approx(expected, abs=0.01)
+
+def test_sampler_rebuilt_on_edit(tmp_path):
+    manager = PrizeManager(str(tmp_path / 'config.json'), rng=random.Random(3))
+    manager.set_prizes([{'name': 'A', 'weight': 1, 'image': ''}])
+    manager.add_prize('B', 3, '')
+    assert alias_mass(manager.get_sampler()) == pytest.approx([0.25, 0.75])
+    manager.update_prize(0, 'A', 0, '')
+    assert alias_mass(manager.get_sampler()) == pytest.approx([0.0, 1.0])
+    manager.remove_prize(0)
+    assert manager.draw()['prize'].name == 'B'
+
+def tiered_catalog():
+    prizes = [Prize(f'p{i}', weight, '', tier=tier) for i, (weight, tier) in enumerate([
+        (1, 'SSR'), (2, 'SSR'), (5, 'SR'), (5, 'SR'), (10, 'R'), (20, 'R'), (30, 'R'), (4, None),
+    ])]
+    return PrizeCatalog(prizes, {'SSR': 3, 'SR': 17, 'R': 80})
+
+def exact_tiered(catalog):
+    """按定义计算：层级概率取配置（未配置时为层内权重和），层内按权重"""
+    tier_totals = {}
+    for prize in catalog:
+        tier_totals[prize.tier] = tier_totals.get(prize.tier, 0) + max(prize.weight, 0)
+    tier_weights = {tier: catalog.tier_weights.get(tier, total)
+                    for tier, total in tier_totals.items()}
+    total = sum(tier_weights.values())
+    return [tier_weights[prize.tier] / total * max(prize.weight, 0) / tier_totals[prize.tier]
+            for prize in catalog]
+
+def test_tiered_matches_exact_probabilities():
+    catalog = tiered_catalog()
+    sampler = build_sampler(catalog)
+    assert isinstance(sampler, TieredSampler)
+    exact = exact_tiered(catalog)
+    assert tiered_mass(sampler) == pytest.approx(exact, abs=1e-12)
+    snapshot = CatalogSnapshot(catalog, sampler=sampler)
+    assert [snapshot.probability(i) for i in range(len(catalog))] == pytest.approx(exact)
+    assert dict(sampler.tier_odds()) == pytest.approx(
+        {None: 4 / 104, 'SSR': 3 / 104, 'SR': 17 / 104, 'R': 80 / 104})
+
+def test_tiered_samples_follow_probabilities():
+    catalog = tiered_catalog()
+    sampler = build_sampler(catalog)
+    counts = sampler.count_samples(400000, np.random.default_rng(3))
+    assert counts / counts.sum() == pytest.approx(exact_tiered(catalog), abs=0.005)
+
+def assert_same_sampler(incremental, catalog):
+    """增量更新的采样器与整体重建的采样器完全一致"""
+    rebuilt = TieredSampler.from_catalog(catalog)
+    assert len(incremental) == len(rebuilt) == len(catalog)
+    assert incremental.tier_prob == pytest.approx(rebuilt.tier_prob)
+    for mine, theirs in zip(incremental.tiers, rebuilt.tiers):
+        assert mine.members.tolist() == theirs.members.tolist()
+    assert tiered_mass(incremental) == pytest.approx(exact_tiered(catalog), abs=1e-12)
+    u = np.linspace(0, 1, 2001, endpoint=False).tolist()
+    assert [incremental.index_for(x) for x in u] == [rebuilt.index_for(x) for x in u]
+
+def test_tiered_incremental_updates_match_rebuild():
+    rnd = random.Random(4)
+    catalog = tiered_catalog()
+    sampler = TieredSampler.from_catalog(catalog)
+    tiers = ['SSR', 'SR', 'R', None, 'UR']
+    for step in range(60):
+        catalog = catalog.copy()
+        action = rnd.random()
+        if action < 0.4 or len(catalog) < 3:
+            catalog.append(Prize(f'n{step}', rnd.randint(1, 9), '', tier=rnd.choice(tiers)))
+            sampler = sampler.appended(catalog, len(catalog) - 1)
+        elif action < 0.75:
+            index = rnd.randrange(len(catalog))
+            old_tier = catalog.tier_of(index)
+            catalog.update(index, Prize(f'u{step}', rnd.randint(1, 9), '', tier=rnd.choice(tiers)))
+            sampler = sampler.updated(catalog, index, old_tier)
+        else:
+            index = rnd.randrange(len(catalog))
+            old_tier = catalog.tier_of(index)
+            catalog.remove(index)
+            sampler = sampler.removed(catalog, index, old_tier)
+        assert_same_sampler(sampler, catalog)
+
+def test_apply_edits_updates_tiered_sampler_incrementally(tmp_path):
+    """奖品管理界面的编辑记录逐条提交，结果与整体替换一致，附加字段和层级保留"""
+    manager = PrizeManager(str(tmp_path / 'config.json'), rng=random.Random(5))
+    manager.set_prizes(tiered_catalog())
+    edited = manager.catalog.copy()
+    edits = []
+    for edit in [('add', Prize('n', 7, '', {'note': 'x'}, 'SR')),
+                 ('update', 2, Prize('u', 9, '', {'note': 'y'}, 'SR')),
+                 ('remove', 0)]:
+        if edit[0] == 'add':
+            edited.append(edit[1])
+        elif edit[0] == 'update':
+            edited.update(edit[1], edit[2])
+        else:
+            edited.remove(edit[1])
+        edits.append(edit)
+    version = manager.version
+    assert manager.apply_edits(edits, version)
+    assert manager.catalog == edited
+    assert manager.catalog[1].extra == {'note': 'y'}
+    assert manager.catalog[-1].extra == {'note': 'x'}
+    assert_same_sampler(manager.get_sampler(), manager.catalog)
+    # 打开编辑后奖品被其他地方修改过时不提交
+    assert not manager.apply_edits([('remove', 0)], version)
+    assert len(manager.catalog) == len(edited)
@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+import pytest
+
+from gacha_app.src.core.gacha_engine import GachaEngine
+from gacha_app.src.core.prize_manager import PrizeManager
+from gacha_app.src.core.sampler import AliasSampler
+from gacha_app.src.core.simulation import parallel_simulate
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'prizes': [
+        {'name': 'A', 'weight': 10, 'image': ''},
+        {'name': 'B', 'weight': 30, 'image': ''},
+        {'name': 'C', 'weight': 60, 'image': ''},
+    ]}), encoding='utf-8')
+    return str(path)
+
+def test_indices_for_matches_index_for():
+    sampler = AliasSampler([1, 2, 3, 4, 0.5])
+    u = np.random.default_rng(2).random(1000)
+    assert sampler.indices_for(u).tolist() == [sampler.index_for(x) for x in u.tolist()]
+
+def test_simulate_indices(config_path):
+    engine = GachaEngine(PrizeManager(config_path))
+    indices = engine.simulate_indices(200000, seed=1)
+    assert indices.dtype == np.int32 and len(indices) == 200000
+    assert indices.tolist() == engine.simulate_indices(200000, seed=1).tolist()
+    stats = engine.get_statistics(indices)
+    assert sum(item['count'] for item in stats.values()) == 200000
+    assert [stats[name]['percentage'] for name in 'ABC'] == pytest.approx([10, 30, 60], abs=0.5)
+
+def test_build_statistics_merges_duplicate_names(config_path):
+    manager = PrizeManager(config_path)
+    manager.add_prize('A', 10, '')
+    stats = GachaEngine(manager).build_statistics(np.array([1, 0, 2, 1]))
+    assert stats == {'A': {'count': 2, 'percentage': 50.0},
+                     'C': {'count': 2, 'percentage': 50.0}}
+
+def test_statistics_use_sampling_snapshot(config_path):
+    manager = PrizeManager(config_path)
+    engine = GachaEngine(manager)
+    snapshot = manager.snapshot()
+    indices = engine.simulate_indices(1000, seed=3, snapshot=snapshot)
+    manager.remove_prize(0)
+    stats = engine.get_statistics(indices, snapshot)
+    assert set(stats) <= {'A', 'B', 'C'} and 'A' in stats
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_parallel_simulate_is_reproducible(workers):
+    sampler = AliasSampler([1, 2, 3, 4])
+    first = parallel_simulate(sampler, 50000, workers=workers, seed=7)
+    second = parallel_simulate(sampler, 50000, workers=workers, seed=7)
+    assert first.tolist() == second.tolist()
+    assert first.sum() == 50000
+    assert parallel_simulate(sampler, 50000, workers=workers, seed=8).tolist() != first.tolist()
+
+def test_engine_simulation_is_reproducible(config_path):
+    engine = GachaEngine(PrizeManager(config_path))
+    first = engine.simulate_statistics(20000, workers=2, seed=5)
+    assert first == engine.simulate_statistics(20000, workers=2, seed=5)
+    assert sum(item['count'] for item in first.values()) == 20000